@@ -0,0 +1,10 @@
+-- Índices para la paginación por cursor de los listados (utils/paginacion.py)
+-- Cada uno cubre el orden del listado más el id de desempate, de modo que
+-- cualquier página se resuelve con un rango del índice sin recorrer las
+-- filas anteriores.
+
+CREATE INDEX idx_planta_orden ON general_dim_planta (planta, id);
+CREATE INDEX idx_registro_orden ON mapeo_fact_registro (hora_registro, id);
+CREATE INDEX idx_hilera_orden ON general_dim_hilera (hilera, id);
+CREATE INDEX idx_cuartel_orden ON general_dim_cuartel (nombre, id);
+CREATE INDEX idx_registromapeo_orden ON mapeo_fact_registromapeo (fecha_inicio, id);
@@ -0,0 +1,34 @@
+-- Script para crear la tabla de contadores de progreso por hilera
+-- Mantiene, por registro de mapeo y hilera, el total de plantas y las plantas
+-- mapeadas por el evaluador del registro. La actualizan los endpoints de
+-- registros, plantas y registromapeo (utils/progreso.py); se puede reconstruir
+-- y verificar con: python reconstruir_progreso.py [--verificar] [id_registro_mapeo]
+
+CREATE TABLE IF NOT EXISTS mapeo_fact_progreso_hilera (
+    id_registro_mapeo VARCHAR(36) NOT NULL,
+    id_hilera INT NOT NULL,
+    total_plantas INT NOT NULL DEFAULT 0,
+    plantas_mapeadas INT NOT NULL DEFAULT 0,
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (id_registro_mapeo, id_hilera),
+    
+    -- Índice para actualizar todos los registros de una hilera (altas/bajas de plantas)
+    INDEX idx_hilera (id_hilera),
+    
+    -- Clave foránea al registro de mapeo
+    FOREIGN KEY (id_registro_mapeo) REFERENCES mapeo_fact_registromapeo(id) ON DELETE CASCADE,
+    
+    -- Clave foránea a la hilera
+    FOREIGN KEY (id_hilera) REFERENCES general_dim_hilera(id) ON DELETE CASCADE
+);
+
+-- Carga inicial (equivalente a python reconstruir_progreso.py)
+-- INSERT INTO mapeo_fact_progreso_hilera (id_registro_mapeo, id_hilera, total_plantas, plantas_mapeadas)
+-- SELECT rm.id, h.id,
+--        (SELECT COUNT(*) FROM general_dim_planta p WHERE p.id_hilera = h.id),
+--        (SELECT COUNT(*) FROM mapeo_fact_registro r
+--         INNER JOIN general_dim_planta p ON r.id_planta = p.id
+--         WHERE p.id_hilera = h.id AND r.id_evaluador = rm.id_evaluador)
+-- FROM mapeo_fact_registromapeo rm
+-- INNER JOIN general_dim_hilera h ON h.id_cuartel = rm.id_cuartel;
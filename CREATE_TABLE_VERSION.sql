@@ -0,0 +1,10 @@
+-- Script para crear la tabla de versiones de cambio
+-- Cada clave (p. ej. 'progreso:<id_registro_mapeo>') guarda un contador que
+-- los endpoints de escritura incrementan en su misma transacción. Las
+-- lecturas lo usan para ETags y cachés en memoria (utils/versiones.py).
+
+CREATE TABLE IF NOT EXISTS mapeo_fact_version (
+    clave VARCHAR(100) PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
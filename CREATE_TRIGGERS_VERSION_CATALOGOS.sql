@@ -0,0 +1,99 @@
+-- Triggers que incrementan la versión de los catálogos sin endpoints de
+-- escritura propios (se editan desde otros sistemas o módulos), para el GET
+-- condicional de utils/catalogos.py. Especies, variedades y cuarteles ya la
+-- incrementan desde sus handlers.
+-- Requiere CREATE_TABLE_VERSION.sql.
+
+DELIMITER $$
+
+CREATE TRIGGER trg_version_tipoplanta_ins AFTER INSERT ON mapeo_dim_tipoplanta FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:mapeo_dim_tipoplanta', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_tipoplanta_upd AFTER UPDATE ON mapeo_dim_tipoplanta FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:mapeo_dim_tipoplanta', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_tipoplanta_del AFTER DELETE ON mapeo_dim_tipoplanta FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:mapeo_dim_tipoplanta', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+
+CREATE TRIGGER trg_version_estadocatastro_ins AFTER INSERT ON mapeo_dim_estadocatastro FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:mapeo_dim_estadocatastro', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_estadocatastro_upd AFTER UPDATE ON mapeo_dim_estadocatastro FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:mapeo_dim_estadocatastro', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_estadocatastro_del AFTER DELETE ON mapeo_dim_estadocatastro FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:mapeo_dim_estadocatastro', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+
+CREATE TRIGGER trg_version_labor_ins AFTER INSERT ON general_dim_labor FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_labor', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_labor_upd AFTER UPDATE ON general_dim_labor FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_labor', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_labor_del AFTER DELETE ON general_dim_labor FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_labor', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+
+CREATE TRIGGER trg_version_unidad_ins AFTER INSERT ON tarja_dim_unidad FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:tarja_dim_unidad', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_unidad_upd AFTER UPDATE ON tarja_dim_unidad FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:tarja_dim_unidad', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_unidad_del AFTER DELETE ON tarja_dim_unidad FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:tarja_dim_unidad', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+
+CREATE TRIGGER trg_version_cecotipo_ins AFTER INSERT ON general_dim_cecotipo FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_cecotipo', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_cecotipo_upd AFTER UPDATE ON general_dim_cecotipo FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_cecotipo', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_cecotipo_del AFTER DELETE ON general_dim_cecotipo FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_cecotipo', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+
+CREATE TRIGGER trg_version_empresa_ins AFTER INSERT ON general_dim_empresa FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_empresa', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_empresa_upd AFTER UPDATE ON general_dim_empresa FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_empresa', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_empresa_del AFTER DELETE ON general_dim_empresa FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_empresa', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+
+CREATE TRIGGER trg_version_sucursal_ins AFTER INSERT ON general_dim_sucursal FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_sucursal', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_sucursal_upd AFTER UPDATE ON general_dim_sucursal FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_sucursal', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_sucursal_del AFTER DELETE ON general_dim_sucursal FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_sucursal', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+
+CREATE TRIGGER trg_version_ceco_ins AFTER INSERT ON general_dim_ceco FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_ceco', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_ceco_upd AFTER UPDATE ON general_dim_ceco FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_ceco', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_ceco_del AFTER DELETE ON general_dim_ceco FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:general_dim_ceco', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+
+CREATE TRIGGER trg_version_sucursal_usuario_ins AFTER INSERT ON usuario_pivot_sucursal_usuario FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:usuario_pivot_sucursal_usuario', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_sucursal_usuario_upd AFTER UPDATE ON usuario_pivot_sucursal_usuario FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:usuario_pivot_sucursal_usuario', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+CREATE TRIGGER trg_version_sucursal_usuario_del AFTER DELETE ON usuario_pivot_sucursal_usuario FOR EACH ROW
+    INSERT INTO mapeo_fact_version (clave, version) VALUES ('tabla:usuario_pivot_sucursal_usuario', 1)
+    ON DUPLICATE KEY UPDATE version = version + 1$$
+
+DELIMITER ;
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point (uvicorn asgi:app)
+
+Los GET de lectura de plantas, hileras, registros y registromapeo se
+atienden con la capa de datos asíncrona, sin ocupar un hilo mientras
+esperan a Cloud SQL. El resto de las rutas (y cualquier petición con
+parámetros u opciones que solo entiende Flask) pasa a la aplicación
+síncrona de wsgi.py, que sigue disponible por separado para comparar.
+
+Cada petición asíncrona tiene el mismo presupuesto de tiempo que su
+endpoint en Flask (REQUEST_TIME_BUDGETS / @time_budget). Los listados se
+serializan y comprimen en un hilo para no bloquear el event loop.
+"""
+
+import asyncio
+import logging
+from asgiref.wsgi import WsgiToAsgi
+from flask_jwt_extended import decode_token
+from werkzeug.exceptions import HTTPException
+from wsgi import app as flask_app
+from blueprints.lecturas_async import HANDLERS
+from utils import db_async, deadlines
+
+logger = logging.getLogger(__name__)
+
+wsgi_app = WsgiToAsgi(flask_app)
+url_adapter = flask_app.url_map.bind('localhost')
+
+
+def _headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+def _async_route(scope, headers):
+    """Handler asíncrono y argumentos para la petición, o None si la atiende Flask."""
+    if scope['method'] != 'GET' or scope.get('query_string'):
+        return None
+    accept = headers.get('accept', '*/*')
+    if 'application/json' not in accept and '*/*' not in accept:
+        return None
+    if 'msgpack' in accept or 'cbor' in accept:
+        return None  # formato binario negociado por Flask (utils/serializacion.py)
+    if 'if-none-match' in headers or 'if-modified-since' in headers:
+        return None
+    try:
+        endpoint, view_args = url_adapter.match(scope['path'], method='GET')
+    except HTTPException:
+        return None
+    handler = HANDLERS.get(endpoint)
+    return (endpoint, handler, view_args) if handler else None
+
+
+def _authorized(headers):
+    """Valida el access token como @jwt_required(); ante cualquier problema responde Flask."""
+    auth = headers.get('authorization', '')
+    if not auth.startswith('Bearer '):
+        return False
+    try:
+        with flask_app.app_context():
+            return decode_token(auth[len('Bearer '):]).get('type') == 'access'
+    except Exception:
+        return False
+
+
+def _respuesta(scope, headers, data, status):
+    """
+    Respuesta armada por Flask para aplicar los mismos after_request (CORS,
+    compresión, etc.). Devuelve (status, headers ASGI, cuerpo).
+    """
+    with flask_app.test_request_context(scope['path'], method='GET', headers=headers):
+        response = flask_app.process_response(flask_app.make_response((data, status)))
+        return (
+            response.status_code,
+            [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response.headers.items()],
+            response.get_data(),
+        )
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await db_async.get_pool()
+            except Exception as e:
+                logger.warning(f"⚠️  No se pudo precalentar el pool asíncrono: {str(e)}")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await db_async.close_pool()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+
+    if scope['type'] == 'http':
+        headers = _headers(scope)
+        route = _async_route(scope, headers)
+        if route and _authorized(headers):
+            endpoint, handler, view_args = route
+            db_async.start_deadline(deadlines.budget_for(endpoint, flask_app.view_functions.get(endpoint)))
+            try:
+                data, status = await handler(**view_args)
+            except deadlines.DeadlineExceeded:
+                logger.warning(f"⏱️  GET {scope['path']} superó su tiempo límite")
+                data, status = {"error": "La petición superó su tiempo límite"}, 504
+            except Exception as e:
+                data, status = {"error": str(e)}, 500
+            if isinstance(data, list):
+                status, response_headers, body = await asyncio.to_thread(_respuesta, scope, headers, data, status)
+            else:
+                status, response_headers, body = _respuesta(scope, headers, data, status)
+            await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+    await wsgi_app(scope, receive, send)
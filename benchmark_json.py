@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Compara el proveedor JSON por defecto de Flask con el de orjson
+(utils/json_provider.py) sobre listados como los de plantas, registros y
+cuarteles, y verifica que ambos producen el mismo JSON.
+
+Uso: python benchmark_json.py [filas]
+"""
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from utils.json_provider import OrjsonProvider, orjson
+
+
+def generar_datos(filas):
+    inicio = datetime(2025, 9, 1, 7, 30)
+    plantas = [
+        {
+            "id": str(uuid.uuid4()),
+            "id_hilera": 1000 + i // 150,
+            "planta": i % 150 + 1,
+            "ubicacion": f"-34.{i:06d},-71.{i * 7 % 1000000:06d}",
+            "fecha_creacion": inicio + timedelta(seconds=i * 13),
+        }
+        for i in range(filas)
+    ]
+    registros = [
+        {
+            "id": str(uuid.uuid4()),
+            "id_evaluador": f"evaluador-{i % 12}",
+            "hora_registro": inicio + timedelta(seconds=i * 7),
+            "id_planta": plantas[i % len(plantas)]["id"],
+            "id_tipoplanta": f"tipo-{i % 6}",
+            "imagen": None if i % 3 else f"https://storage.googleapis.com/mapeo/{i}.jpg",
+        }
+        for i in range(filas)
+    ]
+    cuarteles = [
+        {
+            "id": i, "id_ceco": 200 + i % 40, "nombre": f"Cuartel {i}", "id_variedad": i % 25,
+            "superficie": Decimal(f"{1 + i % 9}.{i % 100:02d}"), "ano_plantacion": 2000 + i % 24,
+            "dsh": Decimal("4.50"), "deh": Decimal("1.75"), "id_propiedad": 1, "id_portainjerto": 3,
+            "brazos_ejes": 2, "id_estado": 1, "fecha_baja": None if i % 10 else date(2024, 5, 1 + i % 28),
+            "id_estadoproductivo": 1, "n_hileras": 40 + i % 60, "id_estadocatastro": 1 + i % 2,
+        }
+        for i in range(max(filas // 50, 1))
+    ]
+    return {"plantas": plantas, "registros": registros, "cuarteles": cuarteles}
+
+
+def medir(provider, datos, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        cuerpo = provider.response(datos).get_data()
+        transcurrido = time.perf_counter() - t0
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, cuerpo
+
+
+def main():
+    if orjson is None:
+        print("❌ orjson no está instalado (pip install orjson)")
+        sys.exit(1)
+
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    app = Flask(__name__)
+    por_defecto = DefaultJSONProvider(app)
+    rapido = OrjsonProvider(app)
+
+    print(f"📊 Serialización de {filas} filas (mejor de 5)")
+    print(f"{'listado':<12}{'default (ms)':>14}{'orjson (ms)':>14}{'x':>8}{'KB':>10}")
+    for nombre, datos in generar_datos(filas).items():
+        t_defecto, cuerpo_defecto = medir(por_defecto, datos, 5)
+        t_rapido, cuerpo_rapido = medir(rapido, datos, 5)
+        if json.loads(cuerpo_defecto) != json.loads(cuerpo_rapido):
+            print(f"❌ {nombre}: las salidas no coinciden")
+            sys.exit(1)
+        print(f"{nombre:<12}{t_defecto * 1000:>14.1f}{t_rapido * 1000:>14.1f}"
+              f"{t_defecto / t_rapido:>8.1f}{len(cuerpo_rapido) / 1024:>10.0f}")
+    print("✅ Mismo JSON con ambos proveedores")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,65 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from utils.db import get_db_connection
+from utils.db import get_db_connection, get_request_connection
+from utils import campos, catalogos, paginacion, progreso
+from utils.singleflight import single_flight
 from datetime import datetime, date
 import uuid
 
 cuarteles_bp = Blueprint('cuarteles_bp', __name__)
 
+# Columnas que se pueden pedir con ?fields=
+CAMPOS = (
+    'id', 'id_ceco', 'nombre', 'id_variedad', 'superficie', 'ano_plantacion',
+    'dsh', 'deh', 'id_propiedad', 'id_portainjerto', 'brazos_ejes', 'id_estado',
+    'fecha_baja', 'id_estadoproductivo', 'n_hileras', 'id_estadocatastro',
+)
+
 # 🔹 Obtener todos los cuarteles
 @cuarteles_bp.route('/', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_cuartel')
 def obtener_cuarteles():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        columnas = campos.pedidos(CAMPOS)
         
-        cursor.execute("""
-            SELECT id, id_ceco, nombre, id_variedad, superficie, ano_plantacion, 
-                   dsh, deh, id_propiedad, id_portainjerto, brazos_ejes, id_estado, 
-                   fecha_baja, id_estadoproductivo, n_hileras, id_estadocatastro
+        select = f"""
+            SELECT {', '.join(columnas)}
             FROM general_dim_cuartel
-            ORDER BY nombre ASC
-        """)
+        """
+        
+        # Paginación por cursor (?limit=&cursor=)
+        if paginacion.pedida():
+            return paginacion.paginar(columnas, "FROM general_dim_cuartel", 'nombre')
+        
+        conn = get_request_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        cursor.execute(select + " ORDER BY nombre ASC")
         
         cuarteles = cursor.fetchall()
         cursor.close()
         conn.close()
         
         return jsonify(cuarteles), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # 🔹 Obtener un cuartel específico por ID
 @cuarteles_bp.route('/<int:cuartel_id>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_cuartel')
 def obtener_cuartel(cuartel_id):
     try:
-        conn = get_db_connection()
+        columnas = campos.pedidos(CAMPOS)
+        
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_ceco, nombre, id_variedad, superficie, ano_plantacion, 
-                   dsh, deh, id_propiedad, id_portainjerto, brazos_ejes, id_estado, 
-                   fecha_baja, id_estadoproductivo, n_hileras, id_estadocatastro
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM general_dim_cuartel
             WHERE id = %s
         """, (cuartel_id,))
@@ -54,6 +72,8 @@ def obtener_cuartel(cuartel_id):
             return jsonify({"error": "Cuartel no encontrado"}), 404
         
         return jsonify(cuartel), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -72,6 +92,7 @@ def crear_cuartel():
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Insertar el nuevo cuartel
         cursor.execute("""
@@ -101,6 +122,7 @@ def crear_cuartel():
         # Obtener el ID del cuartel recién creado
         cuartel_id = cursor.lastrowid
         
+        catalogos.registrar_cambio(cursor, 'general_dim_cuartel')
         conn.commit()
         cursor.close()
         conn.close()
@@ -121,6 +143,7 @@ def actualizar_cuartel(cuartel_id):
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que el cuartel existe
         cursor.execute("""
@@ -162,6 +185,10 @@ def actualizar_cuartel(cuartel_id):
         """
         
         cursor.execute(query, valores)
+        if 'nombre' in data:
+            # El nombre del cuartel aparece en el progreso de sus registros de mapeo
+            progreso.invalidar_cuartel(cursor, cuartel_id)
+        catalogos.registrar_cambio(cursor, 'general_dim_cuartel')
         conn.commit()
         cursor.close()
         conn.close()
@@ -180,6 +207,7 @@ def eliminar_cuartel(cuartel_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que el cuartel existe
         cursor.execute("""
@@ -198,6 +226,7 @@ def eliminar_cuartel(cuartel_id):
             WHERE id = %s
         """, (date.today(), cuartel_id))
         
+        catalogos.registrar_cambio(cursor, 'general_dim_cuartel')
         conn.commit()
         cursor.close()
         conn.close()
@@ -212,15 +241,16 @@ def eliminar_cuartel(cuartel_id):
 # 🔹 Obtener cuarteles por ceco
 @cuarteles_bp.route('/ceco/<int:ceco_id>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_cuartel')
 def obtener_cuarteles_por_ceco(ceco_id):
     try:
-        conn = get_db_connection()
+        columnas = campos.pedidos(CAMPOS)
+        
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_ceco, nombre, id_variedad, superficie, ano_plantacion, 
-                   dsh, deh, id_propiedad, id_portainjerto, brazos_ejes, id_estado, 
-                   fecha_baja, id_estadoproductivo, n_hileras, id_estadocatastro
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM general_dim_cuartel
             WHERE id_ceco = %s
             ORDER BY nombre ASC
@@ -231,21 +261,24 @@ def obtener_cuarteles_por_ceco(ceco_id):
         conn.close()
         
         return jsonify(cuarteles), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # 🔹 Obtener cuarteles por variedad
 @cuarteles_bp.route('/variedad/<int:variedad_id>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_cuartel')
 def obtener_cuarteles_por_variedad(variedad_id):
     try:
-        conn = get_db_connection()
+        columnas = campos.pedidos(CAMPOS)
+        
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_ceco, nombre, id_variedad, superficie, ano_plantacion, 
-                   dsh, deh, id_propiedad, id_portainjerto, brazos_ejes, id_estado, 
-                   fecha_baja, id_estadoproductivo, n_hileras, id_estadocatastro
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM general_dim_cuartel
             WHERE id_variedad = %s
             ORDER BY nombre ASC
@@ -256,15 +289,19 @@ def obtener_cuarteles_por_variedad(variedad_id):
         conn.close()
         
         return jsonify(cuarteles), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # 🔹 Obtener cuarteles activos
 @cuarteles_bp.route('/activos', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_cuartel', 'general_dim_ceco', 'general_dim_sucursal')
+@single_flight
 def obtener_cuarteles_activos():
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT 
@@ -288,15 +325,16 @@ def obtener_cuarteles_activos():
 # 🔹 Obtener cuarteles por propiedad
 @cuarteles_bp.route('/propiedad/<int:propiedad_id>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_cuartel')
 def obtener_cuarteles_por_propiedad(propiedad_id):
     try:
-        conn = get_db_connection()
+        columnas = campos.pedidos(CAMPOS)
+        
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_ceco, nombre, id_variedad, superficie, ano_plantacion, 
-                   dsh, deh, id_propiedad, id_portainjerto, brazos_ejes, id_estado, 
-                   fecha_baja, id_estadoproductivo, n_hileras, id_estadocatastro
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM general_dim_cuartel
             WHERE id_propiedad = %s
             ORDER BY nombre ASC
@@ -307,21 +345,24 @@ def obtener_cuarteles_por_propiedad(propiedad_id):
         conn.close()
         
         return jsonify(cuarteles), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # 🔹 Buscar cuarteles por nombre
 @cuarteles_bp.route('/buscar/<string:nombre>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_cuartel')
 def buscar_cuarteles_por_nombre(nombre):
     try:
-        conn = get_db_connection()
+        columnas = campos.pedidos(CAMPOS)
+        
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_ceco, nombre, id_variedad, superficie, ano_plantacion, 
-                   dsh, deh, id_propiedad, id_portainjerto, brazos_ejes, id_estado, 
-                   fecha_baja, id_estadoproductivo, n_hileras, id_estadocatastro
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM general_dim_cuartel
             WHERE nombre LIKE %s
             ORDER BY nombre ASC
@@ -332,15 +373,18 @@ def buscar_cuarteles_por_nombre(nombre):
         conn.close()
         
         return jsonify(cuarteles), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # 🔹 NUEVO: Obtener cuarteles con catastro finalizado
 @cuarteles_bp.route('/catastro-finalizado', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_cuartel', 'general_dim_ceco', 'general_dim_sucursal')
 def obtener_cuarteles_catastro_finalizado():
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -1,15 +1,17 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
-from utils.db import get_db_connection
+from utils.db import get_db_connection, get_request_connection
+from utils import catalogos
 
 especies_bp = Blueprint('especies_bp', __name__)
 
 # Obtener todas las especies
 @especies_bp.route('/', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_especie')
 def obtener_especies():
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT id, nombre, caja_equivalente
@@ -26,9 +28,10 @@ def obtener_especies():
 # Obtener especie por ID
 @especies_bp.route('/<int:especie_id>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_especie')
 def obtener_especie(especie_id):
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT id, nombre, caja_equivalente
@@ -54,11 +57,13 @@ def crear_especie():
             return jsonify({"error": "Faltan campos requeridos"}), 400
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         cursor.execute("""
             INSERT INTO general_dim_especie (nombre, caja_equivalente)
             VALUES (%s, %s)
         """, (data['nombre'], data['caja_equivalente']))
         especie_id = cursor.lastrowid
+        catalogos.registrar_cambio(cursor, 'general_dim_especie')
         conn.commit()
         cursor.close()
         conn.close()
@@ -74,6 +79,7 @@ def actualizar_especie(especie_id):
         data = request.json
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         cursor.execute("SELECT id FROM general_dim_especie WHERE id = %s", (especie_id,))
         if not cursor.fetchone():
             cursor.close()
@@ -94,6 +100,7 @@ def actualizar_especie(especie_id):
         valores.append(especie_id)
         query = f"UPDATE general_dim_especie SET {', '.join(campos)} WHERE id = %s"
         cursor.execute(query, valores)
+        catalogos.registrar_cambio(cursor, 'general_dim_especie')
         conn.commit()
         cursor.close()
         conn.close()
@@ -108,12 +115,14 @@ def eliminar_especie(especie_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         cursor.execute("SELECT id FROM general_dim_especie WHERE id = %s", (especie_id,))
         if not cursor.fetchone():
             cursor.close()
             conn.close()
             return jsonify({"error": "Especie no encontrada"}), 404
         cursor.execute("DELETE FROM general_dim_especie WHERE id = %s", (especie_id,))
+        catalogos.registrar_cambio(cursor, 'general_dim_especie')
         conn.commit()
         cursor.close()
         conn.close()
@@ -1,15 +1,17 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from utils.db import get_db_connection
+from utils.db import get_request_connection
+from utils import catalogos
 
 estadocatastro_bp = Blueprint('estadocatastro_bp', __name__)
 
 # 🔹 Obtener todos los estados de catastro
 @estadocatastro_bp.route('/', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('mapeo_dim_estadocatastro')
 def obtener_estados_catastro():
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -29,9 +31,10 @@ def obtener_estados_catastro():
 # 🔹 Obtener un estado de catastro específico por ID
 @estadocatastro_bp.route('/<int:estado_id>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('mapeo_dim_estadocatastro')
 def obtener_estado_catastro(estado_id):
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -54,9 +57,10 @@ def obtener_estado_catastro(estado_id):
 # 🔹 Buscar estados de catastro por nombre
 @estadocatastro_bp.route('/buscar/<string:nombre>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('mapeo_dim_estadocatastro')
 def buscar_estados_catastro_por_nombre(nombre):
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
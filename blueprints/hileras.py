@@ -1,6 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.db import get_db_connection
+from utils.streaming import stream_format, stream_query
+from utils import campos, catalogos, columnar, paginacion, progreso
+from utils.singleflight import single_flight
 from datetime import datetime, date
 import uuid
 import logging
@@ -8,25 +11,79 @@ import traceback
 
 hileras_bp = Blueprint('hileras_bp', __name__)
 
+# Columnas que se pueden pedir con ?fields=
+CAMPOS = ('id', 'hilera', 'id_cuartel')
+
+# Campos de ?fields= en las lecturas con el nombre del cuartel (JOIN)
+CAMPOS_CON_CUARTEL = {
+    'id': 'h.id',
+    'hilera': 'h.hilera',
+    'id_cuartel': 'h.id_cuartel',
+    'nombre_cuartel': 'c.nombre as nombre_cuartel',
+}
+
+# Columnas codificadas por diccionario en ?format=columns (valores muy repetidos)
+COLUMNAS_DICCIONARIO = ('id_cuartel',)
+
+# Lecturas compartidas con su versión asíncrona (blueprints/lecturas_async.py);
+# {columnas} es la lista del SELECT (CAMPOS o lo pedido en ?fields=)
+SQL_HILERAS = """
+    SELECT {columnas}
+    FROM general_dim_hilera
+    ORDER BY hilera ASC
+"""
+SQL_HILERA = """
+    SELECT {columnas}
+    FROM general_dim_hilera
+    WHERE id = %s
+"""
+SQL_HILERAS_POR_CUARTEL = """
+    SELECT {columnas}
+    FROM general_dim_hilera
+    WHERE id_cuartel = %s
+    ORDER BY hilera ASC
+"""
+SQL_HILERAS_CON_CUARTEL = """
+    SELECT {columnas}
+    FROM general_dim_hilera h
+    LEFT JOIN general_dim_cuartel c ON h.id_cuartel = c.id
+    ORDER BY h.hilera ASC
+"""
+
 # 🔹 Obtener todas las hileras
 @hileras_bp.route('/', methods=['GET'])
 @jwt_required()
 def obtener_hileras():
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
+        query = campos.select(SQL_HILERAS, columnas)
+        
+        # Modo streaming (?stream=1 o Accept: application/x-ndjson)
+        formato = stream_format()
+        if formato:
+            return stream_query(query, fmt=formato)
+        
+        # Paginación por cursor (?limit=&cursor=)
+        if paginacion.pedida():
+            return paginacion.paginar(columnas, "FROM general_dim_hilera", 'hilera', codificar=COLUMNAS_DICCIONARIO)
+        
+        # Formato columnar (?format=columns)
+        if columnar.pedido():
+            return columnar.respuesta(query, codificar=COLUMNAS_DICCIONARIO)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, hilera, id_cuartel
-            FROM general_dim_hilera
-            ORDER BY hilera ASC
-        """)
+        cursor.execute(query)
         
         hileras = cursor.fetchall()
         cursor.close()
         conn.close()
         
         return jsonify(hileras), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -35,14 +92,12 @@ def obtener_hileras():
 @jwt_required()
 def obtener_hilera(hilera_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, hilera, id_cuartel
-            FROM general_dim_hilera
-            WHERE id = %s
-        """, (hilera_id,))
+        cursor.execute(campos.select(SQL_HILERA, columnas), (hilera_id,))
         
         hilera = cursor.fetchone()
         cursor.close()
@@ -52,6 +107,8 @@ def obtener_hilera(hilera_id):
             return jsonify({"error": "Hilera no encontrada"}), 404
         
         return jsonify(hilera), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -78,6 +135,7 @@ def crear_hilera():
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que el cuartel existe
         logger.info(f"🔍 Verificando cuartel {data['id_cuartel']}...")
@@ -123,6 +181,9 @@ def crear_hilera():
         hilera_id = cursor.lastrowid
         logger.info(f"✅ Hilera creada con ID: {hilera_id}")
         
+        # El progreso de los registros del cuartel suma una hilera
+        progreso.invalidar_cuartel(cursor, data['id_cuartel'])
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -146,13 +207,15 @@ def actualizar_hilera(hilera_id):
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que la hilera existe
         cursor.execute("""
-            SELECT id FROM general_dim_hilera WHERE id = %s
+            SELECT id, id_cuartel FROM general_dim_hilera WHERE id = %s
         """, (hilera_id,))
         
-        if not cursor.fetchone():
+        hilera_actual = cursor.fetchone()
+        if not hilera_actual:
             cursor.close()
             conn.close()
             return jsonify({"error": "Hilera no encontrada"}), 404
@@ -183,6 +246,11 @@ def actualizar_hilera(hilera_id):
         """
         
         cursor.execute(query, valores)
+        
+        progreso.invalidar_cuartel(cursor, hilera_actual['id_cuartel'])
+        if 'id_cuartel' in data:
+            progreso.invalidar_cuartel(cursor, data['id_cuartel'])
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -201,13 +269,15 @@ def eliminar_hilera(hilera_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que la hilera existe
         cursor.execute("""
-            SELECT id FROM general_dim_hilera WHERE id = %s
+            SELECT id, id_cuartel FROM general_dim_hilera WHERE id = %s
         """, (hilera_id,))
         
-        if not cursor.fetchone():
+        hilera_actual = cursor.fetchone()
+        if not hilera_actual:
             cursor.close()
             conn.close()
             return jsonify({"error": "Hilera no encontrada"}), 404
@@ -217,6 +287,8 @@ def eliminar_hilera(hilera_id):
             DELETE FROM general_dim_hilera WHERE id = %s
         """, (hilera_id,))
         
+        progreso.invalidar_cuartel(cursor, hilera_actual['id_cuartel'])
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -233,21 +305,20 @@ def eliminar_hilera(hilera_id):
 @jwt_required()
 def obtener_hileras_por_cuartel(cuartel_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, hilera, id_cuartel
-            FROM general_dim_hilera
-            WHERE id_cuartel = %s
-            ORDER BY hilera ASC
-        """, (cuartel_id,))
+        cursor.execute(campos.select(SQL_HILERAS_POR_CUARTEL, columnas), (cuartel_id,))
         
         hileras = cursor.fetchall()
         cursor.close()
         conn.close()
         
         return jsonify(hileras), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -256,11 +327,13 @@ def obtener_hileras_por_cuartel(cuartel_id):
 @jwt_required()
 def obtener_hileras_por_numero(numero_hilera):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, hilera, id_cuartel
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM general_dim_hilera
             WHERE hilera = %s
             ORDER BY hilera ASC
@@ -271,29 +344,31 @@ def obtener_hileras_por_numero(numero_hilera):
         conn.close()
         
         return jsonify(hileras), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # 🔹 Obtener hileras con información del cuartel
 @hileras_bp.route('/con-cuartel', methods=['GET'])
 @jwt_required()
+@single_flight
 def obtener_hileras_con_cuartel():
     try:
+        columnas = campos.pedidos(CAMPOS_CON_CUARTEL)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT h.id, h.hilera, h.id_cuartel, c.nombre as nombre_cuartel
-            FROM general_dim_hilera h
-            LEFT JOIN general_dim_cuartel c ON h.id_cuartel = c.id
-            ORDER BY h.hilera ASC
-        """)
+        cursor.execute(campos.select(SQL_HILERAS_CON_CUARTEL, columnas, CAMPOS_CON_CUARTEL))
         
         hileras = cursor.fetchall()
         cursor.close()
         conn.close()
         
         return jsonify(hileras), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -332,6 +407,7 @@ def agregar_multiples_hileras():
             return jsonify({"error": "Faltan campos requeridos: id_cuartel y n_hileras"}), 400
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         # Contar cuántas hileras existen actualmente para ese cuartel
         cursor.execute("SELECT COUNT(*) as total FROM general_dim_hilera WHERE id_cuartel = %s", (id_cuartel,))
         total_actual = cursor.fetchone()['total']
@@ -342,6 +418,9 @@ def agregar_multiples_hileras():
             nuevas.append(i)
         # Actualizar n_hileras en la tabla cuartel
         cursor.execute("UPDATE general_dim_cuartel SET n_hileras = %s WHERE id = %s", (max(n_hileras, total_actual), id_cuartel))
+        if nuevas:
+            progreso.invalidar_cuartel(cursor, id_cuartel)
+        catalogos.registrar_cambio(cursor, 'general_dim_cuartel')
         conn.commit()
         cursor.close()
         conn.close()
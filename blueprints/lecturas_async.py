@@ -0,0 +1,101 @@
+"""
+Versiones asíncronas de los endpoints de lectura de plantas, hileras,
+registros y registromapeo, servidas por asgi.py con utils/db_async.py.
+
+Ejecutan las mismas consultas que los handlers síncronos (las constantes
+SQL_* de cada blueprint, con todas sus CAMPOS); HANDLERS las indexa por el
+endpoint de Flask al que reemplazan. Devuelven (datos, status).
+"""
+from utils import db_async
+from utils.campos import select
+from blueprints import hileras, plantas, registromapeo, registros
+
+
+# 🔹 Plantas
+async def obtener_plantas():
+    filas = await db_async.fetch_all(select(plantas.SQL_PLANTAS, plantas.CAMPOS))
+    return filas, 200
+
+
+async def obtener_planta(planta_id):
+    planta = await db_async.fetch_one(select(plantas.SQL_PLANTA, plantas.CAMPOS), (planta_id,))
+    if not planta:
+        return {"error": "Planta no encontrada"}, 404
+    return planta, 200
+
+
+async def obtener_plantas_por_hilera(hilera_id):
+    filas = await db_async.fetch_all(select(plantas.SQL_PLANTAS_POR_HILERA, plantas.CAMPOS), (hilera_id,))
+    return filas, 200
+
+
+# 🔹 Hileras
+async def obtener_hileras():
+    filas = await db_async.fetch_all(select(hileras.SQL_HILERAS, hileras.CAMPOS))
+    return filas, 200
+
+
+async def obtener_hilera(hilera_id):
+    hilera = await db_async.fetch_one(select(hileras.SQL_HILERA, hileras.CAMPOS), (hilera_id,))
+    if not hilera:
+        return {"error": "Hilera no encontrada"}, 404
+    return hilera, 200
+
+
+async def obtener_hileras_por_cuartel(cuartel_id):
+    filas = await db_async.fetch_all(select(hileras.SQL_HILERAS_POR_CUARTEL, hileras.CAMPOS), (cuartel_id,))
+    return filas, 200
+
+
+async def obtener_hileras_con_cuartel():
+    filas = await db_async.fetch_all(
+        select(hileras.SQL_HILERAS_CON_CUARTEL, hileras.CAMPOS_CON_CUARTEL, hileras.CAMPOS_CON_CUARTEL))
+    return filas, 200
+
+
+# 🔹 Registros
+async def obtener_registros():
+    filas = await db_async.fetch_all(select(registros.SQL_REGISTROS, registros.CAMPOS))
+    return filas, 200
+
+
+async def obtener_registro(registro_id):
+    registro = await db_async.fetch_one(select(registros.SQL_REGISTRO, registros.CAMPOS), (registro_id,))
+    if not registro:
+        return {"error": "Registro no encontrado"}, 404
+    return registro, 200
+
+
+async def obtener_registros_por_hilera(hilera_id):
+    filas = await db_async.fetch_all(
+        select(registros.SQL_REGISTROS_POR_HILERA, registros.CAMPOS_POR_HILERA, registros.CAMPOS_POR_HILERA), (hilera_id,))
+    return filas, 200
+
+
+# 🔹 Registros de mapeo
+async def obtener_registros_mapeo():
+    filas = await db_async.fetch_all(select(registromapeo.SQL_REGISTROS_MAPEO, registromapeo.CAMPOS))
+    return filas, 200
+
+
+async def obtener_registro_mapeo(registro_id):
+    registro = await db_async.fetch_one(select(registromapeo.SQL_REGISTRO_MAPEO, registromapeo.CAMPOS), (registro_id,))
+    if not registro:
+        return {"error": "Registro de mapeo no encontrado"}, 404
+    return registro, 200
+
+
+HANDLERS = {
+    'plantas_bp.obtener_plantas': obtener_plantas,
+    'plantas_bp.obtener_planta': obtener_planta,
+    'plantas_bp.obtener_plantas_por_hilera': obtener_plantas_por_hilera,
+    'hileras_bp.obtener_hileras': obtener_hileras,
+    'hileras_bp.obtener_hilera': obtener_hilera,
+    'hileras_bp.obtener_hileras_por_cuartel': obtener_hileras_por_cuartel,
+    'hileras_bp.obtener_hileras_con_cuartel': obtener_hileras_con_cuartel,
+    'registros_bp.obtener_registros': obtener_registros,
+    'registros_bp.obtener_registro': obtener_registro,
+    'registros_bp.obtener_registros_por_hilera': obtener_registros_por_hilera,
+    'registromapeo_bp.obtener_registros_mapeo': obtener_registros_mapeo,
+    'registromapeo_bp.obtener_registro_mapeo': obtener_registro_mapeo,
+}
@@ -1,6 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from utils.db import get_db_connection
+from utils.db import get_request_connection, get_db_metrics
+from utils import catalogos
+from utils.singleflight import get_single_flight_stats
+from blueprints.usuarios import verificar_admin
 #from blueprints.auth import token_requerido
 import uuid
 
@@ -9,11 +12,12 @@ opciones_bp = Blueprint('opciones_bp', __name__)
 # Endpoint raíz para el blueprint
 @opciones_bp.route('/', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@catalogos.condicional('general_dim_labor', 'tarja_dim_unidad', 'general_dim_cecotipo')
 def opciones_root():
     if request.method == 'OPTIONS':
         return '', 200
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("SELECT id, nombre FROM general_dim_labor ORDER BY nombre ASC")
@@ -45,12 +49,13 @@ def opciones_root():
 # Obtener sucursales del usuario logueado
 @opciones_bp.route('/sucursales', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@catalogos.condicional('general_dim_sucursal', 'usuario_pivot_sucursal_usuario', por_usuario=True)
 def obtener_sucursales():
     if request.method == 'OPTIONS':
         return '', 200
     try:
         usuario_id = get_jwt_identity()
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         # Obtener sucursales permitidas para el usuario
@@ -77,11 +82,12 @@ def obtener_sucursales():
 # Obtener empresas
 @opciones_bp.route('/empresas', methods=['GET', 'OPTIONS'])
 @jwt_required()
+@catalogos.condicional('general_dim_empresa')
 def obtener_empresas():
     if request.method == 'OPTIONS':
         return '', 200
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         # Obtener todas las empresas ordenadas por nombre
@@ -103,6 +109,21 @@ def obtener_empresas():
         return jsonify({"error": str(e)}), 500
 
 
+# 🔹 Métricas del worker: pools, circuit breakers, réplicas y single-flight (solo admin)
+@opciones_bp.route('/metricas', methods=['GET'])
+@jwt_required()
+def obtener_metricas():
+    try:
+        if not verificar_admin(get_jwt_identity()):
+            return jsonify({"error": "No autorizado"}), 403
+
+        response = jsonify({"db": get_db_metrics(), "single_flight": get_single_flight_stats()})
+        response.headers['Cache-Control'] = 'no-store'
+        return response, 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # Listar todas las rutas registradas
 @opciones_bp.route('/rutas', methods=['GET'])
 def listar_rutas():
@@ -1,6 +1,9 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.db import get_db_connection
+from utils.streaming import stream_format, stream_query
+from utils.deadlines import time_budget
+from utils import campos, columnar, paginacion, progreso, progreso_stream
 from datetime import datetime, date
 import uuid
 import logging
@@ -8,25 +11,65 @@ import traceback
 
 plantas_bp = Blueprint('plantas_bp', __name__)
 
+# Columnas que se pueden pedir con ?fields=
+CAMPOS = ('id', 'id_hilera', 'planta', 'ubicacion', 'fecha_creacion')
+
+# Columnas codificadas por diccionario en ?format=columns (valores muy repetidos)
+COLUMNAS_DICCIONARIO = ('id_hilera',)
+
+# Lecturas compartidas con su versión asíncrona (blueprints/lecturas_async.py);
+# {columnas} es la lista del SELECT (CAMPOS o lo pedido en ?fields=)
+SQL_PLANTAS = """
+    SELECT {columnas}
+    FROM general_dim_planta
+    ORDER BY planta ASC
+"""
+SQL_PLANTA = """
+    SELECT {columnas}
+    FROM general_dim_planta
+    WHERE id = %s
+"""
+SQL_PLANTAS_POR_HILERA = """
+    SELECT {columnas}
+    FROM general_dim_planta
+    WHERE id_hilera = %s
+    ORDER BY planta ASC
+"""
+
 # 🔹 Obtener todas las plantas
 @plantas_bp.route('/', methods=['GET'])
 @jwt_required()
 def obtener_plantas():
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
+        query = campos.select(SQL_PLANTAS, columnas)
+        
+        # Modo streaming (?stream=1 o Accept: application/x-ndjson)
+        formato = stream_format()
+        if formato:
+            return stream_query(query, fmt=formato)
+        
+        # Paginación por cursor (?limit=&cursor=)
+        if paginacion.pedida():
+            return paginacion.paginar(columnas, "FROM general_dim_planta", 'planta', codificar=COLUMNAS_DICCIONARIO)
+        
+        # Formato columnar (?format=columns)
+        if columnar.pedido():
+            return columnar.respuesta(query, codificar=COLUMNAS_DICCIONARIO)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_hilera, planta, ubicacion, fecha_creacion
-            FROM general_dim_planta
-            ORDER BY planta ASC
-        """)
+        cursor.execute(query)
         
         plantas = cursor.fetchall()
         cursor.close()
         conn.close()
         
         return jsonify(plantas), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -35,14 +78,12 @@ def obtener_plantas():
 @jwt_required()
 def obtener_planta(planta_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_hilera, planta, ubicacion, fecha_creacion
-            FROM general_dim_planta
-            WHERE id = %s
-        """, (planta_id,))
+        cursor.execute(campos.select(SQL_PLANTA, columnas), (planta_id,))
         
         planta = cursor.fetchone()
         cursor.close()
@@ -52,6 +93,8 @@ def obtener_planta(planta_id):
             return jsonify({"error": "Planta no encontrada"}), 404
         
         return jsonify(planta), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -79,6 +122,7 @@ def crear_planta():
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que la hilera existe
         logger.info(f"🔍 Verificando hilera {data['id_hilera']}...")
@@ -126,10 +170,15 @@ def crear_planta():
         planta_id = cursor.lastrowid
         logger.info(f"✅ Planta creada con ID: {planta_id}")
         
+        # Una planta más en la hilera para los contadores de progreso
+        progreso.ajustar_total_plantas(cursor, data['id_hilera'], 1)
+        
         conn.commit()
         cursor.close()
         conn.close()
         
+        progreso_stream.notificar_todos()
+        
         return jsonify({
             "message": "Planta creada exitosamente",
             "id": planta_id
@@ -150,13 +199,15 @@ def actualizar_planta(planta_id):
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que la planta existe
         cursor.execute("""
-            SELECT id FROM general_dim_planta WHERE id = %s
+            SELECT id, id_hilera FROM general_dim_planta WHERE id = %s
         """, (planta_id,))
         
-        if not cursor.fetchone():
+        planta_actual = cursor.fetchone()
+        if not planta_actual:
             cursor.close()
             conn.close()
             return jsonify({"error": "Planta no encontrada"}), 404
@@ -187,10 +238,18 @@ def actualizar_planta(planta_id):
         """
         
         cursor.execute(query, valores)
+        
+        # La planta (y sus registros) cambió de hilera
+        if 'id_hilera' in data and str(data['id_hilera']) != str(planta_actual['id_hilera']):
+            progreso.refrescar_hileras(cursor, [planta_actual['id_hilera'], data['id_hilera']])
+        
         conn.commit()
         cursor.close()
         conn.close()
         
+        if 'id_hilera' in data:
+            progreso_stream.notificar_todos()
+        
         return jsonify({
             "message": "Planta actualizada exitosamente",
             "id": planta_id
@@ -205,13 +264,15 @@ def eliminar_planta(planta_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que la planta existe
         cursor.execute("""
-            SELECT id FROM general_dim_planta WHERE id = %s
+            SELECT id, id_hilera FROM general_dim_planta WHERE id = %s
         """, (planta_id,))
         
-        if not cursor.fetchone():
+        planta_actual = cursor.fetchone()
+        if not planta_actual:
             cursor.close()
             conn.close()
             return jsonify({"error": "Planta no encontrada"}), 404
@@ -221,10 +282,15 @@ def eliminar_planta(planta_id):
             DELETE FROM general_dim_planta WHERE id = %s
         """, (planta_id,))
         
+        # Recalcular la hilera: cambia el total y pueden caer registros de la planta
+        progreso.refrescar_hileras(cursor, [planta_actual['id_hilera']])
+        
         conn.commit()
         cursor.close()
         conn.close()
         
+        progreso_stream.notificar_todos()
+        
         return jsonify({
             "message": "Planta eliminada exitosamente",
             "id": planta_id
@@ -237,34 +303,36 @@ def eliminar_planta(planta_id):
 @jwt_required()
 def obtener_plantas_por_hilera(hilera_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_hilera, planta, ubicacion, fecha_creacion
-            FROM general_dim_planta
-            WHERE id_hilera = %s
-            ORDER BY planta ASC
-        """, (hilera_id,))
+        cursor.execute(campos.select(SQL_PLANTAS_POR_HILERA, columnas), (hilera_id,))
         
         plantas = cursor.fetchall()
         cursor.close()
         conn.close()
         
         return jsonify(plantas), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # 🔹 Buscar plantas por ubicación
 @plantas_bp.route('/ubicacion/<string:ubicacion>', methods=['GET'])
 @jwt_required()
+@time_budget(5000)  # LIKE '%x%' recorre la tabla completa
 def buscar_plantas_por_ubicacion(ubicacion):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_hilera, planta, ubicacion, fecha_creacion
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM general_dim_planta
             WHERE ubicacion LIKE %s
             ORDER BY planta ASC
@@ -275,6 +343,8 @@ def buscar_plantas_por_ubicacion(ubicacion):
         conn.close()
         
         return jsonify(plantas), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -283,11 +353,13 @@ def buscar_plantas_por_ubicacion(ubicacion):
 @jwt_required()
 def obtener_plantas_por_numero(numero_planta):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_hilera, planta, ubicacion, fecha_creacion
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM general_dim_planta
             WHERE planta = %s
             ORDER BY planta ASC
@@ -298,5 +370,7 @@ def obtener_plantas_por_numero(numero_planta):
         conn.close()
         
         return jsonify(plantas), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500 
\ No newline at end of file
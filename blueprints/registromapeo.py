@@ -1,30 +1,70 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from utils.db import get_db_connection
-from datetime import datetime
+from utils.db import get_db_connection, force_primary
+from utils.deadlines import time_budget
+from utils.singleflight import single_flight
+from utils.streaming import stream_format, stream_query
+from utils import campos, estadisticas, paginacion, progreso, progreso_stream, serializacion, versiones
+from datetime import date, datetime
 import uuid
 
 registromapeo_bp = Blueprint('registromapeo_bp', __name__)
 
+# Columnas que se pueden pedir con ?fields=
+CAMPOS = ('id', 'id_temporada', 'id_cuartel', 'fecha_inicio', 'fecha_termino', 'id_estado')
+
+# Lecturas compartidas con su versión asíncrona (blueprints/lecturas_async.py);
+# {columnas} es la lista del SELECT (CAMPOS o lo pedido en ?fields=)
+SQL_REGISTROS_MAPEO = """
+    SELECT {columnas}
+    FROM mapeo_fact_registromapeo
+    ORDER BY fecha_inicio DESC
+"""
+SQL_REGISTRO_MAPEO = """
+    SELECT {columnas}
+    FROM mapeo_fact_registromapeo
+    WHERE id = %s
+"""
+
+
+def _leer_fecha(valor):
+    """Fecha 'YYYY-MM-DD' (JSON) o timestamp nativo de un cuerpo MessagePack/CBOR."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
 # 🔹 Obtener todos los registros de mapeo
 @registromapeo_bp.route('/', methods=['GET'])
 @jwt_required()
 def obtener_registros_mapeo():
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
+        query = campos.select(SQL_REGISTROS_MAPEO, columnas)
+        
+        # Modo streaming (?stream=1 o Accept: application/x-ndjson)
+        formato = stream_format()
+        if formato:
+            return stream_query(query, fmt=formato)
+        
+        # Paginación por cursor (?limit=&cursor=)
+        if paginacion.pedida():
+            return paginacion.paginar(columnas, "FROM mapeo_fact_registromapeo", 'fecha_inicio', descendente=True)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_temporada, id_cuartel, fecha_inicio, fecha_termino, id_estado
-            FROM mapeo_fact_registromapeo
-            ORDER BY fecha_inicio DESC
-        """)
+        cursor.execute(query)
         
         registros = cursor.fetchall()
         cursor.close()
         conn.close()
         
         return jsonify(registros), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -33,14 +73,12 @@ def obtener_registros_mapeo():
 @jwt_required()
 def obtener_registro_mapeo(registro_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_temporada, id_cuartel, fecha_inicio, fecha_termino, id_estado
-            FROM mapeo_fact_registromapeo
-            WHERE id = %s
-        """, (registro_id,))
+        cursor.execute(campos.select(SQL_REGISTRO_MAPEO, columnas), (registro_id,))
         
         registro = cursor.fetchone()
         cursor.close()
@@ -50,6 +88,8 @@ def obtener_registro_mapeo(registro_id):
             return jsonify({"error": "Registro de mapeo no encontrado"}), 404
         
         return jsonify(registro), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -76,11 +116,11 @@ def crear_registro_mapeo():
         
         # Validar formato de fechas
         try:
-            fecha_inicio = datetime.strptime(data['fecha_inicio'], '%Y-%m-%d').date()
+            fecha_inicio = _leer_fecha(data['fecha_inicio'])
             fecha_termino = None
             if 'fecha_termino' in data and data['fecha_termino']:
-                fecha_termino = datetime.strptime(data['fecha_termino'], '%Y-%m-%d').date()
-        except ValueError:
+                fecha_termino = _leer_fecha(data['fecha_termino'])
+        except (ValueError, TypeError):
             return jsonify({"error": "Las fechas deben estar en formato YYYY-MM-DD"}), 400
         
         # Generar ID único
@@ -88,6 +128,7 @@ def crear_registro_mapeo():
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Insertar el nuevo registro de mapeo
         cursor.execute("""
@@ -103,10 +144,15 @@ def crear_registro_mapeo():
             id_estado
         ))
         
+        # Contadores de progreso de las hileras del cuartel
+        progreso.reconstruir_registro(cursor, registro_id)
+        
         conn.commit()
         cursor.close()
         conn.close()
         
+        estadisticas.aplicar(nuevo={"id": registro_id, "id_temporada": id_temporada, "id_cuartel": id_cuartel, "id_estado": id_estado})
+        
         return jsonify({
             "mensaje": "Registro de mapeo creado exitosamente",
             "id": registro_id
@@ -124,13 +170,15 @@ def actualizar_registro_mapeo(registro_id):
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar si el registro existe
         cursor.execute("""
-            SELECT id FROM mapeo_fact_registromapeo WHERE id = %s
+            SELECT id, id_temporada, id_cuartel, id_estado FROM mapeo_fact_registromapeo WHERE id = %s
         """, (registro_id,))
         
-        if not cursor.fetchone():
+        anterior = cursor.fetchone()
+        if not anterior:
             cursor.close()
             conn.close()
             return jsonify({"error": "Registro de mapeo no encontrado"}), 404
@@ -144,10 +192,10 @@ def actualizar_registro_mapeo(registro_id):
             if campo in data:
                 if campo in ['fecha_inicio', 'fecha_termino']:
                     try:
-                        fecha = datetime.strptime(data[campo], '%Y-%m-%d').date()
+                        fecha = _leer_fecha(data[campo])
                         campos_a_actualizar.append(f"{campo} = %s")
                         valores.append(fecha)
-                    except ValueError:
+                    except (ValueError, TypeError):
                         return jsonify({"error": f"La fecha {campo} debe estar en formato YYYY-MM-DD"}), 400
                 elif campo in ['id_temporada', 'id_cuartel', 'id_estado']:
                     try:
@@ -170,10 +218,21 @@ def actualizar_registro_mapeo(registro_id):
         """
         
         cursor.execute(query, valores)
+        if 'id_cuartel' in data:
+            # Cambió el cuartel: los contadores pasan a sus hileras
+            progreso.reconstruir_registro(cursor, registro_id)
         conn.commit()
         cursor.close()
         conn.close()
         
+        progreso_stream.notificar(registro_id)
+        
+        nuevo = dict(anterior)
+        for campo in ('id_temporada', 'id_cuartel', 'id_estado'):
+            if campo in data:
+                nuevo[campo] = int(data[campo])
+        estadisticas.aplicar(anterior, nuevo)
+        
         return jsonify({"mensaje": "Registro de mapeo actualizado exitosamente"}), 200
         
     except Exception as e:
@@ -189,10 +248,11 @@ def eliminar_registro_mapeo(registro_id):
         
         # Verificar si el registro existe
         cursor.execute("""
-            SELECT id FROM mapeo_fact_registromapeo WHERE id = %s
+            SELECT id, id_temporada, id_cuartel, id_estado FROM mapeo_fact_registromapeo WHERE id = %s
         """, (registro_id,))
         
-        if not cursor.fetchone():
+        anterior = cursor.fetchone()
+        if not anterior:
             cursor.close()
             conn.close()
             return jsonify({"error": "Registro de mapeo no encontrado"}), 404
@@ -206,6 +266,9 @@ def eliminar_registro_mapeo(registro_id):
         cursor.close()
         conn.close()
         
+        progreso_stream.notificar(registro_id)
+        estadisticas.aplicar(anterior=anterior)
+        
         return jsonify({"mensaje": "Registro de mapeo eliminado exitosamente"}), 200
         
     except Exception as e:
@@ -216,11 +279,13 @@ def eliminar_registro_mapeo(registro_id):
 @jwt_required()
 def obtener_registros_por_temporada(temporada_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_temporada, id_cuartel, fecha_inicio, fecha_termino, id_estado
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM mapeo_fact_registromapeo
             WHERE id_temporada = %s
             ORDER BY fecha_inicio DESC
@@ -231,6 +296,8 @@ def obtener_registros_por_temporada(temporada_id):
         conn.close()
         
         return jsonify(registros), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -239,11 +306,13 @@ def obtener_registros_por_temporada(temporada_id):
 @jwt_required()
 def obtener_registros_por_cuartel(cuartel_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_temporada, id_cuartel, fecha_inicio, fecha_termino, id_estado
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM mapeo_fact_registromapeo
             WHERE id_cuartel = %s
             ORDER BY fecha_inicio DESC
@@ -254,6 +323,8 @@ def obtener_registros_por_cuartel(cuartel_id):
         conn.close()
         
         return jsonify(registros), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -262,11 +333,13 @@ def obtener_registros_por_cuartel(cuartel_id):
 @jwt_required()
 def obtener_registros_por_estado(estado_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_temporada, id_cuartel, fecha_inicio, fecha_termino, id_estado
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM mapeo_fact_registromapeo
             WHERE id_estado = %s
             ORDER BY fecha_inicio DESC
@@ -277,166 +350,135 @@ def obtener_registros_por_estado(estado_id):
         conn.close()
         
         return jsonify(registros), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# 🔹 Progreso de varios registros de mapeo (dashboards)
+# ?ids=a,b,c y/o ?temporada=<id>&estado=<id>; ?detalle=1 incluye las hileras
+@registromapeo_bp.route('/progreso', methods=['GET'])
+@jwt_required()
+@force_primary
+@time_budget(15000)
+def obtener_progreso_registros():
+    try:
+        ids = [i.strip() for i in request.args.get('ids', '').split(',') if i.strip()]
+        temporada = request.args.get('temporada', type=int)
+        estado = request.args.get('estado', type=int)
+        if (temporada is None and 'temporada' in request.args) or (estado is None and 'estado' in request.args):
+            return jsonify({"error": "Los parámetros temporada y estado deben ser números válidos"}), 400
+        detalle = request.args.get('detalle', '').lower() in ('1', 'true')
+        
+        if not ids and temporada is None and estado is None:
+            return jsonify({"error": "Debe indicar ids, temporada o estado"}), 400
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        resultados = progreso.calcular_lote(cursor, ids=ids, temporada=temporada, estado=estado, detalle=detalle)
+        
+        cursor.close()
+        conn.close()
+        
+        return jsonify(resultados), 200
+        
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # 🔹 NUEVO: Obtener progreso en tiempo real de un registro de mapeo
 @registromapeo_bp.route('/<string:registro_id>/progreso', methods=['GET'])
 @jwt_required()
+@force_primary  # el progreso se consulta justo después de registrar plantas
+@time_budget(10000)
+@single_flight
 def obtener_progreso_registro(registro_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        # Obtener información del registro y cuartel
-        cursor.execute("""
-            SELECT rm.id, rm.id_cuartel, c.nombre as nombre_cuartel
-            FROM mapeo_fact_registromapeo rm
-            LEFT JOIN general_dim_cuartel c ON rm.id_cuartel = c.id
-            WHERE rm.id = %s
-        """, (registro_id,))
+        # La versión cambia con cada escritura que afecta al registro: si el
+        # cliente ya tiene esa versión (If-None-Match) o está en caché no se recalcula
+        version = versiones.obtener(cursor, progreso.clave_version(registro_id))
+        formato = serializacion.formato_respuesta()
+        etag = progreso.etag(registro_id, version, formato)
         
-        registro = cursor.fetchone()
-        if not registro:
+        if request.if_none_match.contains_weak(etag):
             cursor.close()
             conn.close()
-            return jsonify({"error": "Registro de mapeo no encontrado"}), 404
-        
-        # Obtener todas las hileras del cuartel
-        cursor.execute("""
-            SELECT id, nombre, id_cuartel
-            FROM general_dim_hilera
-            WHERE id_cuartel = %s
-            ORDER BY nombre ASC
-        """, (registro['id_cuartel'],))
-        
-        hileras = cursor.fetchall()
-        total_hileras = len(hileras)
-        hileras_completadas = 0
-        
-        # Calcular progreso por hilera
-        hileras_con_progreso = []
-        for hilera in hileras:
-            # Obtener total de plantas en la hilera
-            cursor.execute("""
-                SELECT COUNT(*) as total_plantas
-                FROM general_dim_planta
-                WHERE id_hilera = %s
-            """, (hilera['id'],))
-            
-            total_plantas_result = cursor.fetchone()
-            total_plantas = total_plantas_result['total_plantas'] if total_plantas_result else 0
-            
-            # Obtener plantas mapeadas en esta hilera para este registro
-            cursor.execute("""
-                SELECT COUNT(*) as plantas_mapeadas
-                FROM mapeo_fact_registro r
-                INNER JOIN general_dim_planta p ON r.id_planta = p.id
-                WHERE p.id_hilera = %s AND r.id_evaluador IN (
-                    SELECT id_evaluador FROM mapeo_fact_registromapeo WHERE id = %s
-                )
-            """, (hilera['id'], registro_id))
-            
-            plantas_mapeadas_result = cursor.fetchone()
-            plantas_mapeadas = plantas_mapeadas_result['plantas_mapeadas'] if plantas_mapeadas_result else 0
-            
-            # Calcular porcentaje
-            porcentaje = (plantas_mapeadas / total_plantas * 100) if total_plantas > 0 else 0
-            
-            # Obtener estado de hilera desde la tabla de estados
-            cursor.execute("""
-                SELECT estado FROM mapeo_fact_estado_hilera 
-                WHERE id_registro_mapeo = %s AND id_hilera = %s
-            """, (registro_id, hilera['id']))
-            
-            estado_result = cursor.fetchone()
-            if estado_result:
-                estado = estado_result['estado']
-            else:
-                # Si no hay estado definido, calcularlo basado en plantas mapeadas
-                if plantas_mapeadas == 0:
-                    estado = "pendiente"
-                elif plantas_mapeadas == total_plantas:
-                    estado = "completado"
-                else:
-                    estado = "en_progreso"
-            
-            # Contar hileras completadas
-            if estado == "completado":
-                hileras_completadas += 1
+            response = Response(status=304)
+        else:
+            cuerpo = progreso.cache_respuestas.get((registro_id, version, formato))
+            if cuerpo is None:
+                resultado, reconstruida = progreso.calcular(cursor, registro_id)
+                if resultado is None:
+                    cursor.close()
+                    conn.close()
+                    return jsonify({"error": "Registro de mapeo no encontrado"}), 404
+                if reconstruida is not None:
+                    # Reconstruir contadores creó una versión nueva: caché y ETag con esa
+                    version = reconstruida
+                    etag = progreso.etag(registro_id, version, formato)
+                cuerpo = jsonify(resultado).get_data()
+                progreso.cache_respuestas.set((registro_id, version, formato), cuerpo)
             
-            hileras_con_progreso.append({
-                "id_hilera": hilera['id'],
-                "nombre": hilera['nombre'],
-                "total_plantas": total_plantas,
-                "plantas_mapeadas": plantas_mapeadas,
-                "porcentaje": round(porcentaje, 2),
-                "estado": estado
-            })
-        
-        # Calcular porcentaje general
-        porcentaje_general = (hileras_completadas / total_hileras * 100) if total_hileras > 0 else 0
+            cursor.close()
+            conn.close()
+            response = Response(cuerpo, status=200, mimetype=formato)
         
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "id_registro": registro_id,
-            "cuartel": registro['nombre_cuartel'],
-            "total_hileras": total_hileras,
-            "hileras_completadas": hileras_completadas,
-            "porcentaje_general": round(porcentaje_general, 2),
-            "hileras": hileras_con_progreso
-        }), 200
+        # JSON, MessagePack y CBOR son representaciones distintas: cada una con su ETag
+        response.vary.add('Accept')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# 🔹 NUEVO: Obtener estadísticas generales de registros de mapeo
-@registromapeo_bp.route('/estadisticas', methods=['GET'])
+# 🔹 Progreso en vivo (Server-Sent Events): estado completo y luego solo las hileras que cambian
+@registromapeo_bp.route('/<string:registro_id>/progreso/stream', methods=['GET'])
 @jwt_required()
-def obtener_estadisticas():
+@force_primary
+def stream_progreso_registro(registro_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        # Obtener total de registros
-        cursor.execute("SELECT COUNT(*) as total FROM mapeo_fact_registromapeo")
-        total_registros = cursor.fetchone()['total']
-        
-        # Obtener registros por estado
         cursor.execute("""
-            SELECT id_estado, COUNT(*) as cantidad
-            FROM mapeo_fact_registromapeo
-            GROUP BY id_estado
-        """)
-        
-        estados = cursor.fetchall()
-        en_progreso = 0
-        finalizados = 0
-        pausados = 0
-        
-        for estado in estados:
-            if estado['id_estado'] == 1:  # En progreso
-                en_progreso = estado['cantidad']
-            elif estado['id_estado'] == 2:  # Finalizado
-                finalizados = estado['cantidad']
-            elif estado['id_estado'] == 3:  # Pausado
-                pausados = estado['cantidad']
-        
-        # Calcular porcentaje completado general
-        porcentaje_completado = (finalizados / total_registros * 100) if total_registros > 0 else 0
+            SELECT id FROM mapeo_fact_registromapeo WHERE id = %s
+        """, (registro_id,))
+        existe = cursor.fetchone()
         
         cursor.close()
         conn.close()
         
-        return jsonify({
-            "total_registros": total_registros,
-            "en_progreso": en_progreso,
-            "finalizados": finalizados,
-            "pausados": pausados,
-            "porcentaje_completado_general": round(porcentaje_completado, 2)
-        }), 200
+        if not existe:
+            return jsonify({"error": "Registro de mapeo no encontrado"}), 404
+        return progreso_stream.respuesta_sse(registro_id)
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# 🔹 NUEVO: Obtener estadísticas generales de registros de mapeo
+@registromapeo_bp.route('/estadisticas', methods=['GET'])
+@jwt_required()
+def obtener_estadisticas():
+    try:
+        # Filtros opcionales y ?desglose=temporada,cuartel,sucursal
+        temporada = request.args.get('temporada', type=int)
+        cuartel = request.args.get('cuartel', type=int)
+        sucursal = request.args.get('sucursal', type=int)
+        invalidos = [p for p, v in (('temporada', temporada), ('cuartel', cuartel), ('sucursal', sucursal))
+                     if v is None and p in request.args]
+        if invalidos:
+            return jsonify({"error": f"Los parámetros {', '.join(invalidos)} deben ser números válidos"}), 400
+        desglose = [d.strip() for d in request.args.get('desglose', '').split(',') if d.strip()]
+        invalidos = [d for d in desglose if d not in estadisticas.DESGLOSES]
+        if invalidos:
+            return jsonify({"error": f"Desglose no válido: {', '.join(invalidos)}. Opciones: {', '.join(estadisticas.DESGLOSES)}"}), 400
+        
+        resultado = estadisticas.obtener(temporada=temporada, cuartel=cuartel, sucursal=sucursal, desglose=desglose)
+        return jsonify(resultado), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -455,6 +497,7 @@ def actualizar_estado_hilera(registro_id, hilera_id):
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que el registro existe
         cursor.execute("""
@@ -500,6 +543,7 @@ def actualizar_estado_hilera(registro_id, hilera_id):
                 VALUES (%s, %s, %s, %s, %s)
             """, (estado_id, registro_id, hilera_id, estado, usuario_id))
         
+        progreso.invalidar_registro(cursor, registro_id)
         conn.commit()
         
         # Obtener el estado actualizado
@@ -515,6 +559,8 @@ def actualizar_estado_hilera(registro_id, hilera_id):
         cursor.close()
         conn.close()
         
+        progreso_stream.notificar(registro_id)
+        
         return jsonify({
             "success": True,
             "hilera_actualizada": {
@@ -526,4 +572,108 @@ def actualizar_estado_hilera(registro_id, hilera_id):
         }), 200
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500 
+
+# 🔹 Actualizar el estado de varias hileras de un registro en una sola transacción
+# Body: {"hileras": [{"id_hilera": 1, "estado": "completado"}, ...]}
+@registromapeo_bp.route('/<string:registro_id>/hileras/estado', methods=['PUT'])
+@jwt_required()
+def actualizar_estados_hileras(registro_id):
+    try:
+        data = request.json or {}
+        usuario_id = get_jwt_identity()
+        
+        hileras = data.get('hileras')
+        if not isinstance(hileras, list) or not hileras:
+            return jsonify({"error": "Campo requerido: hileras (lista de {id_hilera, estado})"}), 400
+        
+        # Validar pares; si una hilera se repite vale el último estado
+        estados = {}
+        for item in hileras:
+            try:
+                id_hilera = int(item['id_hilera'])
+                estado = item['estado']
+            except (KeyError, ValueError, TypeError):
+                return jsonify({"error": "Cada elemento debe tener id_hilera (número) y estado"}), 400
+            if estado not in ['en_progreso', 'pausado', 'completado']:
+                return jsonify({"error": "Estado debe ser: en_progreso, pausado o completado"}), 400
+            estados[id_hilera] = estado
+        
+        ids_hileras = list(estados)
+        marcadores = ', '.join(['%s'] * len(ids_hileras))
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
+        
+        # Verificar que el registro existe
+        cursor.execute("""
+            SELECT id, id_cuartel FROM mapeo_fact_registromapeo WHERE id = %s
+        """, (registro_id,))
+        
+        registro = cursor.fetchone()
+        if not registro:
+            cursor.close()
+            conn.close()
+            return jsonify({"error": "Registro de mapeo no encontrado"}), 404
+        
+        # Verificar que todas las hileras existen y son del cuartel del registro
+        cursor.execute(f"""
+            SELECT id FROM general_dim_hilera WHERE id IN ({marcadores}) AND id_cuartel = %s
+        """, (*ids_hileras, registro['id_cuartel']))
+        
+        existentes = {fila['id'] for fila in cursor.fetchall()}
+        faltantes = [h for h in ids_hileras if h not in existentes]
+        if faltantes:
+            cursor.close()
+            conn.close()
+            return jsonify({"error": "Hileras no encontradas en el cuartel del registro", "hileras": faltantes}), 404
+        
+        # Crear o actualizar todos los estados (clave única unique_registro_hilera)
+        valores = []
+        for id_hilera, estado in estados.items():
+            valores.extend((str(uuid.uuid4()), registro_id, id_hilera, estado, usuario_id))
+        cursor.execute(f"""
+            INSERT INTO mapeo_fact_estado_hilera 
+            (id, id_registro_mapeo, id_hilera, estado, id_usuario)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(estados))}
+            ON DUPLICATE KEY UPDATE
+                estado = VALUES(estado),
+                id_usuario = VALUES(id_usuario),
+                fecha_actualizacion = NOW()
+        """, tuple(valores))
+        
+        progreso.invalidar_registro(cursor, registro_id)
+        conn.commit()
+        
+        # Obtener los estados resultantes
+        cursor.execute(f"""
+            SELECT eh.id_hilera, eh.estado, eh.fecha_actualizacion, h.nombre as nombre_hilera
+            FROM mapeo_fact_estado_hilera eh
+            INNER JOIN general_dim_hilera h ON eh.id_hilera = h.id
+            WHERE eh.id_registro_mapeo = %s AND eh.id_hilera IN ({marcadores})
+            ORDER BY h.nombre ASC
+        """, (registro_id, *ids_hileras))
+        
+        actualizadas = cursor.fetchall()
+        
+        cursor.close()
+        conn.close()
+        
+        progreso_stream.notificar(registro_id)
+        
+        return jsonify({
+            "success": True,
+            "hileras_actualizadas": [
+                {
+                    "id_hilera": fila['id_hilera'],
+                    "nombre_hilera": fila['nombre_hilera'],
+                    "estado": fila['estado'],
+                    "fecha_actualizacion": fila['fecha_actualizacion'].isoformat() if fila['fecha_actualizacion'] else None
+                }
+                for fila in actualizadas
+            ]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
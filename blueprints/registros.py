@@ -1,30 +1,87 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from utils.db import get_db_connection
+from utils.streaming import stream_format, stream_query
+from utils import campos, columnar, paginacion, progreso, progreso_stream
 from datetime import datetime
 import uuid
 
 registros_bp = Blueprint('registros_bp', __name__)
 
+# Columnas que se pueden pedir con ?fields=
+CAMPOS = ('id', 'id_evaluador', 'hora_registro', 'id_planta', 'id_tipoplanta', 'imagen')
+
+# Campos de ?fields= en los registros por hilera (JOIN con planta y tipo de planta)
+CAMPOS_POR_HILERA = {
+    'id': 'r.id',
+    'id_evaluador': 'r.id_evaluador',
+    'hora_registro': 'r.hora_registro',
+    'id_planta': 'r.id_planta',
+    'id_tipoplanta': 'r.id_tipoplanta',
+    'imagen': 'r.imagen',
+    'numero_planta': 'p.planta as numero_planta',
+    'ubicacion': 'p.ubicacion',
+    'tipo_planta_nombre': 'tp.nombre as tipo_planta_nombre',
+}
+
+# Columnas codificadas por diccionario en ?format=columns (valores muy repetidos)
+COLUMNAS_DICCIONARIO = ('id_evaluador', 'id_tipoplanta')
+
+# Lecturas compartidas con su versión asíncrona (blueprints/lecturas_async.py);
+# {columnas} es la lista del SELECT (CAMPOS o lo pedido en ?fields=)
+SQL_REGISTROS = """
+    SELECT {columnas}
+    FROM mapeo_fact_registro
+    ORDER BY hora_registro DESC
+"""
+SQL_REGISTRO = """
+    SELECT {columnas}
+    FROM mapeo_fact_registro
+    WHERE id = %s
+"""
+SQL_REGISTROS_POR_HILERA = """
+    SELECT {columnas}
+    FROM mapeo_fact_registro r
+    INNER JOIN general_dim_planta p ON r.id_planta = p.id
+    LEFT JOIN general_dim_tipoplanta tp ON r.id_tipoplanta = tp.id
+    WHERE p.id_hilera = %s
+    ORDER BY p.planta ASC, r.hora_registro DESC
+"""
+
 # 🔹 Obtener todos los registros
 @registros_bp.route('/', methods=['GET'])
 @jwt_required()
 def obtener_registros():
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
+        query = campos.select(SQL_REGISTROS, columnas)
+        
+        # Modo streaming (?stream=1 o Accept: application/x-ndjson)
+        formato = stream_format()
+        if formato:
+            return stream_query(query, fmt=formato)
+        
+        # Paginación por cursor (?limit=&cursor=)
+        if paginacion.pedida():
+            return paginacion.paginar(columnas, "FROM mapeo_fact_registro", 'hora_registro', descendente=True, codificar=COLUMNAS_DICCIONARIO)
+        
+        # Formato columnar (?format=columns)
+        if columnar.pedido():
+            return columnar.respuesta(query, codificar=COLUMNAS_DICCIONARIO)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_evaluador, hora_registro, id_planta, id_tipoplanta, imagen
-            FROM mapeo_fact_registro
-            ORDER BY hora_registro DESC
-        """)
+        cursor.execute(query)
         
         registros = cursor.fetchall()
         cursor.close()
         conn.close()
         
         return jsonify(registros), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -33,14 +90,12 @@ def obtener_registros():
 @jwt_required()
 def obtener_registro(registro_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_evaluador, hora_registro, id_planta, id_tipoplanta, imagen
-            FROM mapeo_fact_registro
-            WHERE id = %s
-        """, (registro_id,))
+        cursor.execute(campos.select(SQL_REGISTRO, columnas), (registro_id,))
         
         registro = cursor.fetchone()
         cursor.close()
@@ -50,6 +105,8 @@ def obtener_registro(registro_id):
             return jsonify({"error": "Registro no encontrado"}), 404
         
         return jsonify(registro), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -86,6 +143,7 @@ def crear_registro():
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Insertar el nuevo registro
         cursor.execute("""
@@ -101,10 +159,15 @@ def crear_registro():
             data.get('imagen', None)
         ))
         
+        # Una planta más mapeada en los registros de mapeo del evaluador
+        progreso.ajustar_mapeadas(cursor, id_planta, usuario_id, 1)
+        
         conn.commit()
         cursor.close()
         conn.close()
         
+        progreso_stream.notificar_evaluador(usuario_id)
+        
         logger.info(f"✅ Registro creado exitosamente con id: {registro_id}")
         return jsonify({
             "message": "Registro creado exitosamente",
@@ -129,13 +192,15 @@ def actualizar_registro(registro_id):
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que el registro existe
         cursor.execute("""
-            SELECT id FROM mapeo_fact_registro WHERE id = %s
+            SELECT id, id_planta, id_evaluador FROM mapeo_fact_registro WHERE id = %s
         """, (registro_id,))
         
-        if not cursor.fetchone():
+        registro_actual = cursor.fetchone()
+        if not registro_actual:
             cursor.close()
             conn.close()
             return jsonify({"error": "Registro no encontrado"}), 404
@@ -177,10 +242,19 @@ def actualizar_registro(registro_id):
         """
         
         cursor.execute(query, valores)
+        
+        # Si cambió la planta, el registro cuenta en otra hilera
+        if 'id_planta' in data and id_planta != registro_actual['id_planta']:
+            progreso.ajustar_mapeadas(cursor, registro_actual['id_planta'], registro_actual['id_evaluador'], -1)
+            progreso.ajustar_mapeadas(cursor, id_planta, registro_actual['id_evaluador'], 1)
+        
         conn.commit()
         cursor.close()
         conn.close()
         
+        if 'id_planta' in data:
+            progreso_stream.notificar_evaluador(registro_actual['id_evaluador'])
+        
         logger.info(f"✅ Registro actualizado exitosamente: {registro_id}")
         return jsonify({
             "message": "Registro actualizado exitosamente",
@@ -197,13 +271,15 @@ def eliminar_registro(registro_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         
         # Verificar que el registro existe
         cursor.execute("""
-            SELECT id FROM mapeo_fact_registro WHERE id = %s
+            SELECT id, id_planta, id_evaluador FROM mapeo_fact_registro WHERE id = %s
         """, (registro_id,))
         
-        if not cursor.fetchone():
+        registro_actual = cursor.fetchone()
+        if not registro_actual:
             cursor.close()
             conn.close()
             return jsonify({"error": "Registro no encontrado"}), 404
@@ -213,10 +289,14 @@ def eliminar_registro(registro_id):
             DELETE FROM mapeo_fact_registro WHERE id = %s
         """, (registro_id,))
         
+        progreso.ajustar_mapeadas(cursor, registro_actual['id_planta'], registro_actual['id_evaluador'], -1)
+        
         conn.commit()
         cursor.close()
         conn.close()
         
+        progreso_stream.notificar_evaluador(registro_actual['id_evaluador'])
+        
         return jsonify({
             "message": "Registro eliminado exitosamente",
             "id": registro_id
@@ -229,11 +309,13 @@ def eliminar_registro(registro_id):
 @jwt_required()
 def obtener_registros_por_evaluador(evaluador_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_evaluador, hora_registro, id_planta, id_tipoplanta, imagen
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM mapeo_fact_registro
             WHERE id_evaluador = %s
             ORDER BY hora_registro DESC
@@ -244,6 +326,8 @@ def obtener_registros_por_evaluador(evaluador_id):
         conn.close()
         
         return jsonify(registros), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -252,11 +336,13 @@ def obtener_registros_por_evaluador(evaluador_id):
 @jwt_required()
 def obtener_registros_por_planta(planta_id):
     try:
+        columnas = campos.pedidos(CAMPOS)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT id, id_evaluador, hora_registro, id_planta, id_tipoplanta, imagen
+        cursor.execute(f"""
+            SELECT {', '.join(columnas)}
             FROM mapeo_fact_registro
             WHERE id_planta = %s
             ORDER BY hora_registro DESC
@@ -267,6 +353,8 @@ def obtener_registros_por_planta(planta_id):
         conn.close()
         
         return jsonify(registros), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -275,23 +363,19 @@ def obtener_registros_por_planta(planta_id):
 @jwt_required()
 def obtener_registros_por_hilera(hilera_id):
     try:
+        columnas = campos.pedidos(CAMPOS_POR_HILERA)
+        
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("""
-            SELECT r.id, r.id_evaluador, r.hora_registro, r.id_planta, r.id_tipoplanta, r.imagen,
-                   p.planta as numero_planta, p.ubicacion, tp.nombre as tipo_planta_nombre
-            FROM mapeo_fact_registro r
-            INNER JOIN general_dim_planta p ON r.id_planta = p.id
-            LEFT JOIN general_dim_tipoplanta tp ON r.id_tipoplanta = tp.id
-            WHERE p.id_hilera = %s
-            ORDER BY p.planta ASC, r.hora_registro DESC
-        """, (hilera_id,))
+        cursor.execute(campos.select(SQL_REGISTROS_POR_HILERA, columnas, CAMPOS_POR_HILERA), (hilera_id,))
         
         registros = cursor.fetchall()
         cursor.close()
         conn.close()
         
         return jsonify(registros), 200
+    except campos.CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500 
\ No newline at end of file
@@ -1,15 +1,17 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from utils.db import get_db_connection
+from utils.db import get_request_connection
+from utils import catalogos
 
 tipoplanta_bp = Blueprint('tipoplanta_bp', __name__)
 
 # 🔹 Obtener todos los tipos de planta
 @tipoplanta_bp.route('/', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('mapeo_dim_tipoplanta')
 def obtener_tipos_planta():
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -29,9 +31,10 @@ def obtener_tipos_planta():
 # 🔹 Obtener un tipo de planta específico por ID
 @tipoplanta_bp.route('/<string:tipo_id>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('mapeo_dim_tipoplanta')
 def obtener_tipo_planta(tipo_id):
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -54,9 +57,10 @@ def obtener_tipo_planta(tipo_id):
 # 🔹 Obtener tipos de planta por empresa
 @tipoplanta_bp.route('/empresa/<int:empresa_id>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('mapeo_dim_tipoplanta')
 def obtener_tipos_planta_por_empresa(empresa_id):
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -77,9 +81,10 @@ def obtener_tipos_planta_por_empresa(empresa_id):
 # 🔹 Buscar tipos de planta por nombre
 @tipoplanta_bp.route('/buscar/<string:nombre>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('mapeo_dim_tipoplanta')
 def buscar_tipos_planta_por_nombre(nombre):
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
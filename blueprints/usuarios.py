@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify, request
-from utils.db import get_db_connection
+from utils.db import get_request_connection
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import bcrypt
 from datetime import date
@@ -10,7 +10,7 @@ usuarios_bp = Blueprint('usuarios_bp', __name__)
 
 def verificar_admin(usuario_id):
     """Verifica si el usuario tiene perfil de administrador (id_perfil = 3)"""
-    conn = get_db_connection()
+    conn = get_request_connection()
     cursor = conn.cursor(dictionary=True)
     cursor.execute("SELECT id_perfil FROM general_dim_usuario WHERE id = %s", (usuario_id,))
     usuario = cursor.fetchone()
@@ -27,7 +27,7 @@ def obtener_usuarios():
         return jsonify({"error": "No autorizado"}), 403
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
     SELECT 
@@ -52,7 +52,7 @@ def obtener_sucursal_usuario():
     try:
         usuario_id = get_jwt_identity()
 
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
@@ -81,7 +81,7 @@ def actualizar_sucursal_activa():
         if not nueva_sucursal:
             return jsonify({"error": "Sucursal no especificada"}), 400
 
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
 
             # Verificar que el usuario tenga acceso a la sucursal
@@ -133,7 +133,7 @@ def obtener_sucursal_activa():
     usuario_id = get_jwt_identity()
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("SELECT id_sucursalactiva FROM general_dim_usuario WHERE id = %s", (usuario_id,))
@@ -159,7 +159,7 @@ def obtener_sucursales():
         return jsonify({"error": "No autorizado"}), 403
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         # Obtener solo sucursales con id_sucursaltipo = 1
@@ -187,7 +187,7 @@ def obtener_sucursales_permitidas(usuario_id):
         return jsonify({"error": "No autorizado"}), 403
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         # Obtener las sucursales permitidas del usuario
@@ -222,7 +222,7 @@ def asignar_sucursales_permitidas(usuario_id):
         return jsonify({"error": "sucursales_ids debe ser una lista"}), 400
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         # Verificar que el usuario existe
@@ -280,7 +280,7 @@ def eliminar_sucursales_permitidas(usuario_id):
         return jsonify({"error": "No autorizado"}), 403
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor()
         
         # Verificar que el usuario existe
@@ -317,7 +317,7 @@ def obtener_apps():
         return jsonify({"error": "No autorizado"}), 403
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         cursor.execute("""
@@ -343,7 +343,7 @@ def obtener_apps_permitidas(usuario_id):
         return jsonify({"error": "No autorizado"}), 403
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         # Obtener las aplicaciones permitidas del usuario
@@ -378,7 +378,7 @@ def asignar_apps_permitidas(usuario_id):
         return jsonify({"error": "apps_ids debe ser una lista"}), 400
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         
         # Verificar que el usuario existe
@@ -438,7 +438,7 @@ def eliminar_apps_permitidas(usuario_id):
         return jsonify({"error": "No autorizado"}), 403
 
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor()
         
         # Verificar que el usuario existe
@@ -473,7 +473,7 @@ def obtener_perfil_usuario():
     try:
         usuario_id = get_jwt_identity()
 
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
 
         cursor.execute("""
@@ -514,7 +514,7 @@ def actualizar_perfil_usuario():
         if not any([nombre, apellido_paterno, apellido_materno, correo]):
             return jsonify({"error": "Al menos un campo debe ser proporcionado para actualizar"}), 400
 
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
 
         # Construir la consulta dinámicamente
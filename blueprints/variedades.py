@@ -1,15 +1,17 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required
-from utils.db import get_db_connection
+from utils.db import get_db_connection, get_request_connection
+from utils import catalogos
 
 variedades_bp = Blueprint('variedades_bp', __name__)
 
 # Obtener todas las variedades
 @variedades_bp.route('/', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_variedad')
 def obtener_variedades():
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT id, nombre, id_especie, id_forma, id_color
@@ -26,9 +28,10 @@ def obtener_variedades():
 # Obtener variedad por ID
 @variedades_bp.route('/<int:variedad_id>', methods=['GET'])
 @jwt_required()
+@catalogos.condicional('general_dim_variedad')
 def obtener_variedad(variedad_id):
     try:
-        conn = get_db_connection()
+        conn = get_request_connection()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT id, nombre, id_especie, id_forma, id_color
@@ -54,11 +57,13 @@ def crear_variedad():
             return jsonify({"error": "Faltan campos requeridos"}), 400
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         cursor.execute("""
             INSERT INTO general_dim_variedad (nombre, id_especie, id_forma, id_color)
             VALUES (%s, %s, %s, %s)
         """, (data['nombre'], data['id_especie'], data['id_forma'], data['id_color']))
         variedad_id = cursor.lastrowid
+        catalogos.registrar_cambio(cursor, 'general_dim_variedad')
         conn.commit()
         cursor.close()
         conn.close()
@@ -74,6 +79,7 @@ def actualizar_variedad(variedad_id):
         data = request.json
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         cursor.execute("SELECT id FROM general_dim_variedad WHERE id = %s", (variedad_id,))
         if not cursor.fetchone():
             cursor.close()
@@ -100,6 +106,7 @@ def actualizar_variedad(variedad_id):
         valores.append(variedad_id)
         query = f"UPDATE general_dim_variedad SET {', '.join(campos)} WHERE id = %s"
         cursor.execute(query, valores)
+        catalogos.registrar_cambio(cursor, 'general_dim_variedad')
         conn.commit()
         cursor.close()
         conn.close()
@@ -114,12 +121,14 @@ def eliminar_variedad(variedad_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
+        conn.start_transaction()
         cursor.execute("SELECT id FROM general_dim_variedad WHERE id = %s", (variedad_id,))
         if not cursor.fetchone():
             cursor.close()
             conn.close()
             return jsonify({"error": "Variedad no encontrada"}), 404
         cursor.execute("DELETE FROM general_dim_variedad WHERE id = %s", (variedad_id,))
+        catalogos.registrar_cambio(cursor, 'general_dim_variedad')
         conn.commit()
         cursor.close()
         conn.close()
@@ -19,7 +19,72 @@ class Config:
     CLOUD_SQL_PASSWORD = os.getenv("CLOUD_SQL_PASSWORD", "&8y7c()tu9t/+,6`")
     CLOUD_SQL_DB = os.getenv("CLOUD_SQL_DB", "lahornilla_base_normalizada")
     CLOUD_SQL_PORT = int(os.getenv("CLOUD_SQL_PORT", 3306))
-    
+
+    # Pool de conexiones (uno por worker de gunicorn)
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))  # segundos esperando una conexión libre
+    DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", 300))  # segundos antes de cerrar una ociosa
+    DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", 5))  # ping al prestar si estuvo ociosa más que esto
+    DB_POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", 2))  # conexiones abiertas al arrancar el worker
+    DB_POOL_KEEPALIVE_INTERVAL = float(os.getenv("DB_POOL_KEEPALIVE_INTERVAL", 120))  # menor que wait_timeout de MySQL
+    DB_STMT_CACHE_SIZE = int(os.getenv("DB_STMT_CACHE_SIZE", 32))  # statements preparados por conexión (0 = desactivado)
+    DB_STMT_CACHE_THRESHOLD = int(os.getenv("DB_STMT_CACHE_THRESHOLD", 2))  # ejecuciones antes de preparar una consulta
+
+    # Réplicas de lectura ("host:puerto,host:puerto"); los GET se enrutan a ellas
+    DB_READ_REPLICAS = [r.strip() for r in os.getenv("DB_READ_REPLICAS", "").split(",") if r.strip()]
+    DB_REPLICA_STRATEGY = os.getenv("DB_REPLICA_STRATEGY", "round_robin")  # round_robin | least_latency
+    DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 5))  # segundos de retraso tolerados (0 = sin controlar; requiere REPLICATION CLIENT)
+    DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 10))
+
+    # Circuit breaker de transportes Cloud SQL (Unix socket / IP pública)
+    DB_BREAKER_FAILURE_THRESHOLD = int(os.getenv("DB_BREAKER_FAILURE_THRESHOLD", 2))
+    DB_BREAKER_RESET_TIMEOUT = float(os.getenv("DB_BREAKER_RESET_TIMEOUT", 30))
+    DB_BREAKER_MAX_RESET_TIMEOUT = float(os.getenv("DB_BREAKER_MAX_RESET_TIMEOUT", 300))
+
+    # Presupuesto de tiempo por petición (ms). REQUEST_TIME_BUDGETS permite
+    # sobrescribirlo por endpoint o blueprint: "registromapeo_bp.obtener_progreso_registro=5000,plantas_bp=8000"
+    REQUEST_TIME_BUDGET_MS = int(os.getenv("REQUEST_TIME_BUDGET_MS", 25000))
+    REQUEST_TIME_BUDGETS = {
+        name.strip(): int(ms)
+        for name, _, ms in (item.partition("=") for item in os.getenv("REQUEST_TIME_BUDGETS", "").split(","))
+        if name.strip() and ms.strip()
+    }
+
+    # Instrumentación: avisar si una misma forma de consulta se repite más de N veces por petición
+    DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", 10))
+
+    # Respuestas en streaming (NDJSON / arreglo JSON por partes)
+    STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 500))  # filas por fetchmany
+
+    # Paginación por cursor de los listados (?limit=&cursor=)
+    PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", 100))
+    PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", 1000))
+
+    # GET condicional de catálogos: segundos que se reutiliza en memoria la versión de cada tabla
+    CATALOGO_VERSION_TTL = float(os.getenv("CATALOGO_VERSION_TTL", 5))
+
+    # Compresión de respuestas (zstd y br requieren los paquetes zstandard / Brotli)
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "True") == "True"
+    COMPRESSION_ALGORITHMS = [a.strip() for a in os.getenv("COMPRESSION_ALGORITHMS", "zstd,br,gzip").split(",") if a.strip()]  # en orden de preferencia
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))  # bytes; por debajo no compensa
+    COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 5))
+    COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", 3))
+    COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", 128))  # respuestas con ETag ya comprimidas
+
+    # Serializador de las respuestas JSON: orjson (requiere el paquete) | default (json de la stdlib)
+    JSON_PROVIDER = os.getenv("JSON_PROVIDER", "orjson")
+
+    # Progreso en vivo por Server-Sent Events (/registromapeo/<id>/progreso/stream)
+    PROGRESO_STREAM_POLL_INTERVAL = float(os.getenv("PROGRESO_STREAM_POLL_INTERVAL", 5))  # recálculo sin notificaciones (otros workers)
+    PROGRESO_STREAM_KEEPALIVE = float(os.getenv("PROGRESO_STREAM_KEEPALIVE", 15))  # comentario SSE si no hay cambios
+    PROGRESO_STREAM_MAX_DURATION = float(os.getenv("PROGRESO_STREAM_MAX_DURATION", 300))  # luego el cliente se reconecta
+    PROGRESO_CACHE_SIZE = int(os.getenv("PROGRESO_CACHE_SIZE", 256))  # respuestas de /progreso en memoria (0 = sin caché)
+
+    # Estadísticas de registros de mapeo en memoria: reconciliación con la base
+    ESTADISTICAS_RECONCILE_INTERVAL = float(os.getenv("ESTADISTICAS_RECONCILE_INTERVAL", 60))
+
     # Configuración del proyecto
     GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT", "gestion-la-hornilla")
     CLOUD_SQL_CONNECTION_NAME = os.getenv("CLOUD_SQL_CONNECTION_NAME", "gestion-la-hornilla:us-central1:gestion-la-hornilla")
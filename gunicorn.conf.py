@@ -0,0 +1,16 @@
+"""
+Hooks de Gunicorn (se carga automáticamente desde el directorio de trabajo)
+"""
+import os
+
+# Workers con hilos: cada stream SSE (/registromapeo/<id>/progreso/stream)
+# ocupa uno hasta PROGRESO_STREAM_MAX_DURATION segundos. Con workers sync
+# unos pocos clientes conectados bloquearían todos los workers.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+
+
+def post_fork(server, worker):
+    # Cada worker precalienta su propio pool y mantiene vivas las conexiones
+    from utils.db import start_pool_maintenance
+    start_pool_maintenance()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Reconstruye o verifica los contadores de progreso por hilera
+(mapeo_fact_progreso_hilera).
+
+    python reconstruir_progreso.py                    # reconstruye todos los registros
+    python reconstruir_progreso.py <id_registro>      # reconstruye un registro
+    python reconstruir_progreso.py --verificar [id]   # solo informa diferencias
+"""
+import sys
+from utils.db import get_db_connection
+from utils import progreso
+
+
+def main(args):
+    verificar = '--verificar' in args
+    args = [a for a in args if a != '--verificar']
+    registro_id = args[0] if args else None
+
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if verificar:
+            diferencias = progreso.verificar(cursor, registro_id)
+            for d in diferencias:
+                print(f"❌ {d['id_registro_mapeo']} / hilera {d['id_hilera']}: "
+                      f"total {d['total_plantas_contador']} (real {d['total_plantas']}), "
+                      f"mapeadas {d['plantas_mapeadas_contador']} (real {d['plantas_mapeadas']})")
+            if diferencias:
+                print(f"⚠️  {len(diferencias)} contadores no coinciden o faltan")
+                return 1
+            print("✅ Contadores de progreso consistentes")
+            return 0
+
+        conn.start_transaction()
+        if registro_id:
+            progreso.reconstruir_registro(cursor, registro_id)
+            print(f"✅ Contadores reconstruidos para {registro_id}")
+        else:
+            filas = progreso.reconstruir_todo(cursor)
+            print(f"✅ Contadores reconstruidos ({filas} filas)")
+        conn.commit()
+        return 0
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,1493 @@
+import asyncio
+import contextlib
+import gc
+import gzip
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+
+import mysql.connector
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+from flask_jwt_extended import JWTManager, create_access_token
+
+from config import Config
+from utils import campos, catalogos, columnar, compresion, db, db_async, deadlines, estadisticas, json_provider, paginacion, progreso, progreso_stream, query_stats, serializacion, singleflight
+from blueprints import lecturas_async
+from blueprints.opciones import opciones_bp
+from blueprints.plantas import plantas_bp
+from blueprints.registromapeo import registromapeo_bp
+from blueprints.registros import registros_bp
+
+
+class FakeCursor:
+    """Cursor mínimo: responde cada consulta con fake_db.responder y la anota en fake_db.consultas."""
+
+    with_rows = True
+
+    def __init__(self, fake_db, dictionary=False, **kwargs):
+        self.fake_db = fake_db
+        self.dictionary = dictionary
+        self.rows = []
+
+    def execute(self, sql, params=None, **kwargs):
+        self.fake_db.consultas.append(sql)
+        self.fake_db.parametros.append(params)
+        columnas, filas = self.fake_db.responder(sql, params)
+        self.rows = [dict(zip(columnas, f)) if self.dictionary else tuple(f) for f in filas]
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        filas, self.rows = self.rows[:size], self.rows[size:]
+        return filas
+
+    def fetchall(self):
+        filas, self.rows = self.rows, []
+        return filas
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    unread_result = False
+
+    def __init__(self, fake_db):
+        self.fake_db = fake_db
+        self.in_transaction = False
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.fake_db, **kwargs)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def start_transaction(self, **kwargs):
+        self.in_transaction = True
+
+    def commit(self):
+        # Posición en consultas: lo ejecutado antes quedó confirmado
+        self.fake_db.commits.append(len(self.fake_db.consultas))
+        self.in_transaction = False
+
+    def rollback(self):
+        if self.in_transaction:
+            self.fake_db.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    def __init__(self):
+        self.consultas = []
+        self.parametros = []
+        self.commits = []
+        self.respuestas = {}  # fragmento de SQL -> (columnas, filas), antes que las respuestas fijas
+        self.n_hileras = 0
+        self.version = 1
+        self.rollbacks = 0
+        self.error = None
+        self.perfil = 3
+        self.n_registros = 0
+        self.reconstruidos = []
+        self.bloqueo = None
+        self.sqlite = None
+        self.sin_contadores = False  # hileras sin contadores hasta reconstruirlas
+
+    def responder(self, sql, params):
+        if self.error and 'max_execution_time' not in sql:
+            raise self.error
+        normalizada = ' '.join(re.sub(r'/\*\+.*?\*/ ', '', sql).split())  # sin hints de optimizador
+        for fragmento, respuesta in self.respuestas.items():
+            if fragmento in normalizada:
+                return respuesta
+        if 'INSERT INTO mapeo_fact_version' in sql:
+            self.version += 1
+            return (), []
+        if self.sqlite is not None and 'LIMIT %s' in sql:
+            # Páginas por cursor: SQLite ordena los NULL igual que MySQL
+            cursor = self.sqlite.execute(re.sub(r'/\*\+.*?\*/ ', '', sql).replace('%s', '?'), params)
+            return [d[0] for d in cursor.description], cursor.fetchall()
+        if 'id_perfil FROM general_dim_usuario' in sql:
+            return ('id_perfil',), [(self.perfil,)]
+        if 'FROM mapeo_fact_registromapeo ORDER BY' in ' '.join(sql.split()):
+            return ('id', 'id_cuartel'), [(f'rm-{i}', i) for i in range(self.n_registros)]
+        if 'FROM mapeo_fact_registromapeo WHERE id' in ' '.join(sql.split()):
+            registro = {'id': 'rm-1', 'id_temporada': 1, 'id_cuartel': 7, 'fecha_inicio': None,
+                        'fecha_termino': None, 'id_estado': 1}
+            columnas = re.search(r'SELECT (?:/\*\+.*?\*/ )?(.*?)\s+FROM', sql, re.S).group(1).split(', ')
+            return columnas, [tuple(registro[c] for c in columnas)]
+        if 'FROM mapeo_fact_version' in sql and 'clave IN' in sql:
+            return ('clave', 'version', 'fecha_actualizacion'), [
+                (clave, self.version, datetime(2026, 10, 1, 12, 0)) for clave in params
+            ]
+        if 'FROM mapeo_fact_version' in sql:
+            return ('version',), [(self.version,)]
+        if 'INSERT INTO mapeo_fact_progreso_hilera' in sql:
+            self.reconstruidos.extend(params)
+            return (), []
+        if 'rm.id_temporada, rm.id_estado' in sql:
+            return ('id', 'id_temporada', 'id_estado', 'nombre_cuartel'), [
+                (f'rm-{i}', 1, 1, f'Cuartel {i}') for i in range(self.n_registros)
+            ]
+        if 'rm.id as id_registro' in sql:
+            # Tres hileras por registro, sin contadores hasta reconstruirlos
+            return ('id_registro', 'id', 'nombre', 'id_contador', 'total_plantas', 'plantas_mapeadas',
+                    'id_estado_hilera', 'estado'), [
+                (rm, h, f'H{h}', h if rm in self.reconstruidos else None, 10, h, None, None)
+                for rm in params for h in (1, 2, 3)
+            ]
+        if 'FROM mapeo_fact_registromapeo rm' in sql:
+            return ('id', 'id_cuartel', 'nombre_cuartel'), [('rm-1', 7, 'Cuartel 7')]
+        if 'FROM general_dim_hilera h' in sql:
+            if self.bloqueo is not None:
+                self.bloqueo.wait(5)
+            # Hilera i: 10 plantas, i % 11 mapeadas; la primera con estado explícito
+            faltan = self.sin_contadores and not self.reconstruidos
+            filas = [
+                (i, f'H{i:03d}', None if faltan else i, 10, i % 11,
+                 'eh-1' if i == 1 else None, 'pausado' if i == 1 else None)
+                for i in range(1, self.n_hileras + 1)
+            ]
+            columnas = ('id', 'nombre', 'id_contador', 'total_plantas', 'plantas_mapeadas', 'id_estado_hilera', 'estado')
+            return columnas, filas
+        return (), []
+
+
+def selects(fake_db):
+    """Consultas de la aplicación (sin los SET SESSION del límite de tiempo)."""
+    return len([sql for sql in fake_db.consultas if 'SELECT' in sql])
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(db, '_connect', lambda: FakeConnection(fake))
+    monkeypatch.setattr(db, '_maintenance_pid', db.os.getpid())  # sin hilos de mantenimiento
+    monkeypatch.setattr(db, '_statement_seen', OrderedDict())
+    progreso.cache_respuestas.clear()
+    for pool in db._pools.values():
+        pool.close()
+    db._pools.clear()
+    yield fake
+    for pool in db._pools.values():
+        pool.close()
+    db._pools.clear()
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'clave-de-pruebas-con-largo-suficiente'
+    JWTManager(app)
+    app.register_blueprint(registromapeo_bp, url_prefix='/api/registromapeo')
+    app.register_blueprint(opciones_bp, url_prefix='/api/opciones')
+    app.register_blueprint(registros_bp, url_prefix='/api/registros')
+    app.register_blueprint(plantas_bp, url_prefix='/api/plantas')
+    db.init_app(app)
+    with app.app_context():
+        token = create_access_token(identity='usuario-1')
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
+
+
+@pytest.mark.parametrize('n_hileras', [1, 20, 300])
+def test_progreso_registro_consultas_constantes(fake_db, client, n_hileras):
+    fake_db.n_hileras = n_hileras
+
+    response = client.get('/api/registromapeo/rm-1/progreso')
+
+    assert response.status_code == 200
+    # versión + registro + hileras con contadores
+    assert 'desc="3 consultas"' in response.headers['Server-Timing']
+    assert selects(fake_db) == 3
+    data = response.get_json()
+    assert data['total_hileras'] == n_hileras
+    assert len(data['hileras']) == n_hileras
+    assert data['hileras'][0]['estado'] == 'pausado'
+
+
+def test_progreso_registro_calculo_por_hilera(fake_db, client):
+    fake_db.n_hileras = 12
+
+    data = client.get('/api/registromapeo/rm-1/progreso').get_json()
+
+    hileras = {h['id_hilera']: h for h in data['hileras']}
+    assert hileras[2] == {
+        "id_hilera": 2, "nombre": "H002", "total_plantas": 10,
+        "plantas_mapeadas": 2, "porcentaje": 20.0, "estado": "en_progreso"
+    }
+    assert hileras[10]['estado'] == 'completado'
+    assert hileras[11]['estado'] == 'pendiente'
+    assert data['hileras_completadas'] == 1
+    assert data['porcentaje_general'] == round(1 / 12 * 100, 2)
+    assert data['cuartel'] == 'Cuartel 7'
+
+
+def test_progreso_registro_etag_y_cache(fake_db, client):
+    fake_db.n_hileras = 5
+    primera = client.get('/api/registromapeo/rm-1/progreso')
+    etag = primera.headers['ETag']
+
+    # Misma versión: 304 solo con la consulta de versión
+    fake_db.consultas.clear()
+    response = client.get('/api/registromapeo/rm-1/progreso', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert selects(fake_db) == 1
+
+    # Sin If-None-Match se responde desde la caché
+    fake_db.consultas.clear()
+    response = client.get('/api/registromapeo/rm-1/progreso')
+    assert response.get_json() == primera.get_json()
+    assert selects(fake_db) == 1
+
+    # Una escritura incrementa la versión: nuevo ETag y recálculo
+    fake_db.version += 1
+    response = client.get('/api/registromapeo/rm-1/progreso', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_progreso_reconstruido_usa_la_version_nueva(fake_db, client):
+    fake_db.n_hileras = 3
+    fake_db.sin_contadores = True
+
+    primera = client.get('/api/registromapeo/rm-1/progreso')
+
+    # La reconstrucción incrementó la versión: el ETag ya es el de la nueva
+    assert fake_db.reconstruidos == ['rm-1']
+    assert fake_db.version == 2
+    assert primera.get_etag() == (progreso.etag('rm-1', 2), False)
+
+    fake_db.consultas.clear()
+    response = client.get('/api/registromapeo/rm-1/progreso', headers={'If-None-Match': primera.headers['ETag']})
+    assert response.status_code == 304
+    response = client.get('/api/registromapeo/rm-1/progreso')
+    assert response.get_data() == primera.get_data()
+    # Solo las consultas de versión: nada se recalcula
+    assert selects(fake_db) == 2
+
+
+def test_progreso_comprimido_se_decodifica(fake_db, client, monkeypatch):
+    monkeypatch.setattr(Config, 'COMPRESSION_ALGORITHMS', ['gzip'])
+    compresion.cache_comprimidas.clear()
+    client.application.after_request(compresion._comprimir_respuesta)
+    fake_db.n_hileras = 50
+
+    plano = client.get('/api/registromapeo/rm-1/progreso')
+    assert len(plano.get_data()) >= Config.COMPRESSION_MIN_SIZE
+    assert 'Content-Encoding' not in plano.headers
+
+    response = client.get('/api/registromapeo/rm-1/progreso', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.get_data())) == plano.get_json()
+
+    # ETag débil: la misma entidad en otra codificación; revalida con 304
+    etag, debil = response.get_etag()
+    assert debil and etag == plano.get_etag()[0]
+    response = client.get('/api/registromapeo/rm-1/progreso',
+                          headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_orjson_produce_el_mismo_json():
+    app = Flask(__name__)
+    fechas = [datetime(2026, 2, 3, 4, 5, 6), date(2024, 2, 29),
+              datetime(2026, 10, 1, 23, 30, tzinfo=timezone(timedelta(hours=-3)))]
+    for fecha in fechas:
+        assert json_provider._por_defecto(fecha) == http_date(fecha)
+
+    datos = {'z': 1, 'a': 'ñandú', 'fechas': fechas, 'total': Decimal('12.50'),
+             'id': UUID('12345678-1234-5678-1234-567812345678'), 'anidado': {'b': [None, True], 'a': 1.5}}
+    orjson_, defecto = json_provider.OrjsonJSONProvider(app), DefaultJSONProvider(app)
+    assert json.loads(orjson_.dumps(datos)) == json.loads(defecto.dumps(datos))
+
+    with app.test_request_context():
+        assert orjson_.response(datos).get_json() == defecto.response(datos).get_json()
+        # Claves ordenadas igual que el proveedor por defecto
+        assert list(json.loads(orjson_.response(datos).get_data())) == sorted(datos)
+
+
+def test_progreso_etag_por_representacion(fake_db, client):
+    json_provider.init_app(client.application)
+    fake_db.n_hileras = 5
+    msgpack = {'Accept': serializacion.MSGPACK}
+
+    en_json = client.get('/api/registromapeo/rm-1/progreso')
+    binario = client.get('/api/registromapeo/rm-1/progreso', headers=msgpack)
+    assert binario.mimetype == serializacion.MSGPACK
+    assert serializacion.desempaquetar(binario.get_data(), serializacion.MSGPACK) == en_json.get_json()
+    assert binario.headers['ETag'] != en_json.headers['ETag']
+
+    # Cada representación revalida solo con su propio ETag
+    response = client.get('/api/registromapeo/rm-1/progreso',
+                          headers={**msgpack, 'If-None-Match': binario.headers['ETag']})
+    assert response.status_code == 304
+    assert 'Accept' in response.headers['Vary']
+    response = client.get('/api/registromapeo/rm-1/progreso',
+                          headers={**msgpack, 'If-None-Match': en_json.headers['ETag']})
+    assert response.status_code == 200
+    assert response.mimetype == serializacion.MSGPACK
+
+
+def test_cuerpo_binario_con_fechas_nativas(fake_db, client):
+    client.application.request_class = serializacion.Peticion
+    cuerpo = {'id_temporada': 1, 'id_cuartel': 7, 'id_estado': 1,
+              'fecha_inicio': datetime(2026, 10, 1, 3, 0, tzinfo=timezone.utc), 'fecha_termino': date(2026, 12, 31)}
+
+    response = client.post('/api/registromapeo/', data=serializacion.empaquetar(cuerpo, serializacion.MSGPACK),
+                           content_type=serializacion.MSGPACK)
+
+    assert response.status_code == 201
+    [params] = [p for sql, p in zip(fake_db.consultas, fake_db.parametros)
+                if 'INSERT INTO mapeo_fact_registromapeo' in sql]
+    assert params[3:5] == (date(2026, 10, 1), date(2026, 12, 31))
+
+    fake_db.respuestas['FROM mapeo_fact_registromapeo WHERE id'] = (
+        ('id', 'id_temporada', 'id_cuartel', 'id_estado'), [('rm-1', 1, 7, 1)])
+    response = client.put('/api/registromapeo/rm-1', content_type=serializacion.CBOR,
+                          data=serializacion.empaquetar({'fecha_termino': date(2027, 1, 15)}, serializacion.CBOR))
+    assert response.status_code == 200
+    [params] = [p for sql, p in zip(fake_db.consultas, fake_db.parametros) if 'UPDATE mapeo_fact_registromapeo' in sql]
+    assert params == [date(2027, 1, 15), 'rm-1']
+
+    # Una fecha con otro tipo es un error del cliente, no un 500
+    response = client.post('/api/registromapeo/', json={**cuerpo, 'fecha_inicio': 20261001, 'fecha_termino': None})
+    assert response.status_code == 400
+
+
+def test_catalogo_etag_por_representacion(fake_db, client):
+    json_provider.init_app(client.application)
+    catalogos._cache.clear()
+
+    en_json = client.get('/api/opciones/')
+    response = client.get('/api/opciones/', headers={'Accept': serializacion.CBOR,
+                                                     'If-None-Match': en_json.headers['ETag']})
+    assert response.status_code == 200
+    assert response.mimetype == serializacion.CBOR
+    assert 'Accept' in response.headers['Vary']
+    assert client.get('/api/opciones/', headers={'Accept': serializacion.CBOR,
+                                                 'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+ESTADOS_URL = '/api/registromapeo/rm-1/hileras/estado'
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'hileras': []},
+    {'hileras': 'completado'},
+    {'hileras': [{'id_hilera': 'uno', 'estado': 'completado'}]},
+    {'hileras': [{'id_hilera': 1}]},
+    {'hileras': [{'id_hilera': 1, 'estado': 'terminado'}]},
+])
+def test_estados_hileras_valida_el_body(fake_db, client, body):
+    response = client.put(ESTADOS_URL, json=body)
+
+    assert response.status_code == 400
+    assert fake_db.consultas == []
+
+
+def test_estados_hileras_registro_inexistente(fake_db, client):
+    fake_db.respuestas['FROM mapeo_fact_registromapeo WHERE id'] = (('id', 'id_cuartel'), [])
+
+    response = client.put(ESTADOS_URL, json={'hileras': [{'id_hilera': 1, 'estado': 'completado'}]})
+
+    assert response.status_code == 404
+    assert fake_db.commits == []
+
+
+def test_estados_hileras_fuera_del_cuartel(fake_db, client):
+    # Solo la hilera 1 es del cuartel 7 del registro
+    fake_db.respuestas['FROM general_dim_hilera WHERE id IN'] = (('id',), [(1,)])
+
+    response = client.put(ESTADOS_URL, json={'hileras': [{'id_hilera': 1, 'estado': 'completado'},
+                                                          {'id_hilera': 2, 'estado': 'pausado'}]})
+
+    assert response.status_code == 404
+    assert response.get_json()['hileras'] == [2]
+    assert fake_db.parametros[-1] == (1, 2, 7)
+    assert not any('INSERT' in sql for sql in fake_db.consultas)
+    assert fake_db.commits == []
+
+
+def test_estados_hileras_en_una_transaccion(fake_db, client, monkeypatch):
+    notificados = []
+    monkeypatch.setattr(progreso_stream, 'notificar', notificados.append)
+    fake_db.respuestas['FROM general_dim_hilera WHERE id IN'] = (('id',), [(1,), (2,)])
+    fake_db.respuestas['FROM mapeo_fact_estado_hilera eh'] = (
+        ('id_hilera', 'estado', 'fecha_actualizacion', 'nombre_hilera'),
+        [(1, 'pausado', datetime(2026, 10, 1, 12, 0), 'H001'), (2, 'completado', None, 'H002')],
+    )
+
+    # La hilera repetida queda con su último estado
+    response = client.put(ESTADOS_URL, json={'hileras': [{'id_hilera': 1, 'estado': 'completado'},
+                                                          {'id_hilera': 2, 'estado': 'completado'},
+                                                          {'id_hilera': '1', 'estado': 'pausado'}]})
+
+    assert response.status_code == 200
+    upserts = [i for i, sql in enumerate(fake_db.consultas) if 'INSERT INTO mapeo_fact_estado_hilera' in sql]
+    assert len(upserts) == 1
+    params = fake_db.parametros[upserts[0]]
+    assert [params[i:i + 5][1:] for i in range(0, len(params), 5)] == [
+        ('rm-1', 1, 'pausado', 'usuario-1'), ('rm-1', 2, 'completado', 'usuario-1')]
+    # Upsert y nueva versión del progreso confirmados juntos, antes de releer
+    assert fake_db.commits == [upserts[0] + 2]
+    assert fake_db.version == 2
+    assert 'INSERT INTO mapeo_fact_version' in fake_db.consultas[upserts[0] + 1]
+    assert notificados == ['rm-1']
+    assert response.get_json()['hileras_actualizadas'] == [
+        {'id_hilera': 1, 'nombre_hilera': 'H001', 'estado': 'pausado', 'fecha_actualizacion': '2026-10-01T12:00:00'},
+        {'id_hilera': 2, 'nombre_hilera': 'H002', 'estado': 'completado', 'fecha_actualizacion': None},
+    ]
+
+
+def hilera_progreso(id_hilera, mapeadas):
+    return {'id_hilera': id_hilera, 'nombre': f'H{id_hilera}', 'total_plantas': 10, 'plantas_mapeadas': mapeadas}
+
+
+def estado_progreso(*hileras, completadas=0):
+    return {'id_registro': 'rm-1', 'cuartel': 'Cuartel 7', 'total_hileras': len(hileras),
+            'hileras_completadas': completadas, 'porcentaje_general': 0, 'hileras': list(hileras)}
+
+
+def test_delta_solo_lleva_lo_que_cambio():
+    anterior = estado_progreso(hilera_progreso(1, 2), hilera_progreso(2, 5), hilera_progreso(3, 0))
+
+    assert progreso_stream._delta(anterior, estado_progreso(*anterior['hileras'])) is None
+
+    actual = estado_progreso(hilera_progreso(1, 2), hilera_progreso(2, 10), hilera_progreso(4, 0), completadas=1)
+    delta = progreso_stream._delta(anterior, actual)
+    assert delta['hileras'] == [hilera_progreso(2, 10), hilera_progreso(4, 0)]
+    assert delta['hileras_eliminadas'] == [3]
+    assert (delta['total_hileras'], delta['hileras_completadas']) == (3, 1)
+
+    # Solo cambió el resumen
+    renombrado = {**anterior, 'cuartel': 'Cuartel 7B'}
+    assert progreso_stream._delta(anterior, renombrado)['hileras'] == []
+
+
+def test_stream_cliente_lento_recibe_el_estado_completo():
+    canal = progreso_stream._Canal('rm-1')
+    canal.ultimo = estado_progreso(hilera_progreso(1, 9))
+    suscripcion = progreso_stream.Suscripcion(canal)
+
+    for i in range(suscripcion.eventos.maxsize + 1):
+        suscripcion.enviar('delta', {'n': i})
+
+    # Los deltas pendientes se descartan: el último estado los incluye a todos
+    assert suscripcion.siguiente(0) == ('progreso', canal.ultimo)
+    assert suscripcion.siguiente(0) is None
+
+
+def test_stream_un_calculo_por_registro_para_todos_los_suscriptores(fake_db, monkeypatch):
+    monkeypatch.setattr(Config, 'PROGRESO_STREAM_POLL_INTERVAL', 60)
+    monkeypatch.setattr(progreso_stream, '_AGRUPAR_SEGUNDOS', 0)
+    fake_db.respuestas['SELECT id_evaluador FROM mapeo_fact_registromapeo'] = (('id_evaluador',), [('ev-1',)])
+    calculos = []
+
+    def calcular(cursor, registro_id):
+        calculos.append(registro_id)
+        return estado_progreso(hilera_progreso(1, len(calculos))), None
+
+    monkeypatch.setattr(progreso, 'calcular', calcular)
+
+    primera = progreso_stream.suscribir('rm-1')
+    segunda = progreso_stream.suscribir('rm-1')
+    for suscripcion in (primera, segunda):
+        tipo, datos = suscripcion.siguiente(5)
+        assert tipo == 'progreso' and datos['hileras'] == [hilera_progreso(1, 1)]
+    assert calculos == ['rm-1']
+
+    # Una escritura: un recálculo y el mismo delta para los dos
+    fake_db.version += 1
+    progreso_stream.notificar('rm-1')
+    for suscripcion in (primera, segunda):
+        tipo, datos = suscripcion.siguiente(5)
+        assert tipo == 'delta' and datos['hileras'] == [hilera_progreso(1, 2)]
+    assert calculos == ['rm-1', 'rm-1']
+
+    # Sin suscriptores el canal termina
+    primera.cerrar()
+    assert 'rm-1' in progreso_stream._canales
+    segunda.cerrar()
+    limite = time.monotonic() + 5
+    while 'rm-1' in progreso_stream._canales and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert 'rm-1' not in progreso_stream._canales
+    assert calculos == ['rm-1', 'rm-1']
+
+
+def ajustes_de_mapeadas(fake_db):
+    """(delta, id_planta, id_evaluador) de cada ajuste de plantas_mapeadas, con su posición."""
+    return [(i, fake_db.parametros[i]) for i, sql in enumerate(fake_db.consultas)
+            if 'SET ph.plantas_mapeadas = ph.plantas_mapeadas + %s' in sql]
+
+
+def test_crear_registro_suma_una_planta_mapeada(fake_db, client, monkeypatch):
+    notificados = []
+    monkeypatch.setattr(progreso_stream, 'notificar_evaluador', notificados.append)
+
+    response = client.post('/api/registros/', json={'id_planta': '5', 'id_tipoplanta': 1})
+
+    assert response.status_code == 201
+    [(posicion, params)] = ajustes_de_mapeadas(fake_db)
+    assert params == (1, 5, 'usuario-1')
+    # Alta, contador y versión del progreso en la misma transacción
+    assert 'INSERT INTO mapeo_fact_registro' in fake_db.consultas[posicion - 1]
+    assert fake_db.version == 2
+    assert fake_db.commits == [len(fake_db.consultas)]
+    assert notificados == ['usuario-1']
+
+
+def test_eliminar_registro_resta_una_planta_mapeada(fake_db, client, monkeypatch):
+    monkeypatch.setattr(progreso_stream, 'notificar_evaluador', lambda evaluador_id: None)
+    fake_db.respuestas['FROM mapeo_fact_registro WHERE id'] = (('id', 'id_planta', 'id_evaluador'), [('r-1', 5, 'ev-1')])
+
+    response = client.delete('/api/registros/r-1')
+
+    assert response.status_code == 200
+    assert [params for _, params in ajustes_de_mapeadas(fake_db)] == [(-1, 5, 'ev-1')]
+    assert fake_db.commits == [len(fake_db.consultas)]
+
+
+def test_mover_planta_refresca_ambas_hileras(fake_db, client, monkeypatch):
+    monkeypatch.setattr(progreso_stream, 'notificar_todos', lambda: None)
+    fake_db.respuestas['SELECT id, id_hilera FROM general_dim_planta WHERE id'] = (('id', 'id_hilera'), [('p-1', 3)])
+
+    response = client.put('/api/plantas/p-1', json={'id_hilera': 4})
+
+    assert response.status_code == 200
+    refrescos = [params for sql, params in zip(fake_db.consultas, fake_db.parametros)
+                 if 'INSERT INTO mapeo_fact_progreso_hilera' in sql]
+    assert refrescos == [(3, 4)]
+    assert fake_db.version == 2
+    assert fake_db.commits == [len(fake_db.consultas)]
+
+    # Sin cambio de hilera no se recalcula nada
+    fake_db.consultas.clear()
+    client.put('/api/plantas/p-1', json={'id_hilera': 3, 'planta': 7})
+    assert not any('mapeo_fact_progreso_hilera' in sql for sql in fake_db.consultas)
+
+
+class SqliteCursor:
+    """Cursor de diccionarios sobre SQLite para consultas portables (placeholders %s)."""
+
+    def __init__(self, conexion):
+        self.cursor = conexion.cursor()
+
+    def execute(self, sql, params=None):
+        self.cursor.execute(sql.replace('%s', '?'), params or ())
+
+    def fetchall(self):
+        columnas = [d[0] for d in self.cursor.description]
+        return [dict(zip(columnas, fila)) for fila in self.cursor.fetchall()]
+
+
+def test_verificar_informa_contadores_corruptos():
+    base = sqlite3.connect(':memory:')
+    base.executescript("""
+        CREATE TABLE general_dim_hilera (id INT, id_cuartel INT);
+        CREATE TABLE general_dim_planta (id INT, id_hilera INT);
+        CREATE TABLE mapeo_fact_registromapeo (id TEXT, id_cuartel INT, id_evaluador TEXT);
+        CREATE TABLE mapeo_fact_registro (id TEXT, id_planta INT, id_evaluador TEXT);
+        CREATE TABLE mapeo_fact_progreso_hilera (id_registro_mapeo TEXT, id_hilera INT,
+                                                 total_plantas INT, plantas_mapeadas INT);
+        INSERT INTO general_dim_hilera VALUES (1, 7), (2, 7), (3, 8);
+        INSERT INTO general_dim_planta VALUES (10, 1), (11, 1), (20, 2), (30, 3);
+        INSERT INTO mapeo_fact_registromapeo VALUES ('rm-1', 7, 'ev-1'), ('rm-2', 8, 'ev-1');
+        INSERT INTO mapeo_fact_registro VALUES ('r-1', 10, 'ev-1'), ('r-2', 11, 'ev-2'), ('r-3', 30, 'ev-1');
+        INSERT INTO mapeo_fact_progreso_hilera VALUES ('rm-1', 1, 2, 1), ('rm-1', 2, 1, 0), ('rm-2', 3, 1, 1);
+    """)
+    cursor = SqliteCursor(base)
+    assert progreso.verificar(cursor) == []
+
+    # Un contador desviado y otro que falta
+    base.execute("UPDATE mapeo_fact_progreso_hilera SET plantas_mapeadas = 2 WHERE id_hilera = 1")
+    base.execute("DELETE FROM mapeo_fact_progreso_hilera WHERE id_hilera = 3")
+
+    assert progreso.verificar(cursor) == [
+        {'id_registro_mapeo': 'rm-1', 'id_hilera': 1, 'total_plantas_contador': 2,
+         'plantas_mapeadas_contador': 2, 'total_plantas': 2, 'plantas_mapeadas': 1},
+        {'id_registro_mapeo': 'rm-2', 'id_hilera': 3, 'total_plantas_contador': None,
+         'plantas_mapeadas_contador': None, 'total_plantas': 1, 'plantas_mapeadas': 1},
+    ]
+    assert [d['id_hilera'] for d in progreso.verificar(cursor, 'rm-1')] == [1]
+
+
+def test_columnar_codifica_por_diccionario():
+    filas = [(1, 101, 'a'), (2, 101, 'b'), (3, 102, 'c')]
+
+    data = columnar.desde_tuplas(('id', 'id_hilera', 'ubicacion'), filas, codificar=('id_hilera',))
+
+    assert data == {
+        "columns": ['id', 'id_hilera', 'ubicacion'],
+        "count": 3,
+        "values": [[1, 2, 3], [0, 0, 1], ['a', 'b', 'c']],
+        "dictionaries": {"id_hilera": [101, 102]},
+    }
+    assert columnar.desde_tuplas(('id',), [])["values"] == [[]]
+
+
+def test_pool_se_recupera_si_el_handler_falla(fake_db, client, monkeypatch):
+    monkeypatch.setattr(Config, 'DB_POOL_MAX_SIZE', 2)
+    monkeypatch.setattr(Config, 'DB_POOL_TIMEOUT', 0.2)
+    fake_db.error = RuntimeError("falla de la base")
+
+    # El handler sale por su except sin llamar a conn.close()
+    for _ in range(5):
+        assert client.get('/api/registromapeo/rm-1').status_code == 500
+
+    fake_db.error = None
+    response = client.get('/api/registromapeo/rm-1')
+    assert response.status_code == 200
+    assert db.get_pool().stats()['en_uso'] == 0
+
+
+class ConexionDePool:
+    """Conexión mínima para probar ConnectionPool directamente."""
+
+    unread_result = False
+    in_transaction = False
+
+    def __init__(self, numero, al_hacer_ping=None, al_cerrar=None):
+        self.numero = numero
+        self.viva = True
+        self.pings = 0
+        self.cerrada = False
+        self.al_hacer_ping = al_hacer_ping
+        self.al_cerrar = al_cerrar
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.al_hacer_ping:
+            self.al_hacer_ping()
+        if not self.viva:
+            raise mysql.connector.errors.OperationalError("MySQL server has gone away")
+
+    def close(self):
+        if self.al_cerrar:
+            self.al_cerrar()
+        self.cerrada = True
+
+
+def fabrica_de_conexiones():
+    creadas = []
+
+    def crear():
+        creadas.append(ConexionDePool(len(creadas) + 1))
+        return creadas[-1]
+
+    crear.creadas = creadas
+    return crear
+
+
+def test_reemplazo_de_conexion_muerta_no_libera_su_cupo():
+    crear = fabrica_de_conexiones()
+    pool = db.ConnectionPool(crear, max_size=1, timeout=1, ping_after=0)
+    muerta = pool.acquire()
+    pool.release(muerta)
+    muerta.viva = False
+    errores = []
+
+    def otro_hilo():
+        try:
+            pool.release(pool.acquire(timeout=0.3))
+        except mysql.connector.errors.PoolError as e:
+            errores.append(e)
+
+    hilo = threading.Thread(target=otro_hilo)
+
+    def con_otro_esperando():
+        # Otro hilo queda esperando cupo mientras se detecta la conexión muerta
+        hilo.start()
+        limite = time.monotonic() + 5
+        while pool.stats()['esperas'] == 0 and time.monotonic() < limite:
+            time.sleep(0.001)
+
+    muerta.al_hacer_ping = con_otro_esperando
+    nueva = pool.acquire()
+    hilo.join()
+
+    assert nueva is not muerta and muerta.cerrada
+    assert len(errores) == 1 and len(crear.creadas) == 2
+    assert pool.stats()['tamano'] == 1
+    pool.release(nueva)
+    pool.close()
+
+
+def test_expiracion_cierra_fuera_del_lock(monkeypatch):
+    crear = fabrica_de_conexiones()
+    pool = db.ConnectionPool(crear, max_size=3, idle_timeout=60)
+    conexiones = [pool.acquire() for _ in range(3)]
+    for conn in conexiones:
+        pool.release(conn)
+    lock_libre = []
+
+    def tomar_lock():
+        # Desde otro hilo: el lock del pool es reentrante
+        tomado = pool._cond.acquire(timeout=0.5)
+        if tomado:
+            pool._cond.release()
+        lock_libre.append(tomado)
+
+    def al_cerrar():
+        hilo = threading.Thread(target=tomar_lock)
+        hilo.start()
+        hilo.join()
+
+    for conn in conexiones:
+        conn.al_cerrar = al_cerrar
+    ahora = time.monotonic()
+    monkeypatch.setattr(db.time, 'monotonic', lambda: ahora + 120)
+
+    pool.release(pool.acquire())
+
+    # Las tres expiraron; se abre una nueva para el préstamo
+    assert lock_libre == [True, True, True]
+    assert pool.stats()['tamano'] == 1 and pool.stats()['descartadas'] == 3
+    pool.close()
+
+
+class Reloj:
+    """time de utils.db con un monotonic controlado por el test."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+    def sleep(self, segundos):
+        self.ahora += segundos
+
+
+def test_precalentamiento_abre_conexiones_ociosas():
+    crear = fabrica_de_conexiones()
+    pool = db.ConnectionPool(crear, max_size=4)
+
+    assert pool.warm(3) == 3
+    assert pool.warm(3) == 0
+    assert pool.warm(10) == 1  # sin superar el máximo
+    stats = pool.stats()
+    assert (stats['tamano'], stats['ociosas'], stats['creadas']) == (4, 4, 4)
+    pool.close()
+
+    # Si la base no responde se detiene sin dejar cupos tomados
+    def sin_base():
+        raise mysql.connector.errors.InterfaceError("Can't connect")
+
+    pool = db.ConnectionPool(sin_base, max_size=4)
+    assert pool.warm(3) == 0
+    assert pool.stats()['tamano'] == 0
+
+
+def test_keepalive_solo_hace_ping_a_las_no_verificadas(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(db, 'time', reloj)
+    crear = fabrica_de_conexiones()
+    pool = db.ConnectionPool(crear, max_size=3, idle_timeout=1000)
+    vieja, reciente = pool.acquire(), pool.acquire()
+    pool.release(vieja)
+    reloj.sleep(100)
+    pool.release(reciente)
+    reloj.sleep(30)
+
+    assert pool.keepalive(60) == 1
+    assert (vieja.pings, reciente.pings) == (1, 0)
+
+    # Verificada recién: no se vuelve a hacer ping
+    reloj.sleep(20)
+    assert pool.keepalive(60) == 0
+    assert vieja.pings == 1
+    pool.close()
+
+
+def test_keepalive_repone_el_minimo(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(db, 'time', reloj)
+    crear = fabrica_de_conexiones()
+    pool = db.ConnectionPool(crear, min_size=2, max_size=4)
+    pool.warm(2)
+    muerta = crear.creadas[0]
+    muerta.viva = False
+    reloj.sleep(120)
+
+    pool.keepalive(60)
+
+    assert muerta.cerrada
+    assert len(crear.creadas) == 3
+    stats = pool.stats()
+    assert (stats['tamano'], stats['ociosas'], stats['descartadas']) == (2, 2, 1)
+    pool.close()
+
+
+def test_keepalive_conserva_el_orden_de_expiracion(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(db, 'time', reloj)
+    crear = fabrica_de_conexiones()
+    pool = db.ConnectionPool(crear, max_size=3, idle_timeout=100)
+    antigua, media, nueva = pool.acquire(), pool.acquire(), pool.acquire()
+    pool.release(antigua)
+    reloj.sleep(50)
+    pool.release(media)
+    reloj.sleep(30)
+    pool.release(nueva)
+    reloj.sleep(5)
+
+    # Ping a antigua y media; el ping no cuenta como uso
+    pool.keepalive(30)
+    reloj.sleep(35)  # antigua: 120 s sin uso, media: 70, nueva: 40
+    pool.keepalive(1000)
+
+    assert antigua.cerrada and not media.cerrada and not nueva.cerrada
+    # Y la más reciente es la primera en prestarse
+    assert pool.acquire() is nueva
+    pool.close()
+
+
+def test_mantenimiento_precalienta_y_hace_keepalive(fake_db, monkeypatch):
+    monkeypatch.setattr(Config, 'DB_POOL_PREWARM', 2)
+    monkeypatch.setattr(Config, 'DB_POOL_KEEPALIVE_INTERVAL', 60)
+    llamadas = []
+    monkeypatch.setattr(db.ConnectionPool, 'keepalive', lambda pool, interval: llamadas.append(interval))
+
+    class Fin(Exception):
+        pass
+
+    def dormir(segundos):
+        if llamadas:
+            raise Fin
+    monkeypatch.setattr(db, 'time', type('Tiempo', (), {'monotonic': staticmethod(time.monotonic),
+                                                           'sleep': staticmethod(dormir)}))
+
+    with pytest.raises(Fin):
+        db._pool_maintenance()
+
+    assert db.get_pool().stats()['ociosas'] == 2
+    assert llamadas == [60]
+
+    # Un solo hilo de mantenimiento por proceso
+    iniciados = []
+    monkeypatch.setattr(db, '_maintenance_pid', None)
+    monkeypatch.setattr(db, '_pool_maintenance', lambda: iniciados.append(1))
+    db.start_pool_maintenance()
+    db.start_pool_maintenance()
+    time.sleep(0.05)
+    assert iniciados == [1]
+
+
+def test_return_temprano_deshace_la_transaccion(fake_db, client):
+    # Fecha inválida: 400 dentro de start_transaction sin cerrar la conexión
+    response = client.put('/api/registromapeo/rm-1', json={'fecha_inicio': '18-10-2026'})
+
+    assert response.status_code == 400
+    assert fake_db.rollbacks == 1
+    assert db.get_pool().stats()['en_uso'] == 0
+
+
+def test_breaker_abre_y_prueba_en_semiabierto():
+    breaker = db.TransportBreaker('prueba', failure_threshold=2, reset_timeout=0.05)
+
+    breaker.record_failure(OSError("sin socket"))
+    assert breaker.allow()
+    breaker.record_failure(OSError("sin socket"))
+    assert breaker.status()['estado'] == 'abierto'
+    assert not breaker.allow()
+
+    # Vencida la espera deja pasar un solo intento de prueba
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.status()['estado'] == 'semiabierto'
+    assert not breaker.allow()
+
+    # La prueba falla: se reabre con el doble de espera
+    breaker.record_failure(OSError("sin socket"))
+    assert breaker.status()['estado'] == 'abierto'
+    time.sleep(0.06)
+    assert not breaker.allow()
+    time.sleep(0.05)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.status()['estado'] == 'cerrado'
+    assert breaker.allow()
+
+
+def test_transporte_cambia_a_ip_publica_si_el_socket_falla(monkeypatch):
+    monkeypatch.setattr(Config, 'is_cloud_run', classmethod(lambda cls: True))
+    monkeypatch.setattr(db, '_current_transport', 'unix_socket')
+    monkeypatch.setattr(db, '_breakers', {
+        t: db.TransportBreaker(t, failure_threshold=2, reset_timeout=60) for t in db._TRANSPORTS
+    })
+    intentos = []
+
+    def connect(**params):
+        intentos.append('unix_socket' if 'unix_socket' in params else 'ip_publica')
+        if 'unix_socket' in params:
+            raise mysql.connector.errors.InterfaceError("socket no disponible")
+        return object()
+
+    monkeypatch.setattr(db.mysql.connector, 'connect', connect)
+
+    db._connect_cloud_run()
+    assert intentos == ['unix_socket', 'ip_publica']
+    assert db.get_transport_status()['transporte_actual'] == 'ip_publica'
+
+    # El socket quedó abierto: la siguiente conexión va directo por IP pública
+    intentos.clear()
+    db._connect_cloud_run()
+    assert intentos == ['ip_publica']
+    assert db.get_transport_status()['transportes']['unix_socket']['estado'] == 'abierto'
+
+
+def test_n_mas_uno_avisa_una_vez_por_peticion(fake_db, monkeypatch, caplog):
+    monkeypatch.setattr(Config, 'DB_N_PLUS_ONE_THRESHOLD', 3)
+    app = Flask(__name__)
+    db.init_app(app)
+
+    @app.route('/hileras')
+    def hileras_una_por_una():
+        conn = db.get_db_connection()
+        cursor = conn.cursor()
+        for i in range(8):
+            # Mismo SQL con otros parámetros y listas IN de otro largo
+            cursor.execute(f"SELECT id FROM general_dim_hilera WHERE id IN ({', '.join(['%s'] * (i + 2))})",
+                           tuple(range(i + 2)))
+            cursor.fetchall()
+        cursor.execute("SELECT id FROM general_dim_cuartel WHERE id = 7")
+        cursor.close()
+        conn.close()
+        return {}
+
+    with caplog.at_level('WARNING', logger=query_stats.logger.name):
+        response = app.test_client().get('/hileras')
+        app.test_client().get('/hileras')
+
+    assert 'desc="9 consultas"' in response.headers['Server-Timing']
+    avisos = [r.getMessage() for r in caplog.records if 'N+1' in r.getMessage()]
+    # Uno por petición, solo para la consulta repetida
+    assert len(avisos) == 2
+    assert 'hileras_una_por_una' in avisos[0] and 'más de 3 veces' in avisos[0]
+    assert 'general_dim_hilera WHERE id IN (?+)' in avisos[0]
+
+
+def test_metricas_solo_admin(fake_db, client):
+    client.get('/api/registromapeo/rm-1')
+
+    response = client.get('/api/opciones/metricas')
+    assert response.status_code == 200
+    metricas = response.get_json()['db']
+    assert metricas['pools'][0]['nombre'] == 'primary'
+    # La única en uso es la de esta petición (verificar_admin)
+    assert metricas['pools'][0]['en_uso'] == 1
+    assert set(metricas['transportes']['transportes']) == {'unix_socket', 'ip_publica'}
+    assert 'hits' in metricas['statements_preparados']
+
+    fake_db.perfil = 1
+    assert client.get('/api/opciones/metricas').status_code == 403
+
+
+def test_catalogo_usa_una_sola_conexion(fake_db, client):
+    catalogos._cache.clear()
+
+    # La versión del catálogo y el handler comparten la conexión de la petición
+    response = client.get('/api/opciones/')
+
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    stats = db.get_pool().stats()
+    assert stats['creadas'] + stats['reutilizadas'] == 1
+
+
+def test_sucursales_etag_por_usuario(fake_db, client):
+    catalogos._cache.clear()
+
+    response = client.get('/api/opciones/sucursales')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert 'Authorization' in response.headers['Vary']
+
+    # El mismo usuario revalida su copia
+    assert client.get('/api/opciones/sucursales', headers={'If-None-Match': etag}).status_code == 304
+
+    # Otro usuario no puede validar la copia del primero
+    with client.application.app_context():
+        otro = create_access_token(identity='usuario-2')
+    response = client.get('/api/opciones/sucursales',
+                          headers={'If-None-Match': etag, 'Authorization': f'Bearer {otro}'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_statements_preparados_se_liberan_con_la_conexion(fake_db):
+    sql = "SELECT id FROM general_dim_hilera h WHERE h.id = %s"
+
+    conn = db.get_db_connection()
+    for i in range(3):
+        cursor = conn.cursor()
+        cursor.execute(sql, (i,))
+        cursor.fetchall()
+        cursor.close()
+    fisica = conn._conn
+    conn.close()
+    assert fisica in db._statement_caches
+
+    # Al cerrar la conexión física el pool descarta su caché
+    db.get_pool().close()
+    assert fisica not in db._statement_caches
+
+    # Y la caché no mantiene viva a una conexión que ya nadie referencia
+    otra = FakeConnection(fake_db)
+    db._statement_caches[otra] = db.StatementCache(4)
+    del otra
+    gc.collect()
+    assert len(db._statement_caches) == 0
+
+
+def test_consultas_calientes_sobreviven_al_sql_dinamico(monkeypatch):
+    monkeypatch.setattr(db, '_statement_seen', OrderedDict())
+    monkeypatch.setattr(Config, 'DB_STMT_CACHE_THRESHOLD', 2)
+    caliente = "SELECT id FROM general_dim_cuartel WHERE id = %s"
+    db._is_hot(caliente)
+    assert db._is_hot(caliente)
+
+    for i in range(3 * db._STATEMENT_SEEN_MAX):
+        db._is_hot(f"SELECT id FROM general_dim_cuartel WHERE id IN ({i})")
+        if i % 100 == 0:
+            assert db._is_hot(caliente)
+
+    assert db._is_hot(caliente)
+    assert len(db._statement_seen) == db._STATEMENT_SEEN_MAX
+
+
+def test_lecturas_van_a_la_replica_y_escrituras_al_primario(fake_db, monkeypatch):
+    monkeypatch.setattr(db, '_replicas', db.ReplicaSet(['replica-1:3306']))
+    monkeypatch.setattr(db, '_replica_factory', lambda name: lambda: FakeConnection(fake_db))
+    app = Flask(__name__)
+
+    with app.test_request_context('/', method='GET'):
+        conn = db.get_db_connection()
+        assert conn._pool.name == 'replica:replica-1:3306'
+        conn.close()
+
+        # Tras escribir, la petición puede exigir el primario
+        db.use_primary()
+        conn = db.get_db_connection()
+        assert conn._pool.name == 'primary'
+        conn.close()
+
+    with app.test_request_context('/', method='POST'):
+        conn = db.get_db_connection()
+        assert conn._pool.name == 'primary'
+        conn.close()
+
+
+def test_replica_caida_sale_de_rotacion(fake_db, monkeypatch):
+    monkeypatch.setattr(db, '_replicas', db.ReplicaSet(['replica-1:3306']))
+
+    def sin_replica(name):
+        def connect():
+            raise mysql.connector.errors.InterfaceError("réplica no disponible")
+        return connect
+
+    monkeypatch.setattr(db, '_replica_factory', sin_replica)
+    app = Flask(__name__)
+
+    with app.test_request_context('/', method='GET'):
+        conn = db.get_db_connection()
+        assert conn._pool.name == 'primary'
+        conn.close()
+
+    estado = db.get_replica_status()['replica:replica-1:3306']
+    assert estado['sano'] is False
+    assert 'réplica no disponible' in estado['error']
+    assert db._replicas.choose() is None
+
+
+def test_replica_sin_permiso_para_leer_el_retraso(fake_db, monkeypatch, caplog):
+    replicas = db.ReplicaSet(['replica-1:3306'], max_lag=5)
+    monkeypatch.setattr(db, '_replicas', replicas)
+    monkeypatch.setattr(db, '_replica_factory', lambda name: lambda: FakeConnection(fake_db))
+    fake_db.error = mysql.connector.errors.ProgrammingError("Access denied; you need the REPLICATION CLIENT privilege")
+
+    with caplog.at_level('WARNING', logger=db.logger.name):
+        replicas.check()
+        replicas.check()
+
+    # Retraso desconocido: fuera de rotación, con un solo aviso
+    estado = replicas.status()['replica:replica-1:3306']
+    assert estado['sano'] is False and 'desconocido' in estado['error']
+    assert replicas.choose() is None
+    assert len([r for r in caplog.records if 'REPLICATION CLIENT' in r.getMessage()]) == 1
+
+    # Sin control de retraso (DB_REPLICA_MAX_LAG=0) se usa igual
+    replicas.max_lag = 0
+    replicas.check()
+    assert replicas.choose() == 'replica:replica-1:3306'
+
+    # Con el permiso vuelve a controlarse el retraso
+    replicas.max_lag = 5
+    fake_db.error = None
+    fake_db.respuestas['SHOW REPLICA STATUS'] = (('Seconds_Behind_Source',), [(12,)])
+    replicas.check()
+    estado = replicas.status()['replica:replica-1:3306']
+    assert estado['sano'] is False and estado['retraso_s'] == 12
+    fake_db.respuestas['SHOW REPLICA STATUS'] = (('Seconds_Behind_Source',), [(1,)])
+    replicas.check()
+    assert replicas.choose() == 'replica:replica-1:3306'
+
+
+@pytest.mark.parametrize('formato', ['ndjson', 'array'])
+def test_listado_en_streaming(fake_db, client, monkeypatch, formato):
+    monkeypatch.setattr(Config, 'STREAM_CHUNK_SIZE', 2)
+    fake_db.n_registros = 5
+
+    response = client.get(f'/api/registromapeo/?stream={formato}')
+
+    assert response.is_streamed
+    cuerpo = response.get_data(as_text=True)
+    if formato == 'ndjson':
+        assert response.mimetype == 'application/x-ndjson'
+        filas = [json.loads(linea) for linea in cuerpo.splitlines()]
+    else:
+        filas = json.loads(cuerpo)
+    assert filas == [{'id': f'rm-{i}', 'id_cuartel': i} for i in range(5)]
+    assert db.get_pool().stats()['en_uso'] == 0
+
+
+def test_streaming_informa_el_error_en_ndjson(fake_db, client):
+    fake_db.error = RuntimeError("se cayó la conexión")
+
+    lineas = client.get('/api/registromapeo/?stream=1').get_data(as_text=True).splitlines()
+
+    assert json.loads(lineas[-1]) == {"error": "se cayó la conexión"}
+    assert db.get_pool().stats()['en_uso'] == 0
+
+
+def test_presupuesto_por_endpoint_llega_a_mysql(fake_db, client, monkeypatch):
+    monkeypatch.setattr(Config, 'REQUEST_TIME_BUDGETS', {'registromapeo_bp.obtener_registro_mapeo': 300})
+
+    assert client.get('/api/registromapeo/rm-1').status_code == 200
+
+    hint = re.search(r'MAX_EXECUTION_TIME\((\d+)\)', fake_db.consultas[-1])
+    assert hint and 0 < int(hint.group(1)) <= 300
+
+
+def test_timeout_de_mysql_responde_504(fake_db, client):
+    fake_db.error = mysql.connector.errors.DatabaseError(msg="Query execution was interrupted", errno=3024)
+
+    response = client.get('/api/registromapeo/rm-1')
+
+    assert response.status_code == 504
+
+
+@pytest.mark.parametrize('presupuesto, status', [(100, 504), (25000, 503)])
+def test_pool_saturado_segun_presupuesto(fake_db, client, monkeypatch, presupuesto, status):
+    monkeypatch.setattr(Config, 'DB_POOL_MAX_SIZE', 1)
+    monkeypatch.setattr(Config, 'DB_POOL_TIMEOUT', 0.3)
+    monkeypatch.setattr(Config, 'REQUEST_TIME_BUDGET_MS', presupuesto)
+    ocupada = db.get_db_connection()
+
+    # Con menos presupuesto que la espera del pool se agota la petición (504);
+    # si no, el pool no entrega a tiempo (503 con Retry-After)
+    response = client.get('/api/registromapeo/rm-1')
+
+    assert response.status_code == status
+    if status == 503:
+        assert response.headers['Retry-After'] == '1'
+    ocupada.close()
+
+
+class FakeAsyncPool:
+    """Pool mínimo con la interfaz de aiomysql usada por utils/db_async.py."""
+
+    def __init__(self, filas=(), demora=0.0):
+        self.filas = list(filas)
+        self.demora = demora
+        self.consultas = []
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    @contextlib.asynccontextmanager
+    async def cursor(self, cursor_class=None):
+        yield self
+
+    async def execute(self, sql, params=None):
+        self.consultas.append(sql)
+        await asyncio.sleep(self.demora)
+
+    async def fetchall(self):
+        return self.filas
+
+    async def fetchone(self):
+        return self.filas[0] if self.filas else None
+
+
+def test_lecturas_async_usan_la_misma_consulta(fake_db, client, monkeypatch):
+    pool = FakeAsyncPool()
+    monkeypatch.setattr(db_async, '_pool', pool)
+
+    client.get('/api/registromapeo/')
+    asyncio.run(lecturas_async.obtener_registros_mapeo())
+
+    sin_hint = lambda sql: re.sub(r'/\*\+ MAX_EXECUTION_TIME\(\d+\) \*/ ', '', sql)
+    assert sin_hint(pool.consultas[0]) == sin_hint(fake_db.consultas[-1])
+
+
+def test_lecturas_async_respetan_el_presupuesto(monkeypatch):
+    monkeypatch.setattr(db_async, '_pool', FakeAsyncPool(demora=0.5))
+
+    async def leer():
+        db_async.start_deadline(50)
+        return await lecturas_async.obtener_hileras()
+
+    inicio = time.monotonic()
+    with pytest.raises(deadlines.DeadlineExceeded):
+        asyncio.run(leer())
+    assert time.monotonic() - inicio < 0.4
+    hint = re.search(r'MAX_EXECUTION_TIME\((\d+)\)', db_async._pool.consultas[0])
+    assert hint and int(hint.group(1)) <= 50
+
+
+def test_presupuesto_async_igual_que_en_flask(monkeypatch):
+    from blueprints.plantas import buscar_plantas_por_ubicacion
+
+    monkeypatch.setattr(Config, 'REQUEST_TIME_BUDGETS', {'hileras_bp': 3000})
+
+    assert deadlines.budget_for('hileras_bp.obtener_hileras') == 3000
+    assert deadlines.budget_for('plantas_bp.buscar_plantas_por_ubicacion', buscar_plantas_por_ubicacion) == 5000
+    assert deadlines.budget_for('plantas_bp.obtener_plantas') == Config.REQUEST_TIME_BUDGET_MS
+
+
+@pytest.mark.parametrize('n_registros', [1, 5, 40])
+def test_progreso_lote_reconstruye_con_consultas_constantes(fake_db, client, n_registros):
+    fake_db.n_registros = n_registros
+    ids = ','.join(f'rm-{i}' for i in range(n_registros))
+
+    response = client.get(f'/api/registromapeo/progreso?ids={ids}')
+
+    assert response.status_code == 200
+    # registros + hileras + (upsert, limpieza, versiones) + hileras de nuevo
+    assert len([sql for sql in fake_db.consultas if not sql.startswith('SET SESSION')]) == 6
+    assert sorted(fake_db.reconstruidos) == sorted(ids.split(','))
+    data = response.get_json()
+    assert len(data) == n_registros
+    assert data[0]['plantas_mapeadas'] == 6
+
+
+def test_single_flight_comparte_una_ejecucion(fake_db, client, monkeypatch):
+    monkeypatch.setattr(singleflight, '_ejecutadas', singleflight.Counter())
+    monkeypatch.setattr(singleflight, '_coalescidas', singleflight.Counter())
+    fake_db.n_hileras = 3
+    fake_db.bloqueo = threading.Event()
+    respuestas = []
+    hilos = [
+        threading.Thread(target=lambda: respuestas.append(client.get('/api/registromapeo/rm-1/progreso')))
+        for _ in range(5)
+    ]
+    for hilo in hilos:
+        hilo.start()
+
+    # El primero queda calculando; los otros cuatro esperan su resultado
+    limite = time.monotonic() + 5
+    while sum(v.esperando for v in list(singleflight._en_vuelo.values())) < 4 and time.monotonic() < limite:
+        time.sleep(0.01)
+    fake_db.bloqueo.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert [r.status_code for r in respuestas] == [200] * 5
+    assert len({r.get_data() for r in respuestas}) == 1
+    assert len([sql for sql in fake_db.consultas if 'FROM general_dim_hilera h' in sql]) == 1
+
+    fake_db.bloqueo = None
+    metricas = client.get('/api/opciones/metricas').get_json()
+    assert metricas['single_flight']['registromapeo_bp.obtener_progreso_registro'] == {
+        "ejecutadas": 1, "coalescidas": 4
+    }
+
+
+@pytest.fixture
+def estadisticas_cargadas(monkeypatch):
+    monkeypatch.setattr(estadisticas, '_hilo_pid', db.os.getpid())  # sin hilo de reconciliación
+    monkeypatch.setattr(estadisticas, '_conteos', estadisticas.Counter())
+    monkeypatch.setattr(estadisticas, '_sucursales', {7: 1})
+    monkeypatch.setattr(estadisticas, '_cargado_pid', db.os.getpid())
+
+
+def test_estadisticas_no_pierden_altas_concurrentes(estadisticas_cargadas):
+    registro = {"id_temporada": 1, "id_cuartel": 7, "id_estado": 1}
+
+    def altas():
+        for _ in range(2000):
+            estadisticas.aplicar(nuevo=registro)
+
+    hilos = [threading.Thread(target=altas) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert estadisticas.obtener()['total_registros'] == 16000
+
+
+def reconciliar_con(monkeypatch, foto, en_foto, durante_la_carga):
+    """Reconcilia con `foto` como conteos de la base y `en_foto` como estado de cada registro en ella."""
+    def cargar(cursor):
+        for anterior, nuevo in durante_la_carga:
+            estadisticas.aplicar(anterior, nuevo)
+        return estadisticas.Counter(foto), {7: 1}
+
+    monkeypatch.setattr(estadisticas, '_cargar', cargar)
+    monkeypatch.setattr(estadisticas, '_en_foto', lambda cursor, ids: {i: en_foto.get(i) for i in ids})
+    estadisticas.reconciliar()
+    assert estadisticas._recargas == []
+
+
+def test_reconciliacion_conserva_cambios_durante_la_carga(fake_db, estadisticas_cargadas, monkeypatch):
+    registro = {"id": "rm-9", "id_temporada": 1, "id_cuartel": 7, "id_estado": 1}
+
+    # La foto de la base se tomó antes de que se confirmara esta alta
+    reconciliar_con(monkeypatch, {(1, 7, 1, 1): 3}, {}, [(None, registro)])
+
+    assert estadisticas.obtener()['total_registros'] == 4
+
+
+def test_reconciliacion_no_cuenta_dos_veces_lo_que_ya_esta_en_la_foto(fake_db, estadisticas_cargadas, monkeypatch):
+    registro = {"id": "rm-9", "id_temporada": 1, "id_cuartel": 7, "id_estado": 1}
+    pausado = {**registro, "id_estado": 3}
+
+    # Alta confirmada antes de la foto; el cambio a pausado, después
+    reconciliar_con(monkeypatch, {(1, 7, 1, 1): 3}, {"rm-9": registro}, [(None, registro), (registro, pausado)])
+
+    resultado = estadisticas.obtener()
+    assert resultado['total_registros'] == 3
+    assert resultado['en_progreso'] == 2 and resultado['pausados'] == 1
+
+    # Baja confirmada antes de la foto
+    reconciliar_con(monkeypatch, {(1, 7, 1, 1): 2}, {}, [(pausado, None)])
+    assert estadisticas.obtener()['total_registros'] == 2
+
+
+def test_estadisticas_filtro_invalido_responde_400(fake_db, client):
+    response = client.get('/api/registromapeo/estadisticas?temporada=abc&cuartel=7')
+
+    assert response.status_code == 400
+    assert 'temporada' in response.get_json()['error']
+
+
+def test_paginacion_recorre_todo_sin_repetir(fake_db, client):
+    fake_db.sqlite = sqlite3.connect(':memory:')
+    fake_db.sqlite.execute("CREATE TABLE mapeo_fact_registromapeo (id TEXT, id_cuartel INT, fecha_inicio TEXT)")
+    # Empates en la columna de orden y fechas NULL
+    filas = [('a', 1, '2026-01-01'), ('b', 2, '2026-03-01'), ('c', 3, '2026-03-01'), ('d', 4, None),
+             ('e', 5, '2026-02-01'), ('f', 6, None), ('g', 7, '2026-03-01')]
+    fake_db.sqlite.executemany("INSERT INTO mapeo_fact_registromapeo VALUES (?, ?, ?)", filas)
+
+    vistos, cursor = [], None
+    while True:
+        url = '/api/registromapeo/?fields=id,id_cuartel&limit=2' + (f'&cursor={cursor}' if cursor else '')
+        pagina = client.get(url).get_json()
+        assert len(pagina['data']) <= 2 and pagina['limit'] == 2
+        vistos += [fila['id'] for fila in pagina['data']]
+        cursor = pagina['next']
+        if cursor is None:
+            break
+
+    # fecha_inicio DESC, id DESC; los NULL al final
+    assert vistos == ['g', 'c', 'b', 'e', 'a', 'f', 'd']
+    assert set(pagina['data'][0]) == {'id', 'id_cuartel'}
+
+
+def test_pagina_columnar_equivale_a_la_de_filas(fake_db, client):
+    fake_db.sqlite = sqlite3.connect(':memory:')
+    fake_db.sqlite.execute("CREATE TABLE mapeo_fact_registromapeo (id TEXT, id_cuartel INT, fecha_inicio TEXT)")
+    fake_db.sqlite.executemany("INSERT INTO mapeo_fact_registromapeo VALUES (?, ?, ?)",
+                               [('a', 1, '2026-01-01'), ('b', 1, '2026-02-01'), ('c', 2, '2026-03-01')])
+
+    filas = client.get('/api/registromapeo/?fields=id_cuartel&limit=2').get_json()
+    columnas = client.get('/api/registromapeo/?fields=id_cuartel&limit=2&format=columns').get_json()
+
+    # La columna agregada para el cursor no aparece en la respuesta (el id va siempre)
+    data = columnas['data']
+    assert data['columns'] == ['id', 'id_cuartel'] and data['count'] == 2
+    assert [dict(zip(data['columns'], fila)) for fila in zip(*data['values'])] == filas['data']
+    assert columnas['next'] == filas['next']
+
+
+def test_cursor_conserva_fechas_y_rechaza_otro_listado():
+    valor = datetime(2026, 3, 1, 8, 30)
+    codificado = paginacion._codificar('hora_registro', valor, 'r-9')
+
+    assert paginacion._decodificar(codificado, 'hora_registro') == (valor, 'r-9')
+    with pytest.raises(paginacion.CursorInvalido):
+        paginacion._decodificar(codificado, 'fecha_inicio')
+    with pytest.raises(paginacion.CursorInvalido):
+        paginacion._decodificar('no-es-un-cursor', 'hora_registro')
+
+
+def test_cursor_invalido_responde_400(fake_db, client):
+    assert client.get('/api/registromapeo/?cursor=xyz').status_code == 400
+    assert client.get('/api/registromapeo/?limit=0').status_code == 400
+
+
+def test_fields_limita_las_columnas_consultadas(fake_db, client):
+    response = client.get('/api/registromapeo/rm-1?fields=id_estado,id,id_estado')
+
+    assert response.status_code == 200
+    # Solo las columnas pedidas, en orden y sin repetir
+    assert re.search(r' id_estado, id\s+FROM', fake_db.consultas[-1])
+    assert set(response.get_json()) == {'id', 'id_estado'}
+
+
+def test_campos_pedidos_valida_y_agrega_el_id():
+    app = Flask(__name__)
+    permitidos = ('id', 'nombre', 'n_hileras')
+    with app.test_request_context('/?fields=n_hileras, nombre,n_hileras'):
+        assert campos.pedidos(permitidos) == ['id', 'n_hileras', 'nombre']
+    with app.test_request_context('/?fields=nombre,id'):
+        assert campos.pedidos(permitidos) == ['nombre', 'id']
+    with app.test_request_context('/'):
+        assert campos.pedidos(permitidos) == list(permitidos)
+    with app.test_request_context('/?fields=id,clave'):
+        with pytest.raises(campos.CamposInvalidos, match='clave'):
+            campos.pedidos(permitidos)
+
+
+def test_fields_en_lecturas_con_join(fake_db, client):
+    response = client.get('/api/registros/hilera/3?fields=numero_planta,hora_registro')
+
+    assert response.status_code == 200
+    sql = fake_db.consultas[-1]
+    assert re.search(r' r\.id, p\.planta as numero_planta, r\.hora_registro\s+FROM', sql)
+    assert 'JOIN general_dim_planta' in sql
+
+    response = client.get('/api/registros/hilera/3?fields=id,nombre_cuartel')
+    assert response.status_code == 400
+    assert 'nombre_cuartel' in response.get_json()['error']
+
+
+def test_fields_desconocido_responde_400(fake_db, client):
+    response = client.get('/api/registromapeo/rm-1?fields=id,clave')
+
+    assert response.status_code == 400
+    assert 'clave' in response.get_json()['error']
+    assert 'Permitidos: id, id_temporada' in response.get_json()['error']
+    assert fake_db.consultas == []
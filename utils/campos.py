@@ -0,0 +1,47 @@
+"""
+Proyección de columnas con `?fields=id,nombre,n_hileras`.
+
+Cada recurso declara su lista blanca de columnas (CAMPOS en su blueprint);
+los campos pedidos se validan contra ella y van directo a la lista del
+SELECT, así que solo viajan desde la base las columnas que el cliente usa.
+El id va siempre, aunque no se pida, para que el cliente pueda identificar
+cada fila. Sin `fields` se devuelven todas, como antes.
+
+En las consultas con JOIN la lista blanca es un dict campo → expresión SQL
+(p. ej. 'nombre_cuartel': 'c.nombre AS nombre_cuartel') y `select` traduce
+cada campo pedido a su expresión.
+"""
+from flask import request
+
+
+class CamposInvalidos(ValueError):
+    pass
+
+
+def pedidos(permitidos):
+    """Columnas a seleccionar según `?fields=`, en el orden pedido, sin repetir y con el id."""
+    valor = request.args.get('fields', '').strip()
+    if not valor:
+        return list(permitidos)
+
+    campos = []
+    for campo in valor.split(','):
+        campo = campo.strip()
+        if campo and campo not in campos:
+            campos.append(campo)
+
+    desconocidos = [c for c in campos if c not in permitidos]
+    if desconocidos:
+        raise CamposInvalidos(
+            f"Campos no válidos: {', '.join(desconocidos)}. Permitidos: {', '.join(permitidos)}"
+        )
+    if 'id' in permitidos and 'id' not in campos:
+        campos.insert(0, 'id')
+    return campos
+
+
+def select(plantilla, columnas, expresiones=None):
+    """Completa `{columnas}` de una plantilla SQL con la lista del SELECT."""
+    if expresiones:
+        columnas = [expresiones[c] for c in columnas]
+    return plantilla.format(columnas=', '.join(columnas))
@@ -0,0 +1,139 @@
+"""
+GET condicional (ETag / Last-Modified) para catálogos y datos maestros.
+
+Cada tabla tiene una versión en mapeo_fact_version con clave
+'tabla:<nombre>'. Los POST/PUT/DELETE que la modifican la incrementan con
+registrar_cambio(); las tablas que se editan fuera de la API la incrementan
+por triggers (CREATE_TRIGGERS_VERSION_CATALOGOS.sql).
+
+@condicional(*tablas) arma el ETag con las versiones de las tablas que lee
+el endpoint y el Last-Modified con su última fecha de cambio, y responde
+304 a If-None-Match / If-Modified-Since sin ejecutar el handler. Las
+versiones se guardan en memoria CATALOGO_VERSION_TTL segundos, así que un
+catálogo sin cambios responde 304 sin tocar la base; una escritura en este
+worker descarta su entrada al terminar la petición y los demás workers la
+ven al vencer el TTL.
+"""
+import hashlib
+import logging
+import threading
+import time
+from datetime import timezone
+from functools import wraps
+from flask import Response, after_this_request, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from config import Config
+from utils.db import get_request_connection
+from utils import serializacion, versiones
+
+logger = logging.getLogger(__name__)
+
+_cache = {}  # clave -> (expira, version, fecha_actualizacion)
+_lock = threading.Lock()
+
+
+def _clave(tabla):
+    return f"tabla:{tabla}"
+
+
+def _estado(tablas):
+    """Versión y fecha de última modificación de cada tabla, desde la caché o la base."""
+    claves = [_clave(t) for t in tablas]
+    ahora = time.monotonic()
+    with _lock:
+        vigentes = {c: _cache[c] for c in claves if c in _cache and _cache[c][0] > ahora}
+    faltan = [c for c in claves if c not in vigentes]
+
+    if faltan:
+        conn = get_request_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(f"""
+                SELECT clave, version, fecha_actualizacion
+                FROM mapeo_fact_version
+                WHERE clave IN ({', '.join(['%s'] * len(faltan))})
+            """, faltan)
+            filas = {f['clave']: f for f in cursor.fetchall()}
+        finally:
+            cursor.close()
+            conn.close()
+
+        expira = time.monotonic() + Config.CATALOGO_VERSION_TTL
+        with _lock:
+            for c in faltan:
+                fila = filas.get(c)
+                entrada = (expira, fila['version'], fila['fecha_actualizacion']) if fila else (expira, 0, None)
+                _cache[c] = vigentes[c] = entrada
+
+    return [vigentes[c][1:] for c in claves]
+
+
+def registrar_cambio(cursor, *tablas):
+    """
+    Incrementa la versión de `tablas` en la transacción de `cursor`. La
+    caché local se descarta al terminar la petición, ya confirmado el cambio.
+    """
+    for tabla in tablas:
+        versiones.incrementar(cursor, _clave(tabla))
+
+    @after_this_request
+    def _descartar(response):
+        with _lock:
+            for tabla in tablas:
+                _cache.pop(_clave(tabla), None)
+        return response
+
+
+def _usuario():
+    """Huella corta de la identidad JWT, para ETags de respuestas que dependen del usuario."""
+    return hashlib.sha256(str(get_jwt_identity()).encode()).hexdigest()[:16]
+
+
+def condicional(*tablas, por_usuario=False):
+    """
+    Decorador para GET de catálogos; va debajo de @jwt_required(). Con
+    `por_usuario` (la respuesta depende del usuario) el ETag incluye la
+    identidad JWT y se envía `Vary: Authorization`, así el 304 de un
+    usuario no valida la copia de otro.
+    """
+    def decorador(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            try:
+                estados = _estado(tablas)
+            except Exception as e:
+                # Sin versiones se responde igual, solo que sin validadores
+                logger.warning(f"⚠️ No se pudieron leer las versiones de {', '.join(tablas)}: {str(e)}")
+                return view(*args, **kwargs)
+
+            etag = 'tabla-' + '.'.join(str(version) for version, _ in estados)
+            if por_usuario:
+                etag += '-' + _usuario()
+            etag = serializacion.etag(etag, serializacion.formato_respuesta())
+            fechas = [fecha for _, fecha in estados if fecha is not None]
+            ultima = max(fechas).replace(tzinfo=timezone.utc, microsecond=0) if fechas else None
+
+            if request.if_none_match:
+                no_modificado = request.if_none_match.contains_weak(etag)
+            else:
+                no_modificado = bool(ultima and request.if_modified_since and ultima <= request.if_modified_since)
+
+            if no_modificado:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if ultima:
+                response.last_modified = ultima
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Accept')
+            if por_usuario:
+                response.vary.add('Authorization')
+            return response
+        return wrapper
+    return decorador
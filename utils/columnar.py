@@ -0,0 +1,53 @@
+"""
+Formato columnar para listados grandes (`?format=columns`).
+
+En lugar de un objeto por fila se devuelve una lista por columna, alineada
+con la lista de nombres compartida:
+
+    {"columns": ["id", "id_hilera", "planta"],
+     "count": 3,
+     "values": [[11, 12, 13], [0, 0, 1], [1, 2, 1]],
+     "dictionaries": {"id_hilera": [101, 102]}}
+
+Las columnas con muchos valores repetidos (id_hilera, id_evaluador, ...) van
+codificadas por diccionario: `values` trae el índice en `dictionaries[col]`.
+Se arma directo desde las tuplas del cursor, sin crear un dict por fila.
+"""
+from flask import jsonify, request
+from utils.db import get_request_connection
+
+
+def pedido():
+    return request.args.get('format') == 'columns'
+
+
+def desde_tuplas(columnas, filas, codificar=()):
+    """Payload columnar a partir de `filas` (tuplas en el orden de `columnas`)."""
+    valores = [list(col) for col in zip(*filas)] if filas else [[] for _ in columnas]
+    diccionarios = {}
+    for i, nombre in enumerate(columnas):
+        if nombre not in codificar:
+            continue
+        indices = {}
+        valores[i] = [indices.setdefault(v, len(indices)) for v in valores[i]]
+        diccionarios[nombre] = list(indices)
+    return {
+        "columns": list(columnas),
+        "count": len(filas),
+        "values": valores,
+        "dictionaries": diccionarios,
+    }
+
+
+def respuesta(query, params=None, codificar=()):
+    """Ejecuta `query` con un cursor de tuplas y responde en formato columnar."""
+    conn = get_request_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        filas = cursor.fetchall()
+        columnas = cursor.column_names
+    finally:
+        cursor.close()
+        conn.close()
+    return jsonify(desde_tuplas(columnas, filas, codificar)), 200
@@ -0,0 +1,157 @@
+"""
+Compresión de respuestas según Accept-Encoding (zstd, brotli o gzip).
+
+Se comprimen las respuestas JSON/NDJSON/texto desde COMPRESSION_MIN_SIZE
+bytes; zstd y brotli solo si están instalados `zstandard` y `Brotli`. Las
+respuestas en streaming se comprimen por partes, vaciando el compresor en
+cada bloque para que el cliente siga recibiendo filas a medida que salen
+de la base. Server-Sent Events no se comprime.
+
+Las respuestas con ETag (progreso, catálogos) suelen repetirse idénticas:
+sus bytes comprimidos se guardan en una LRU por (ETag, codificación,
+contenido) y se reutilizan sin volver a comprimir.
+"""
+import gzip
+import logging
+import zlib
+from flask import request
+from config import Config
+from utils.cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # opcional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+COMPRIMIBLES = {
+    'application/json',
+    'application/x-ndjson',
+    'text/html',
+    'text/plain',
+    'text/csv',
+    'application/msgpack',
+    'application/x-msgpack',
+    'application/cbor',
+}
+
+cache_comprimidas = LRUCache(Config.COMPRESSION_CACHE_SIZE)
+
+
+def _disponibles():
+    disponibles = {'gzip'}
+    if brotli is not None:
+        disponibles.add('br')
+    if zstandard is not None:
+        disponibles.add('zstd')
+    return disponibles
+
+
+def _elegir_codificacion():
+    """Primera codificación de COMPRESSION_ALGORITHMS instalada y aceptada por el cliente."""
+    disponibles = _disponibles()
+    for codificacion in Config.COMPRESSION_ALGORITHMS:
+        if codificacion in disponibles and request.accept_encodings.quality(codificacion) > 0:
+            return codificacion
+    return None
+
+
+def comprimir(datos, codificacion):
+    if codificacion == 'zstd':
+        return zstandard.ZstdCompressor(level=Config.COMPRESSION_ZSTD_LEVEL).compress(datos)
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=Config.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(datos, compresslevel=Config.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def _compresor_streaming(codificacion):
+    """(comprimir_bloque, terminar) para enviar por partes."""
+    if codificacion == 'zstd':
+        compresor = zstandard.ZstdCompressor(level=Config.COMPRESSION_ZSTD_LEVEL).compressobj()
+        return (lambda bloque: compresor.compress(bloque) + compresor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                compresor.flush)
+    if codificacion == 'br':
+        compresor = brotli.Compressor(quality=Config.COMPRESSION_BROTLI_QUALITY)
+        return (lambda bloque: compresor.process(bloque) + compresor.flush(),
+                compresor.finish)
+    compresor = zlib.compressobj(Config.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = formato gzip
+    return (lambda bloque: compresor.compress(bloque) + compresor.flush(zlib.Z_SYNC_FLUSH),
+            compresor.flush)
+
+
+def _comprimir_streaming(response, codificacion):
+    original = response.response
+    partes = response.iter_encoded()
+    comprimir_bloque, terminar = _compresor_streaming(codificacion)
+
+    def generate():
+        try:
+            for parte in partes:
+                if parte:
+                    yield comprimir_bloque(parte)
+            yield terminar()
+        finally:
+            if hasattr(original, 'close'):
+                original.close()
+
+    response.response = generate()
+    response.headers.pop('Content-Length', None)
+
+
+def _debilitar_etag(response):
+    # Los bytes cambian con la codificación: el ETag pasa a ser débil
+    etag, debil = response.get_etag()
+    if etag and not debil:
+        response.set_etag(etag, weak=True)
+
+
+def _comprimir_respuesta(response):
+    if response.status_code == 304:
+        # Mismo ETag que tendría la respuesta completa
+        if _elegir_codificacion():
+            _debilitar_etag(response)
+        return response
+    if response.mimetype not in COMPRIMIBLES:
+        return response
+    if (response.status_code < 200 or response.status_code in (204, 206)
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or request.method == 'HEAD'):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    codificacion = _elegir_codificacion()
+    if codificacion is None:
+        return response
+
+    if response.is_streamed:
+        _comprimir_streaming(response, codificacion)
+    else:
+        datos = response.get_data()
+        if len(datos) < Config.COMPRESSION_MIN_SIZE:
+            return response
+
+        etag, _ = response.get_etag()
+        clave = (etag, codificacion, len(datos), zlib.crc32(datos)) if etag else None
+        comprimidos = cache_comprimidas.get(clave) if clave else None
+        if comprimidos is None:
+            comprimidos = comprimir(datos, codificacion)
+            if clave:
+                cache_comprimidas.set(clave, comprimidos)
+        response.set_data(comprimidos)
+
+    response.headers['Content-Encoding'] = codificacion
+    _debilitar_etag(response)
+    return response
+
+
+def init_app(app):
+    if not Config.COMPRESSION_ENABLED:
+        return
+    app.after_request(_comprimir_respuesta)
+    logger.info(f"✅ Compresión de respuestas: {', '.join(c for c in Config.COMPRESSION_ALGORITHMS if c in _disponibles())}")
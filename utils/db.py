@@ -1,7 +1,15 @@
 import mysql.connector
+from mysql.connector.errors import PoolError
 import os
+import time
 import logging
+import threading
+import weakref
+from functools import wraps
+from collections import deque, OrderedDict
+from flask import g, request, has_app_context, has_request_context
 from config import Config
+from utils import deadlines, query_stats
 
 logger = logging.getLogger(__name__)
 
@@ -65,71 +73,1103 @@ def parse_cloud_sql_url(url):
         logger.error(f"❌ Error parseando URL: {str(e)}")
         return None
 
-def get_db_connection():
+_TRANSPORTS = ('unix_socket', 'ip_publica')
+
+
+def _transport_params(transport):
+    """Parámetros de conexión de Cloud SQL para el transporte indicado."""
+    params = {
+        'user': Config.CLOUD_SQL_USER,
+        'password': Config.CLOUD_SQL_PASSWORD,
+        'database': Config.CLOUD_SQL_DB,
+        'charset': 'utf8mb4',
+        'autocommit': True,
+        'use_unicode': True
+    }
+    if transport == 'unix_socket':
+        params['unix_socket'] = f'/cloudsql/{Config.CLOUD_SQL_CONNECTION_NAME}'
+    else:
+        params['host'] = Config.CLOUD_SQL_HOST
+        params['port'] = Config.CLOUD_SQL_PORT
+    return params
+
+
+class TransportBreaker:
     """
-    Obtiene conexión a la base de datos.
-    Usa Unix socket en Cloud Run, IP pública como fallback.
+    Circuit breaker de un transporte hacia Cloud SQL.
+
+    Tras `failure_threshold` fallos consecutivos el circuito se abre y el
+    transporte no se intenta hasta que vence el tiempo de espera; entonces
+    pasa a semiabierto y deja pasar un único intento de prueba. Si la prueba
+    falla, el tiempo de espera se duplica (hasta `max_reset_timeout`).
     """
-    try:
-        # Verificar si estamos en Cloud Run
-        if os.getenv('K_SERVICE'):
-            logger.info("🚀 Detectado Cloud Run - intentando Unix socket")
-            
-            # Intentar primero con Unix socket
-            try:
-                connection_params = {
-                    'user': Config.CLOUD_SQL_USER,
-                    'password': Config.CLOUD_SQL_PASSWORD,
-                    'database': Config.CLOUD_SQL_DB,
-                    'unix_socket': '/cloudsql/gestion-la-hornilla:us-central1:gestion-la-hornilla',
-                    'charset': 'utf8mb4',
-                    'autocommit': True,
-                    'use_unicode': True
-                }
-                
-                logger.info("🔌 Intentando conexión Unix socket...")
-                conn = mysql.connector.connect(**connection_params)
-                logger.info("✅ Conexión Unix socket exitosa")
-                return conn
-                
-            except Exception as unix_error:
-                logger.warning(f"⚠️  Unix socket falló: {str(unix_error)}")
-                logger.info("🔄 Intentando con IP pública como fallback...")
-                
-                # Fallback a IP pública
-                connection_params = {
-                    'host': Config.CLOUD_SQL_HOST,
-                    'user': Config.CLOUD_SQL_USER,
-                    'password': Config.CLOUD_SQL_PASSWORD,
-                    'database': Config.CLOUD_SQL_DB,
-                    'port': Config.CLOUD_SQL_PORT,
-                    'charset': 'utf8mb4',
-                    'autocommit': True,
-                    'use_unicode': True
-                }
-                
-                logger.info("🔌 Intentando conexión a Cloud SQL por IP pública...")
-                conn = mysql.connector.connect(**connection_params)
-                logger.info("✅ Conexión IP pública exitosa")
-                return conn
-                
-        else:
-            # Conexión local (desarrollo)
-            logger.info("🏠 Modo desarrollo - usando conexión local")
-            connection_params = {
-                'host': Config.DB_HOST,
-                'user': Config.DB_USER,
-                'password': Config.DB_PASSWORD,
-                'database': Config.DB_NAME,
-                'port': Config.DB_PORT,
-                'charset': 'utf8mb4',
-                'autocommit': True,
-                'use_unicode': True
+
+    CLOSED = 'cerrado'
+    OPEN = 'abierto'
+    HALF_OPEN = 'semiabierto'
+
+    def __init__(self, name, failure_threshold=2, reset_timeout=30.0, max_reset_timeout=300.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._current_timeout = reset_timeout
+        self._next_probe = 0.0
+        self._probe_in_flight = False
+        self._consecutive_failures = 0
+        self._total_failures = 0
+        self._total_successes = 0
+        self._last_error = None
+
+    def allow(self):
+        """Indica si se puede intentar una conexión por este transporte."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() >= self._next_probe:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def probe_due(self):
+        """True si el circuito está abierto y ya corresponde un intento de prueba."""
+        with self._lock:
+            return self._state == self.OPEN and time.monotonic() >= self._next_probe
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"✅ Circuito '{self.name}' cerrado nuevamente")
+            self._state = self.CLOSED
+            self._current_timeout = self.reset_timeout
+            self._probe_in_flight = False
+            self._consecutive_failures = 0
+            self._total_successes += 1
+
+    def record_failure(self, error):
+        with self._lock:
+            self._consecutive_failures += 1
+            self._total_failures += 1
+            self._last_error = str(error)
+            if self._state == self.HALF_OPEN:
+                # La prueba falló: reabrir con espera creciente
+                self._current_timeout = min(self._current_timeout * 2, self.max_reset_timeout)
+                self._open_locked()
+            elif self._consecutive_failures >= self.failure_threshold:
+                self._open_locked()
+
+    def trip(self):
+        """Abre el circuito aunque no se haya alcanzado el umbral de fallos."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                self._open_locked()
+
+    def _open_locked(self):
+        self._state = self.OPEN
+        self._probe_in_flight = False
+        self._next_probe = time.monotonic() + self._current_timeout
+        logger.warning(
+            f"🚫 Circuito '{self.name}' abierto por {self._current_timeout:.0f}s "
+            f"({self._consecutive_failures} fallos consecutivos)"
+        )
+
+    def status(self):
+        with self._lock:
+            wait = max(0.0, self._next_probe - time.monotonic()) if self._state == self.OPEN else 0.0
+            return {
+                'estado': self._state,
+                'fallos_consecutivos': self._consecutive_failures,
+                'fallos_totales': self._total_failures,
+                'exitos_totales': self._total_successes,
+                'proxima_prueba_en': round(wait, 1),
+                'ultimo_error': self._last_error,
             }
-            logger.info(f"🔌 Conectando a BD local: {Config.DB_HOST}")
-            return mysql.connector.connect(**connection_params)
-        
+
+
+_breakers = {
+    transport: TransportBreaker(
+        transport,
+        failure_threshold=Config.DB_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout=Config.DB_BREAKER_RESET_TIMEOUT,
+        max_reset_timeout=Config.DB_BREAKER_MAX_RESET_TIMEOUT,
+    )
+    for transport in _TRANSPORTS
+}
+# Último transporte que funcionó; se intenta primero en la próxima conexión
+_current_transport = _TRANSPORTS[0]
+
+
+def get_transport_status():
+    """Transporte en uso y contadores de fallos por transporte (para monitoreo)."""
+    return {
+        'transporte_actual': _current_transport if Config.is_cloud_run() else 'local',
+        'transportes': {name: breaker.status() for name, breaker in _breakers.items()},
+    }
+
+
+def _connect_cloud_run():
+    """
+    Conecta a Cloud SQL empezando por el último transporte que funcionó y
+    saltando los que tienen el circuito abierto. Un transporte alternativo
+    cuya prueba semiabierta está vencida se intenta primero, para poder
+    volver a él (p. ej. al Unix socket) cuando se recupera.
+    """
+    global _current_transport
+    others = [t for t in _TRANSPORTS if t != _current_transport]
+    order = ([t for t in others if _breakers[t].probe_due()] + [_current_transport]
+             + [t for t in others if not _breakers[t].probe_due()])
+    last_error = None
+    failed = []
+
+    for transport in order:
+        breaker = _breakers[transport]
+        if not breaker.allow():
+            continue
+        try:
+            logger.info(f"🔌 Intentando conexión por {transport}...")
+            conn = mysql.connector.connect(**_transport_params(transport))
+        except Exception as e:
+            logger.warning(f"⚠️  Conexión por {transport} falló: {str(e)}")
+            breaker.record_failure(e)
+            failed.append(transport)
+            last_error = e
+            continue
+        breaker.record_success()
+        # Los transportes que fallaron quedan abiertos con su calendario de
+        # pruebas; si no, al ser "pegajosa" la selección nunca se reintentarían
+        for name in failed:
+            _breakers[name].trip()
+        if transport != _current_transport:
+            logger.info(f"🔄 Transporte activo cambia de {_current_transport} a {transport}")
+            _current_transport = transport
+        return conn
+
+    if last_error is not None:
+        raise last_error
+    raise mysql.connector.errors.InterfaceError(
+        "Todos los transportes a Cloud SQL tienen el circuito abierto"
+    )
+
+
+def _connect():
+    """
+    Abre una conexión física nueva a la base de datos.
+    En Cloud Run usa el transporte que funcionó por última vez (Unix socket o
+    IP pública) con circuit breaker; en desarrollo, la BD local.
+    """
+    try:
+        if Config.is_cloud_run():
+            return _connect_cloud_run()
+
+        # Conexión local (desarrollo)
+        connection_params = {
+            'host': Config.DB_HOST,
+            'user': Config.DB_USER,
+            'password': Config.DB_PASSWORD,
+            'database': Config.DB_NAME,
+            'port': Config.DB_PORT,
+            'charset': 'utf8mb4',
+            'autocommit': True,
+            'use_unicode': True
+        }
+        logger.info(f"🔌 Conectando a BD local: {Config.DB_HOST}")
+        return mysql.connector.connect(**connection_params)
+
     except Exception as e:
         logger.error(f"❌ Error conectando a BD: {str(e)}")
         logger.error(f"📋 Tipo de error: {type(e).__name__}")
         raise
+
+
+class ConnectionPool:
+    """
+    Pool acotado y thread-safe de conexiones MySQL.
+
+    Mantiene hasta `max_size` conexiones abiertas por proceso, reutiliza las
+    ociosas (LIFO, la más reciente primero), descarta las que llevan más de
+    `idle_timeout` segundos sin uso (sin bajar de `min_size`) y verifica con
+    un ping las que llevan más de `ping_after` segundos ociosas antes de
+    entregarlas.
+    """
+
+    def __init__(self, factory, min_size=0, max_size=10, timeout=10.0,
+                 idle_timeout=300.0, ping_after=10.0, name='primary'):
+        self.name = name
+        self._factory = factory
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self._idle = deque()  # (conexión, último uso, última verificación)
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {'creadas': 0, 'reutilizadas': 0, 'descartadas': 0, 'esperas': 0, 'timeouts': 0}
+
+    def acquire(self, timeout=None):
+        """Entrega una conexión viva, creando una nueva si hay cupo."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        evicted = []
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError(f"Pool '{self.name}' cerrado")
+                    evicted += self._evict_idle_locked()
+                    if self._idle:
+                        conn, _, last_checked = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolError(
+                            f"Tiempo de espera agotado ({timeout:.1f}s) obteniendo conexión del pool '{self.name}'"
+                        )
+                    self._stats['esperas'] += 1
+                    self._cond.wait(remaining)
+        finally:
+            # Cerrarlas es I/O de red: fuera del lock
+            for expired in evicted:
+                self._close_quietly(expired)
+
+        if conn is None:
+            return self._create()
+
+        if time.monotonic() - last_checked >= self.ping_after and not self._is_alive(conn):
+            logger.warning(f"⚠️  Conexión ociosa del pool '{self.name}' no responde, se reemplaza")
+            # Su cupo no se libera: pasa directo a la conexión nueva
+            self._close_quietly(conn)
+            with self._cond:
+                self._stats['descartadas'] += 1
+            return self._create()
+
+        with self._cond:
+            self._stats['reutilizadas'] += 1
+        return conn
+
+    def release(self, conn):
+        """Devuelve una conexión al pool (o la descarta si quedó inutilizable)."""
+        # Sin ping aquí: la verificación de vida se hace al prestarla
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+            if conn.in_transaction:
+                conn.rollback()
+            reusable = not self._closed
+        except Exception:
+            reusable = False
+
+        if not reusable:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            now = time.monotonic()
+            self._idle.append((conn, now, now))
+            self._cond.notify()
+
+    def close(self):
+        """Cierra todas las conexiones ociosas y rechaza nuevos préstamos."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def warm(self, count):
+        """
+        Abre conexiones hasta tener `count` en el pool (sin superar el
+        máximo) y las deja ociosas, listas para las primeras peticiones.
+        """
+        opened = 0
+        while True:
+            with self._cond:
+                if self._closed or self._size >= min(count, self.max_size):
+                    break
+                self._size += 1
+            try:
+                conn = self._create()
+            except Exception as e:
+                logger.warning(f"⚠️  Precalentamiento del pool '{self.name}' interrumpido: {str(e)}")
+                break
+            now = time.monotonic()
+            with self._cond:
+                # Al inicio de la cola: son las primeras candidatas a expirar
+                self._idle.appendleft((conn, now, now))
+                self._cond.notify()
+            opened += 1
+        return opened
+
+    def keepalive(self, interval):
+        """
+        Hace ping a las conexiones ociosas no verificadas en los últimos
+        `interval` segundos, para que MySQL no las cierre por `wait_timeout`,
+        y repone el mínimo del pool si alguna se perdió.
+        """
+        now = time.monotonic()
+        with self._cond:
+            evicted = self._evict_idle_locked()
+            stale = [entry for entry in self._idle if now - entry[2] >= interval]
+            for entry in stale:
+                self._idle.remove(entry)
+
+        for conn in evicted:
+            self._close_quietly(conn)
+        alive = []
+        for conn, last_used, _ in stale:
+            if not self._is_alive(conn):
+                self._discard(conn)
+                continue
+            # Conserva el último uso real para que la expiración siga funcionando
+            alive.append((conn, last_used, time.monotonic()))
+
+        if alive:
+            with self._cond:
+                # La cola queda ordenada por último uso: la expiración mira el inicio
+                self._idle = deque(sorted([*self._idle, *alive], key=lambda entry: entry[1]))
+                self._cond.notify(len(alive))
+
+        if self.min_size:
+            self.warm(self.min_size)
+        return len(stale)
+
+    def stats(self):
+        """Estado actual del pool para monitoreo."""
+        with self._cond:
+            return {
+                'nombre': self.name,
+                'tamano': self._size,
+                'ociosas': len(self._idle),
+                'en_uso': self._size - len(self._idle),
+                'min': self.min_size,
+                'max': self.max_size,
+                **self._stats,
+            }
+
+    def _create(self):
+        try:
+            conn = self._factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['creadas'] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._stats['descartadas'] += 1
+            self._cond.notify()
+
+    def _evict_idle_locked(self):
+        """Saca del pool las ociosas expiradas; el llamador las cierra sin el lock."""
+        # Las más antiguas están al inicio de la cola
+        now = time.monotonic()
+        evicted = []
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0][1] >= self.idle_timeout):
+            conn, _, _ = self._idle.popleft()
+            self._size -= 1
+            self._stats['descartadas'] += 1
+            evicted.append(conn)
+        if evicted:
+            self._cond.notify(len(evicted))
+        return evicted
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        # Sus statements preparados se van con ella
+        _statement_caches.pop(conn, None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class StatementCache:
+    """
+    Statements preparados de una conexión física, indexados por texto SQL
+    y acotados con LRU (al expulsar uno se libera en el servidor).
+
+    mysql.connector solo reutiliza el statement de un cursor preparado si
+    recibe exactamente el mismo objeto str, por eso se guarda y se devuelve
+    el texto original junto al cursor.
+
+    No guarda referencia a la conexión (es la clave en `_statement_caches`,
+    un WeakKeyDictionary): `checkout` la recibe en cada llamada.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # (sql, dictionary) -> (sql, cursor)
+        self._busy = set()
+
+    def checkout(self, conn, sql, dictionary):
+        """Cursor preparado de `conn` para `sql` o None si ya está en uso."""
+        key = (sql, dictionary)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if key in self._busy:
+                return None
+            self._entries.move_to_end(key)
+            _count_statement_cache('hits')
+        else:
+            _count_statement_cache('misses')
+            entry = (sql, conn.cursor(prepared=True, dictionary=dictionary))
+            self._entries[key] = entry
+            self._evict()
+        self._busy.add(key)
+        return entry
+
+    def checkin(self, sql, dictionary):
+        self._busy.discard((sql, dictionary))
+
+    def reset(self):
+        """Libera los statements que un cursor no cerró antes de devolver la conexión."""
+        self._busy.clear()
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            for key in self._entries:
+                if key not in self._busy:
+                    break
+            else:
+                return
+            _, cursor = self._entries.pop(key)
+            _count_statement_cache('evictions')
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+
+_statement_caches = weakref.WeakKeyDictionary()
+_statement_seen = OrderedDict()  # sql -> ejecuciones, LRU de _STATEMENT_SEEN_MAX consultas
+_STATEMENT_SEEN_MAX = 1024
+_statement_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+_statement_lock = threading.Lock()
+
+
+def _count_statement_cache(key):
+    with _statement_lock:
+        _statement_stats[key] += 1
+
+
+def get_statement_cache_stats():
+    """Contadores globales (del proceso) del caché de statements preparados."""
+    with _statement_lock:
+        return {**_statement_stats, 'consultas_calientes': sum(
+            1 for n in _statement_seen.values() if n >= Config.DB_STMT_CACHE_THRESHOLD
+        )}
+
+
+def _is_hot(sql):
+    """
+    Una consulta SELECT parametrizada pasa a prepararse cuando se ha
+    ejecutado DB_STMT_CACHE_THRESHOLD veces en este proceso.
+    """
+    if Config.DB_STMT_CACHE_SIZE <= 0 or sql.lstrip()[:6].upper() != 'SELECT':
+        return False
+    with _statement_lock:
+        veces = _statement_seen.pop(sql, 0) + 1
+        _statement_seen[sql] = veces
+        if len(_statement_seen) > _STATEMENT_SEEN_MAX:
+            # SQL generado dinámicamente: se olvida la consulta usada hace más
+            # tiempo, no las calientes (que se repiten y quedan al final)
+            _statement_seen.popitem(last=False)
+        return veces >= Config.DB_STMT_CACHE_THRESHOLD
+
+
+_session_limits = weakref.WeakKeyDictionary()
+
+
+def _limit_session(conn, remaining):
+    """
+    Fija `max_execution_time` de la sesión con el tiempo que le queda a la
+    petición (una vez por préstamo); se restablece al devolver la conexión.
+    """
+    if remaining is None or conn in _session_limits:
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET SESSION max_execution_time = %s", (max(1, remaining),))
+    finally:
+        cursor.close()
+    _session_limits[conn] = remaining
+
+
+def _reset_session_limit(conn):
+    if _session_limits.pop(conn, None) is None:
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET SESSION max_execution_time = 0")
+        cursor.close()
+    except mysql.connector.Error:
+        pass
+
+
+class PooledCursor:
+    """
+    Cursor de una conexión del pool. Las consultas calientes se ejecutan por
+    el protocolo binario con un statement preparado cacheado en la conexión;
+    el resto usa el cursor de texto habitual.
+    """
+
+    def __init__(self, conn, cursor, dictionary):
+        self._conn = conn
+        self._cursor = cursor
+        self._dictionary = dictionary
+        self._active = cursor
+        self._prepared_key = None
+
+    def execute(self, operation, params=None, **kwargs):
+        self._release_prepared()
+        remaining = deadlines.remaining_ms()
+        deadlines.check(remaining)
+        timer = query_stats.timed()
+        try:
+            with timer:
+                return self._execute(operation, params, remaining, **kwargs)
+        except mysql.connector.Error as e:
+            if e.errno == deadlines.ER_QUERY_TIMEOUT:
+                deadlines.mark_exceeded()
+                raise deadlines.DeadlineExceeded("MySQL interrumpió la consulta por tiempo límite") from e
+            raise
+        finally:
+            query_stats.record_query(operation, timer.elapsed)
+
+    def _execute(self, operation, params, remaining, **kwargs):
+        if params and not kwargs and isinstance(operation, str) and _is_hot(operation):
+            cache = _statement_caches.get(self._conn)
+            if cache is None:
+                cache = _statement_caches[self._conn] = StatementCache(Config.DB_STMT_CACHE_SIZE)
+            entry = cache.checkout(self._conn, operation, self._dictionary)
+            if entry is not None:
+                sql, prepared = entry
+                self._active = prepared
+                self._prepared_key = (cache, sql)
+                if not isinstance(params, (tuple, dict)):
+                    params = tuple(params)
+                # El texto del statement preparado no puede llevar el hint
+                # (cambiaría en cada ejecución): se limita la sesión una vez
+                _limit_session(self._conn, remaining)
+                return prepared.execute(sql, params)
+        self._active = self._cursor
+        if isinstance(operation, str):
+            operation = deadlines.with_execution_hint(operation, remaining)
+        return self._cursor.execute(operation, params, **kwargs)
+
+    def fetchone(self):
+        with query_stats.timed() as timer:
+            row = self._active.fetchone()
+        query_stats.record_time(timer.elapsed)
+        return row
+
+    def fetchmany(self, size=1):
+        with query_stats.timed() as timer:
+            rows = self._active.fetchmany(size)
+        query_stats.record_time(timer.elapsed)
+        return rows
+
+    def fetchall(self):
+        with query_stats.timed() as timer:
+            rows = self._active.fetchall()
+        query_stats.record_time(timer.elapsed)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._release_prepared()
+        return self._cursor.close()
+
+    def _release_prepared(self):
+        if self._prepared_key is None:
+            return
+        cache, sql = self._prepared_key
+        self._prepared_key = None
+        try:
+            # Dejar el statement sin filas pendientes para el próximo uso
+            if self._active.with_rows:
+                self._active.fetchall()
+        except mysql.connector.Error:
+            pass
+        finally:
+            cache.checkin(sql, self._dictionary)
+            self._active = self._cursor
+
+    def __getattr__(self, name):
+        return getattr(self._active, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class PooledConnection:
+    """
+    Conexión prestada por el pool.
+
+    Expone la misma interfaz que la conexión de mysql.connector; `close()`
+    la devuelve al pool en lugar de cerrar el socket. Si se pidió dentro de
+    un contexto de aplicación queda anotada en `prestadas` (en `g`) hasta
+    que se cierra, para que el teardown la devuelva si el handler no lo hizo.
+    """
+
+    def __init__(self, pool, conn, prestadas=None):
+        self._pool = pool
+        self._conn = conn
+        self._prestadas = prestadas
+        if prestadas is not None:
+            prestadas.add(self)
+
+    def cursor(self, *args, **kwargs):
+        if args or set(kwargs) - {'dictionary'}:
+            # Cursores especiales (buffered, raw, prepared...) sin caché
+            return self._raw().cursor(*args, **kwargs)
+        dictionary = bool(kwargs.get('dictionary'))
+        return PooledCursor(self._raw(), self._raw().cursor(dictionary=dictionary), dictionary)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            if self._prestadas is not None:
+                self._prestadas.discard(self)
+            cache = _statement_caches.get(conn)
+            if cache is not None:
+                cache.reset()
+            _reset_session_limit(conn)
+            self._pool.release(conn)
+
+    def _raw(self):
+        if self._conn is None:
+            raise PoolError("La conexión ya fue devuelta al pool")
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._raw(), name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_pools = {}
+_pools_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(name='primary'):
+    """
+    Pool del proceso actual para el servidor indicado ('primary' o
+    'replica:host:puerto'). Se crean de forma perezosa y se recrean tras un
+    fork (cada worker de gunicorn tiene sus propios pools).
+    """
+    global _pools, _pools_pid
+    pid = os.getpid()
+    if _pools_pid == pid and name in _pools:
+        return _pools[name]
+    with _pool_lock:
+        if _pools_pid != pid:
+            _pools = {}
+            _pools_pid = pid
+        if name not in _pools:
+            factory = _connect if name == 'primary' else _replica_factory(name)
+            _pools[name] = ConnectionPool(
+                factory,
+                min_size=Config.DB_POOL_MIN_SIZE,
+                max_size=Config.DB_POOL_MAX_SIZE,
+                timeout=Config.DB_POOL_TIMEOUT,
+                idle_timeout=Config.DB_POOL_IDLE_TIMEOUT,
+                ping_after=Config.DB_POOL_PING_AFTER,
+                name=name,
+            )
+            logger.info(f"🏊 Pool de conexiones '{name}' creado (pid {pid}, max {Config.DB_POOL_MAX_SIZE})")
+        return _pools[name]
+
+
+def _replica_factory(name):
+    host, _, port = name[len('replica:'):].rpartition(':')
+
+    def connect():
+        if Config.is_cloud_run():
+            user, password, database = Config.CLOUD_SQL_USER, Config.CLOUD_SQL_PASSWORD, Config.CLOUD_SQL_DB
+        else:
+            user, password, database = Config.DB_USER, Config.DB_PASSWORD, Config.DB_NAME
+        logger.info(f"🔌 Conectando a réplica de lectura {host}:{port}")
+        return mysql.connector.connect(
+            host=host, port=int(port), user=user, password=password, database=database,
+            charset='utf8mb4', autocommit=True, use_unicode=True,
+        )
+    return connect
+
+
+class ReplicaSet:
+    """
+    Réplicas de lectura configuradas en DB_READ_REPLICAS.
+
+    Un hilo de monitoreo mide periódicamente la latencia (EWMA) y el retraso
+    de replicación de cada réplica; las que fallan o superan
+    DB_REPLICA_MAX_LAG quedan fuera de la rotación hasta la siguiente
+    verificación correcta. Si el retraso no se puede leer (el usuario no
+    tiene REPLICATION CLIENT) la réplica también queda fuera: con
+    DB_REPLICA_MAX_LAG = 0 no se controla el retraso. La selección es
+    round-robin o por menor latencia según DB_REPLICA_STRATEGY.
+    """
+
+    def __init__(self, addresses, strategy='round_robin', max_lag=5.0):
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self._lock = threading.Lock()
+        self._next = 0
+        self._sin_retraso = set()  # réplicas cuyo retraso no se pudo leer (ya avisado)
+        self._replicas = {
+            self._pool_name(address): {'sano': True, 'latencia_ms': None, 'retraso_s': None, 'error': None}
+            for address in addresses
+        }
+
+    @staticmethod
+    def _pool_name(address):
+        host, _, port = address.partition(':')
+        return f"replica:{host}:{port or 3306}"
+
+    def __bool__(self):
+        return bool(self._replicas)
+
+    def choose(self):
+        """Nombre del pool de la réplica elegida, o None si no hay réplicas sanas."""
+        with self._lock:
+            healthy = [name for name, state in self._replicas.items() if state['sano']]
+            if not healthy:
+                return None
+            if self.strategy == 'least_latency':
+                return min(healthy, key=lambda name: self._replicas[name]['latencia_ms'] or 0.0)
+            self._next = (self._next + 1) % len(healthy)
+            return healthy[self._next]
+
+    def mark_failed(self, name, error):
+        with self._lock:
+            if name in self._replicas:
+                self._replicas[name].update(sano=False, error=str(error))
+        logger.warning(f"⚠️  Réplica {name} fuera de rotación: {str(error)}")
+
+    def check(self):
+        """Verifica latencia y retraso de replicación de todas las réplicas."""
+        for name in list(self._replicas):
+            try:
+                pool = get_pool(name)
+                start = time.monotonic()
+                conn = pool.acquire()
+                try:
+                    conn.ping(reconnect=False)
+                    latency = (time.monotonic() - start) * 1000
+                    try:
+                        lag, lag_error = self._replication_lag(conn), None
+                    except mysql.connector.Error as e:
+                        lag, lag_error = None, e
+                finally:
+                    pool.release(conn)
+            except Exception as e:
+                self.mark_failed(name, e)
+                continue
+
+            if lag_error is None:
+                self._sin_retraso.discard(name)
+            elif name not in self._sin_retraso:
+                self._sin_retraso.add(name)
+                logger.warning(f"⚠️  No se pudo leer el retraso de replicación de {name} "
+                               f"(¿falta el permiso REPLICATION CLIENT?): {str(lag_error)}")
+
+            with self._lock:
+                state = self._replicas[name]
+                previous = state['latencia_ms']
+                state['latencia_ms'] = round(latency if previous is None else 0.7 * previous + 0.3 * latency, 2)
+                stopped = lag == float('inf')
+                checked = self.max_lag > 0
+                lagging = stopped or (checked and lag is not None and lag > self.max_lag)
+                unknown = checked and lag_error is not None
+                state['retraso_s'] = None if stopped else lag
+                state['sano'] = not (lagging or unknown)
+                if stopped:
+                    state['error'] = "Replicación detenida"
+                elif lagging:
+                    state['error'] = f"Retraso de replicación {lag}s"
+                elif unknown:
+                    state['error'] = f"Retraso de replicación desconocido: {str(lag_error)}"
+                else:
+                    state['error'] = None
+
+    @staticmethod
+    def _replication_lag(conn):
+        """
+        Segundos de retraso de la réplica (None si el servidor no informa
+        estado de replicación). Lanza mysql.connector.Error si no se pudo leer.
+        """
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+                row = cursor.fetchone()
+                key = 'Seconds_Behind_Source'
+            except mysql.connector.Error:
+                cursor.execute("SHOW SLAVE STATUS")
+                row = cursor.fetchone()
+                key = 'Seconds_Behind_Master'
+        finally:
+            cursor.close()
+        if not row:
+            return None
+        if row.get(key) is None:
+            # Replicación detenida: tratar como retraso infinito
+            return float('inf')
+        return float(row[key])
+
+    def status(self):
+        with self._lock:
+            return {name: dict(state) for name, state in self._replicas.items()}
+
+
+_replicas = ReplicaSet(
+    Config.DB_READ_REPLICAS,
+    strategy=Config.DB_REPLICA_STRATEGY,
+    max_lag=Config.DB_REPLICA_MAX_LAG,
+)
+
+
+def get_replica_status():
+    """Estado de las réplicas de lectura (para monitoreo)."""
+    return _replicas.status()
+
+
+def get_db_metrics():
+    """
+    Métricas de la capa de datos de este worker: pools, transportes de
+    Cloud SQL, réplicas y caché de statements preparados.
+    """
+    pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+    return {
+        'pid': os.getpid(),
+        'pools': [pool.stats() for pool in pools],
+        'transportes': get_transport_status(),
+        'replicas': get_replica_status(),
+        'statements_preparados': get_statement_cache_stats(),
+    }
+
+
+_maintenance_pid = None
+
+
+def _pool_maintenance():
+    pool = get_pool()
+    if Config.DB_POOL_PREWARM > 0:
+        start = time.monotonic()
+        opened = pool.warm(Config.DB_POOL_PREWARM)
+        logger.info(f"🔥 Pool precalentado con {opened} conexiones en {time.monotonic() - start:.2f}s")
+    while True:
+        time.sleep(Config.DB_POOL_KEEPALIVE_INTERVAL)
+        for pool in list(_pools.values()):
+            try:
+                pool.keepalive(Config.DB_POOL_KEEPALIVE_INTERVAL)
+            except Exception as e:
+                logger.warning(f"⚠️  Keepalive del pool '{pool.name}' falló: {str(e)}")
+
+
+def _replica_monitor():
+    while True:
+        try:
+            _replicas.check()
+        except Exception as e:
+            logger.warning(f"⚠️  Monitoreo de réplicas falló: {str(e)}")
+        time.sleep(Config.DB_REPLICA_CHECK_INTERVAL)
+
+
+def start_pool_maintenance():
+    """
+    Inicia (una vez por proceso) el hilo que precalienta el pool con
+    DB_POOL_PREWARM conexiones y luego hace ping periódico a las ociosas,
+    y el monitoreo de réplicas si hay réplicas de lectura configuradas.
+    Se llama al arrancar cada worker (post_fork de gunicorn / init_app).
+    """
+    global _maintenance_pid
+    pid = os.getpid()
+    with _pool_lock:
+        if _maintenance_pid == pid:
+            return
+        _maintenance_pid = pid
+    threading.Thread(target=_pool_maintenance, name='db-pool-maintenance', daemon=True).start()
+    if _replicas:
+        threading.Thread(target=_replica_monitor, name='db-replica-monitor', daemon=True).start()
+
+
+def _is_read_request():
+    """Peticiones GET/HEAD que no pidieron leer del primario."""
+    return (has_request_context() and request.method in ('GET', 'HEAD')
+            and not g.get('db_force_primary', False))
+
+
+def use_primary():
+    """Obliga a que la petición actual lea del primario (p. ej. justo tras escribir)."""
+    if has_app_context():
+        g.db_force_primary = True
+
+
+def force_primary(view):
+    """Decorador para endpoints GET que deben leer siempre del primario."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        use_primary()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def get_db_connection(readonly=None):
+    """
+    Obtiene una conexión del pool del proceso.
+    Llamar a `close()` sobre ella la devuelve al pool.
+
+    Las lecturas (`readonly=True`, o por defecto los handlers GET) van a
+    una réplica si hay alguna sana; si falla se usa el primario.
+    """
+    if readonly is None:
+        readonly = _is_read_request()
+    if readonly and _replicas:
+        name = _replicas.choose()
+        if name is not None:
+            pool = get_pool(name)
+            try:
+                return _prestar(pool)
+            except PoolError:
+                # Réplica saturada: esta lectura va al primario
+                pass
+            except deadlines.DeadlineExceeded:
+                raise
+            except Exception as e:
+                _replicas.mark_failed(name, e)
+    pool = get_pool()
+    return _prestar(pool)
+
+
+def _prestar(pool):
+    """
+    Presta una conexión de `pool`. Dentro de un contexto de aplicación se
+    anota en `g.db_prestadas`: los handlers que salen por una excepción o un
+    return temprano sin llamar a `close()` no la dejan fuera del pool.
+    """
+    conn = _acquire(pool)
+    if not has_app_context():
+        return PooledConnection(pool, conn)
+    return PooledConnection(pool, conn, g.setdefault('db_prestadas', set()))
+
+
+def _acquire(pool):
+    """
+    Pide una conexión esperando como máximo lo que le queda a la petición.
+    Si el pool no entrega a tiempo, la respuesta se convierte en 503 (pool
+    saturado) o 504 (se agotó el presupuesto de la petición).
+    """
+    remaining = deadlines.remaining_ms()
+    deadlines.check(remaining)
+    budget_limited = remaining is not None and remaining / 1000.0 < pool.timeout
+    try:
+        return pool.acquire(timeout=remaining / 1000.0 if budget_limited else None)
+    except PoolError:
+        if budget_limited:
+            deadlines.mark_exceeded()
+        else:
+            deadlines.mark_unavailable()
+        raise
+
+
+class _RequestConnection:
+    """
+    Vista de la conexión compartida por la petición en curso.
+    `close()` no hace nada: la conexión vuelve al pool en el teardown.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+def get_request_connection():
+    """
+    Conexión única de la petición actual, pedida al pool la primera vez que
+    se usa y compartida por todos los helpers (p. ej. `verificar_admin`).
+    Fuera de un contexto de aplicación equivale a `get_db_connection()`.
+    """
+    if not has_app_context():
+        return get_db_connection()
+    if 'db_conn' not in g:
+        g.db_conn = get_db_connection()
+    return _RequestConnection(g.db_conn)
+
+
+def get_request_cursor(dictionary=True):
+    """Cursor nuevo sobre la conexión de la petición actual."""
+    return get_request_connection().cursor(dictionary=dictionary)
+
+
+def close_request_connection(exc=None):
+    """
+    Devuelve al pool la conexión de la petición y las que los handlers no
+    cerraron (teardown de la app). Al devolverlas el pool deshace la
+    transacción que haya quedado abierta, liberando sus bloqueos.
+    """
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.close()
+    prestadas = g.pop('db_prestadas', None)
+    if prestadas:
+        logger.warning(f"⚠️  {len(prestadas)} conexión(es) sin cerrar devuelta(s) al pool en el teardown")
+        for conn in list(prestadas):
+            conn.close()
+
+
+def init_app(app):
+    """Registra los hooks de la capa de datos en la aplicación."""
+    app.teardown_appcontext(close_request_connection)
+    deadlines.init_app(app)
+    query_stats.init_app(app)
+    start_pool_maintenance()
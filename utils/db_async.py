@@ -0,0 +1,122 @@
+"""
+Capa de datos asíncrona (aiomysql) para el punto de entrada ASGI.
+
+Espejo de utils/db.py para los endpoints de lectura servidos por asgi.py:
+un pool asíncrono por event loop y helpers para leer filas como dict.
+
+El límite de tiempo de la petición (el mismo presupuesto por endpoint que
+aplica utils/deadlines.py en Flask) vive en una ContextVar, que asyncio
+mantiene por tarea: asgi.py lo fija con `start_deadline` al empezar.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from config import Config
+from utils import db, deadlines
+
+try:
+    import aiomysql
+except ImportError:  # dependencia opcional: solo la necesita asgi.py
+    aiomysql = None
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = asyncio.Lock()
+_deadline = contextvars.ContextVar('db_async_deadline', default=None)
+
+
+def _connection_params():
+    """Mismos parámetros que la conexión síncrona (transporte activo en Cloud Run)."""
+    if Config.is_cloud_run():
+        params = db._transport_params(db.get_transport_status()['transporte_actual'])
+        params['db'] = params.pop('database')
+    else:
+        params = {
+            'host': Config.DB_HOST,
+            'user': Config.DB_USER,
+            'password': Config.DB_PASSWORD,
+            'db': Config.DB_NAME,
+            'port': Config.DB_PORT,
+            'charset': 'utf8mb4',
+            'autocommit': True,
+        }
+    params.pop('use_unicode', None)
+    return params
+
+
+async def get_pool():
+    """Pool aiomysql del proceso (se crea la primera vez que se usa)."""
+    global _pool
+    if aiomysql is None:
+        raise RuntimeError("aiomysql no está instalado: pip install -r requirements.txt")
+    if _pool is not None:
+        return _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await aiomysql.create_pool(
+                minsize=Config.DB_POOL_MIN_SIZE,
+                maxsize=Config.DB_POOL_MAX_SIZE,
+                pool_recycle=int(Config.DB_POOL_KEEPALIVE_INTERVAL),
+                **_connection_params()
+            )
+            logger.info(f"🏊 Pool asíncrono creado (max {Config.DB_POOL_MAX_SIZE})")
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+async def fetch_all(query, params=None):
+    """Ejecuta un SELECT y devuelve todas las filas como dict."""
+    return await _fetch(query, params, lambda cursor: cursor.fetchall())
+
+
+async def fetch_one(query, params=None):
+    """Ejecuta un SELECT y devuelve la primera fila como dict (o None)."""
+    return await _fetch(query, params, lambda cursor: cursor.fetchone())
+
+
+def start_deadline(ms):
+    """Fija el límite de la petición ASGI en curso (`ms` de presupuesto, 0 = sin límite)."""
+    _deadline.set(time.monotonic() + ms / 1000.0 if ms and ms > 0 else None)
+
+
+def remaining_ms():
+    """Milisegundos que le quedan a la petición ASGI en curso, o None si no tiene límite."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return int((deadline - time.monotonic()) * 1000)
+
+
+async def _fetch(query, params, reader):
+    remaining = remaining_ms()
+    deadlines.check(remaining)
+    pool = await get_pool()
+
+    async def run():
+        async with pool.acquire() as conn:
+            # Lo que queda tras esperar la conexión es lo que tiene MySQL
+            restante = remaining_ms()
+            deadlines.check(restante)
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(deadlines.with_execution_hint(query, restante), params)
+                return await reader(cursor)
+
+    try:
+        if remaining is None:
+            return await run()
+        return await asyncio.wait_for(run(), timeout=remaining / 1000.0)
+    except asyncio.TimeoutError as e:
+        raise deadlines.DeadlineExceeded("Se agotó el tiempo límite de la petición") from e
+    except Exception as e:
+        if e.args and e.args[0] == deadlines.ER_QUERY_TIMEOUT:
+            raise deadlines.DeadlineExceeded("MySQL interrumpió la consulta por tiempo límite") from e
+        raise
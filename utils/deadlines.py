@@ -0,0 +1,114 @@
+import re
+import time
+import logging
+from flask import g, jsonify, request, current_app, has_app_context
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Error de MySQL al interrumpir un SELECT por MAX_EXECUTION_TIME
+ER_QUERY_TIMEOUT = 3024
+
+_SELECT_RE = re.compile(r'^(\s*)SELECT\b', re.IGNORECASE)
+
+
+class DeadlineExceeded(Exception):
+    """Se agotó el tiempo presupuestado para la petición."""
+
+
+def time_budget(ms):
+    """
+    Fija el presupuesto de tiempo (en ms) de un endpoint. Las variables
+    REQUEST_TIME_BUDGETS por endpoint tienen prioridad sobre este valor.
+    """
+    def decorator(view):
+        view._time_budget_ms = ms
+        return view
+    return decorator
+
+
+def budget_for(endpoint, view=None):
+    """
+    Presupuesto (ms) de un endpoint: REQUEST_TIME_BUDGETS por endpoint,
+    @time_budget de la vista, REQUEST_TIME_BUDGETS por blueprint o el global.
+    """
+    budgets = Config.REQUEST_TIME_BUDGETS
+    if endpoint in budgets:
+        return budgets[endpoint]
+    ms = getattr(view, '_time_budget_ms', None)
+    if ms is not None:
+        return ms
+    blueprint = endpoint.rpartition('.')[0]
+    if blueprint in budgets:
+        return budgets[blueprint]
+    return Config.REQUEST_TIME_BUDGET_MS
+
+
+def _budget_for_request():
+    endpoint = request.endpoint or ''
+    return budget_for(endpoint, current_app.view_functions.get(endpoint))
+
+
+def start_request_deadline():
+    """before_request: fija el instante límite de la petición actual."""
+    ms = _budget_for_request()
+    if ms and ms > 0:
+        g.deadline = time.monotonic() + ms / 1000.0
+
+
+def clear_deadline():
+    """Quita el límite de la petición (p. ej. para respuestas en streaming)."""
+    if has_app_context():
+        g.pop('deadline', None)
+
+
+def remaining_ms():
+    """Milisegundos que le quedan a la petición, o None si no tiene límite."""
+    if not has_app_context():
+        return None
+    deadline = g.get('deadline')
+    if deadline is None:
+        return None
+    return int((deadline - time.monotonic()) * 1000)
+
+
+def mark_exceeded():
+    if has_app_context():
+        g.deadline_exceeded = True
+
+
+def mark_unavailable():
+    if has_app_context():
+        g.db_unavailable = True
+
+
+def check(remaining):
+    """Cancela el trabajo restante si el presupuesto ya se agotó."""
+    if remaining is not None and remaining <= 0:
+        mark_exceeded()
+        raise DeadlineExceeded("Se agotó el tiempo límite de la petición")
+
+
+def with_execution_hint(sql, remaining):
+    """Agrega `/*+ MAX_EXECUTION_TIME(n) */` a un SELECT con el tiempo restante."""
+    if remaining is None:
+        return sql
+    return _SELECT_RE.sub(lambda m: f"{m.group(1)}SELECT /*+ MAX_EXECUTION_TIME({max(1, remaining)}) */", sql, count=1)
+
+
+def _deadline_response(response):
+    """after_request: convierte los fallos por tiempo/capacidad en 504/503."""
+    if g.get('deadline_exceeded'):
+        logger.warning(f"⏱️  {request.method} {request.path} superó su tiempo límite")
+        response = jsonify({"error": "La petición superó su tiempo límite"})
+        response.status_code = 504
+    elif g.get('db_unavailable'):
+        response = jsonify({"error": "Base de datos saturada, reintente en unos segundos"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+    return response
+
+
+def init_app(app):
+    app.before_request(start_request_deadline)
+    app.after_request(_deadline_response)
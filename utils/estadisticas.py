@@ -0,0 +1,214 @@
+"""
+Estadísticas de registros de mapeo mantenidas en memoria.
+
+Se cargan con una consulta agrupada por temporada, cuartel, sucursal y
+estado; los handlers de registromapeo.py aplican después cada alta, cambio
+o baja con `aplicar`, así /registromapeo/estadisticas no consulta la base.
+Un hilo por worker las reconcilia con la base cada
+ESTADISTICAS_RECONCILE_INTERVAL segundos, lo que incorpora las escrituras
+hechas en otros workers y corrige cualquier desvío.
+
+Todo cambio a los conteos se hace bajo `_lock`. La recarga lee la base en
+una transacción con snapshot consistente; los cambios que llegan mientras
+tanto pueden estar o no en esa foto, así que por cada registro modificado
+se lee su estado en la misma foto y se corrige su conteo al último estado
+aplicado: ni se pierden ni se cuentan dos veces.
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from config import Config
+from utils.db import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Estados con clave propia en la respuesta (compatibilidad con el endpoint original)
+ESTADOS = {1: 'en_progreso', 2: 'finalizados', 3: 'pausados'}
+
+DESGLOSES = ('temporada', 'cuartel', 'sucursal')
+
+_lock = threading.Lock()
+_conteos = Counter()  # (id_temporada, id_cuartel, id_sucursal, id_estado) -> registros
+_sucursales = {}  # id_cuartel -> id_sucursal
+_cargado_pid = None
+_hilo_pid = None
+_recargas = []  # por recarga en curso, {id_registro: último estado aplicado (None si se eliminó)}
+
+
+def _cargar(cursor):
+    cursor.execute("""
+        SELECT rm.id_temporada, rm.id_cuartel, ce.id_sucursal, rm.id_estado, COUNT(*) as cantidad
+        FROM mapeo_fact_registromapeo rm
+        LEFT JOIN general_dim_cuartel c ON rm.id_cuartel = c.id
+        LEFT JOIN general_dim_ceco ce ON c.id_ceco = ce.id
+        GROUP BY rm.id_temporada, rm.id_cuartel, ce.id_sucursal, rm.id_estado
+    """)
+    grupos = cursor.fetchall()
+    cursor.execute("""
+        SELECT c.id, ce.id_sucursal
+        FROM general_dim_cuartel c
+        LEFT JOIN general_dim_ceco ce ON c.id_ceco = ce.id
+    """)
+    sucursales = {fila['id']: fila['id_sucursal'] for fila in cursor.fetchall()}
+
+    conteos = Counter({
+        (g['id_temporada'], g['id_cuartel'], g['id_sucursal'], g['id_estado']): g['cantidad']
+        for g in grupos
+    })
+    return conteos, sucursales
+
+
+def _en_foto(cursor, ids):
+    """Estado de los registros `ids` en la foto de la carga (None si no existían)."""
+    cursor.execute(f"""
+        SELECT id, id_temporada, id_cuartel, id_estado
+        FROM mapeo_fact_registromapeo
+        WHERE id IN ({', '.join(['%s'] * len(ids))})
+    """, tuple(ids))
+    filas = {fila['id']: fila for fila in cursor.fetchall()}
+    return {i: filas.get(i) for i in ids}
+
+
+def _quitar_recarga(cambios):
+    # Llamar con _lock tomado; por identidad: dos recargas pueden tener cambios iguales
+    _recargas[:] = [c for c in _recargas if c is not cambios]
+
+
+def reconciliar():
+    """Recarga los conteos desde la base; registra si había diferencias."""
+    global _conteos, _sucursales, _cargado_pid
+    cambios = {}
+    with _lock:
+        _recargas.append(cambios)
+    try:
+        conn = get_db_connection(readonly=False)
+        cursor = conn.cursor(dictionary=True)
+        try:
+            conn.start_transaction(consistent_snapshot=True, readonly=True)
+            conteos, sucursales = _cargar(cursor)
+            en_foto = {}
+            while True:
+                with _lock:
+                    faltan = [i for i in cambios if i not in en_foto]
+                    if not faltan:
+                        # Del estado en la foto al último aplicado; los cambios
+                        # siguientes ya van directo a los conteos nuevos
+                        _quitar_recarga(cambios)
+                        for id_registro, nuevo in cambios.items():
+                            _aplicar_en(conteos, sucursales, en_foto[id_registro], nuevo)
+                        if _cargado_pid == os.getpid() and conteos != _conteos:
+                            diferencia = sum(conteos.values()) - sum(_conteos.values())
+                            logger.info(f"📊 Estadísticas reconciliadas con la base (diferencia en total: {diferencia:+d})")
+                        _conteos, _sucursales = conteos, sucursales
+                        _cargado_pid = os.getpid()
+                        break
+                en_foto.update(_en_foto(cursor, faltan))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+    finally:
+        with _lock:
+            _quitar_recarga(cambios)
+
+
+def _reconciliacion_periodica():
+    while True:
+        time.sleep(Config.ESTADISTICAS_RECONCILE_INTERVAL)
+        try:
+            reconciliar()
+        except Exception as e:
+            logger.warning(f"⚠️  No se pudieron reconciliar las estadísticas: {str(e)}")
+
+
+def _asegurar_cargado():
+    """Primera carga del worker (síncrona) e inicio del hilo de reconciliación."""
+    global _hilo_pid
+    pid = os.getpid()
+    if _cargado_pid != pid:
+        reconciliar()
+    with _lock:
+        if _hilo_pid == pid:
+            return
+        _hilo_pid = pid
+    threading.Thread(target=_reconciliacion_periodica, name='estadisticas-reconciliacion', daemon=True).start()
+
+
+def _clave(registro, sucursales):
+    id_cuartel = registro.get('id_cuartel')
+    return (registro.get('id_temporada'), id_cuartel, sucursales.get(id_cuartel), registro.get('id_estado'))
+
+
+def _aplicar_en(conteos, sucursales, anterior, nuevo):
+    # Llamar con _lock tomado
+    if anterior:
+        clave = _clave(anterior, sucursales)
+        conteos[clave] -= 1
+        if conteos[clave] <= 0:
+            del conteos[clave]
+    if nuevo:
+        conteos[_clave(nuevo, sucursales)] += 1
+
+
+def aplicar(anterior=None, nuevo=None):
+    """
+    Aplica un cambio ya confirmado en la base: `anterior` y `nuevo` son dicts
+    con id, id_temporada, id_cuartel e id_estado (None en altas / bajas).
+    """
+    with _lock:
+        for cambios in _recargas:
+            cambios[(nuevo or anterior)['id']] = nuevo
+        if _cargado_pid != os.getpid():
+            return  # se cargará completo en la próxima consulta
+        _aplicar_en(_conteos, _sucursales, anterior, nuevo)
+
+
+def _orden(valor):
+    # Ids numéricos en orden; los registros sin valor (p. ej. cuartel sin sucursal) al final
+    return (valor is None, valor if valor is not None else 0)
+
+
+def _resumir(conteos):
+    por_estado = Counter()
+    for (_, _, _, id_estado), cantidad in conteos:
+        por_estado[id_estado] += cantidad
+    total = sum(por_estado.values())
+    resumen = {"total_registros": total}
+    for id_estado, nombre in ESTADOS.items():
+        resumen[nombre] = por_estado.get(id_estado, 0)
+    finalizados = resumen['finalizados']
+    resumen["porcentaje_completado_general"] = round((finalizados / total * 100) if total > 0 else 0, 2)
+    resumen["por_estado"] = {
+        str(id_estado): cantidad for id_estado, cantidad in sorted(por_estado.items(), key=lambda e: _orden(e[0]))
+    }
+    return resumen
+
+
+def obtener(temporada=None, cuartel=None, sucursal=None, desglose=()):
+    """
+    Resumen general (mismas claves que el endpoint original más `por_estado`),
+    opcionalmente filtrado y con desgloses por temporada, cuartel y/o sucursal.
+    """
+    _asegurar_cargado()
+    with _lock:
+        conteos = list(_conteos.items())
+
+    filtros = (temporada, cuartel, sucursal)
+    conteos = [
+        (clave, cantidad) for clave, cantidad in conteos
+        if all(f is None or clave[i] == f for i, f in enumerate(filtros))
+    ]
+
+    resultado = _resumir(conteos)
+    for nombre in desglose:
+        posicion = DESGLOSES.index(nombre)
+        grupos = {}
+        for clave, cantidad in conteos:
+            grupos.setdefault(clave[posicion], []).append((clave, cantidad))
+        resultado[f"por_{nombre}"] = [
+            {f"id_{nombre}": valor, **_resumir(grupo)}
+            for valor, grupo in sorted(grupos.items(), key=lambda g: _orden(g[0]))
+        ]
+    return resultado
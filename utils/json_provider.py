@@ -0,0 +1,86 @@
+"""
+Proveedor JSON de Flask basado en orjson (Config.JSON_PROVIDER = 'orjson').
+
+Produce el mismo JSON que el proveedor por defecto: claves ordenadas,
+fechas con formato HTTP (`http_date`), Decimal y UUID como texto y salida
+compacta fuera de debug. La diferencia es que los caracteres no ASCII van
+en UTF-8 en vez de escapados (\\uXXXX), lo que el cliente decodifica igual.
+Si orjson no está instalado se usa el json de la stdlib.
+
+Ambos proveedores negocian además MessagePack/CBOR (utils/serializacion.py).
+"""
+import logging
+from datetime import date, datetime, timezone
+from flask.json.provider import DefaultJSONProvider, _default
+from config import Config
+from utils.serializacion import RespuestaNegociada
+
+try:
+    import orjson
+except ImportError:  # opcional
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_DIAS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MESES = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def _por_defecto(o):
+    """
+    Igual que el _default de Flask, pero formatea las fechas sin pasar por
+    werkzeug.http_date, que domina el tiempo en listados con una fecha por fila.
+    """
+    if isinstance(o, datetime):
+        if o.tzinfo is not None:
+            o = o.astimezone(timezone.utc)
+        return (f"{_DIAS[o.weekday()]}, {o.day:02d} {_MESES[o.month - 1]} {o.year:04d} "
+                f"{o.hour:02d}:{o.minute:02d}:{o.second:02d} GMT")
+    if isinstance(o, date):
+        return f"{_DIAS[o.weekday()]}, {o.day:02d} {_MESES[o.month - 1]} {o.year:04d} 00:00:00 GMT"
+    return _default(o)
+
+
+class ProveedorJSON(RespuestaNegociada, DefaultJSONProvider):
+    """Proveedor por defecto de Flask con negociación de formato binario."""
+
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """Mismo formato que DefaultJSONProvider, serializado con orjson."""
+
+    def _opciones(self, indent=None):
+        # Las fechas pasan por _por_defecto para mantener el formato HTTP de Flask
+        opciones = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        if indent:
+            opciones |= orjson.OPT_INDENT_2
+        return opciones
+
+    def dumps(self, obj, **kwargs):
+        # separators y demás argumentos de json.dumps no aplican: la salida ya es compacta
+        return orjson.dumps(obj, default=_por_defecto, option=self._opciones(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # Bytes directo a la respuesta, sin pasar por str
+        datos = orjson.dumps(obj, default=_por_defecto, option=self._opciones(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(datos, mimetype=self.mimetype)
+
+
+class OrjsonProvider(RespuestaNegociada, OrjsonJSONProvider):
+    """OrjsonJSONProvider con negociación de formato binario."""
+
+
+def init_app(app):
+    if Config.JSON_PROVIDER == 'orjson':
+        if orjson is not None:
+            app.json = OrjsonProvider(app)
+            logger.info("✅ Respuestas JSON con orjson")
+            return
+        logger.warning("⚠️ JSON_PROVIDER=orjson pero orjson no está instalado; se usa el proveedor por defecto")
+    app.json = ProveedorJSON(app)
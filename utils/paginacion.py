@@ -0,0 +1,130 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+Opcional: solo se activa con `?limit=` o `?cursor=`; sin ellos los listados
+siguen devolviendo la tabla completa. Cada página se filtra por la posición
+de la última fila de la anterior (columna de orden + id como desempate) en
+lugar de OFFSET, así que con el índice (columna, id) una página profunda
+cuesta lo mismo que la primera.
+
+Respuesta: {"data": [...], "next": <cursor o null>, "limit": n}. El cursor
+es opaco (JSON en base64url) y solo vale para el listado que lo generó.
+"""
+import base64
+import json
+from datetime import date, datetime
+from flask import jsonify, request
+from config import Config
+from utils.db import get_request_connection
+from utils import columnar
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def pedida():
+    """True si el cliente pidió paginación (`limit` o `cursor`)."""
+    return 'limit' in request.args or 'cursor' in request.args
+
+
+def _codificar(columna, valor, id_fila):
+    if isinstance(valor, datetime):
+        valor = ['dt', valor.isoformat()]
+    elif isinstance(valor, date):
+        valor = ['d', valor.isoformat()]
+    raw = json.dumps([columna, valor, id_fila], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decodificar(cursor, columna):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        col, valor, id_fila = json.loads(raw)
+        if isinstance(valor, list):
+            tipo, texto = valor
+            valor = datetime.fromisoformat(texto) if tipo == 'dt' else date.fromisoformat(texto)
+    except Exception:
+        raise CursorInvalido("Cursor inválido")
+    if col != columna:
+        raise CursorInvalido("El cursor no corresponde a este listado")
+    return valor, id_fila
+
+
+def _limite():
+    valor = request.args.get('limit')
+    if valor is None:
+        return Config.PAGE_SIZE_DEFAULT
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise CursorInvalido("limit debe ser un entero")
+    if limite < 1:
+        raise CursorInvalido("limit debe ser mayor que 0")
+    return min(limite, Config.PAGE_SIZE_MAX)
+
+
+def _condicion(columna, descendente, valor, id_fila):
+    """
+    Filas posteriores a (valor, id_fila) en el orden `columna, id`.
+    MySQL ordena los NULL primero en ASC y al final en DESC.
+    """
+    if descendente:
+        if valor is None:
+            return f"({columna} IS NULL AND id < %s)", [id_fila]
+        return (f"({columna} < %s OR ({columna} = %s AND id < %s) OR {columna} IS NULL)",
+                [valor, valor, id_fila])
+    if valor is None:
+        return f"({columna} IS NOT NULL OR id > %s)", [id_fila]
+    return f"({columna} > %s OR ({columna} = %s AND id > %s))", [valor, valor, id_fila]
+
+
+def paginar(columnas, desde, columna, descendente=False, codificar=()):
+    """
+    Ejecuta una página de `SELECT columnas <desde>` (desde = "FROM tabla",
+    sin WHERE ni ORDER BY) ordenada por `columna` e id, y devuelve la
+    respuesta Flask. Si `columnas` no incluye la columna de orden o el id
+    se seleccionan igual para armar el cursor y se quitan de la respuesta.
+    Con `?format=columns` `data` va en formato columnar (utils/columnar.py),
+    codificando por diccionario las columnas de `codificar`.
+    """
+    try:
+        limite = _limite()
+        cursor_param = request.args.get('cursor')
+        condicion, params = '', []
+        if cursor_param:
+            condicion, params = _condicion(columna, descendente, *_decodificar(cursor_param, columna))
+            condicion = f"WHERE {condicion}"
+    except CursorInvalido as e:
+        return jsonify({"error": str(e)}), 400
+
+    columnas = list(columnas)
+    seleccion = columnas + [c for c in ('id', columna) if c not in columnas]
+    sentido = 'DESC' if descendente else 'ASC'
+    query = (f"SELECT {', '.join(seleccion)} {desde} {condicion} "
+             f"ORDER BY {columna} {sentido}, id {sentido} LIMIT %s")
+
+    conn = get_request_connection()
+    cursor = conn.cursor()
+    try:
+        # Una fila de más indica si existe página siguiente
+        cursor.execute(query, params + [limite + 1])
+        filas = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = _codificar(columna, ultima[seleccion.index(columna)], ultima[seleccion.index('id')])
+
+    # Las columnas agregadas para el cursor van al final: se recortan
+    n = len(columnas)
+    if columnar.pedido():
+        data = columnar.desde_tuplas(columnas, [fila[:n] for fila in filas], codificar)
+    else:
+        data = [dict(zip(columnas, fila)) for fila in filas]
+
+    return jsonify({"data": data, "next": siguiente, "limit": limite}), 200
@@ -0,0 +1,363 @@
+"""
+Contadores de progreso por registro de mapeo y hilera
+(tabla mapeo_fact_progreso_hilera, ver CREATE_TABLE_PROGRESO_HILERA.sql).
+
+Las plantas mapeadas de una hilera en un registro son los registros de
+plantas de esa hilera hechos por el evaluador del registro de mapeo. Los
+endpoints de escritura ajustan los contadores dentro de su misma
+transacción; /registromapeo/<id>/progreso solo los lee. Si a un registro le
+faltan filas (registro anterior a la tabla, hilera nueva en el cuartel) se
+reconstruyen al leerlo.
+
+Cada cambio incrementa además la versión 'progreso:<id_registro>' de los
+registros afectados (utils/versiones.py), que indexa el ETag y la caché de
+respuestas del endpoint.
+"""
+import logging
+from config import Config
+from utils import serializacion, versiones
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Cuerpos JSON de /progreso por (id_registro, versión)
+cache_respuestas = LRUCache(Config.PROGRESO_CACHE_SIZE)
+
+# Conteos reales de una hilera h para un registro rm (reconstrucción y verificación)
+_CONTEOS_REALES = """
+    (SELECT COUNT(*) FROM general_dim_planta p WHERE p.id_hilera = h.id) as total_plantas,
+    (SELECT COUNT(*)
+     FROM mapeo_fact_registro r
+     INNER JOIN general_dim_planta p ON r.id_planta = p.id
+     WHERE p.id_hilera = h.id AND r.id_evaluador = rm.id_evaluador) as plantas_mapeadas
+"""
+
+_UPSERT = """
+    INSERT INTO mapeo_fact_progreso_hilera
+    (id_registro_mapeo, id_hilera, total_plantas, plantas_mapeadas)
+    SELECT rm.id, h.id, {conteos}
+    FROM mapeo_fact_registromapeo rm
+    INNER JOIN general_dim_hilera h ON h.id_cuartel = rm.id_cuartel
+    WHERE {filtro}
+    ON DUPLICATE KEY UPDATE
+        total_plantas = VALUES(total_plantas),
+        plantas_mapeadas = VALUES(plantas_mapeadas)
+"""
+
+
+def calcular(cursor, registro_id):
+    """
+    Progreso de un registro de mapeo por hilera (respuesta de
+    /registromapeo/<id>/progreso), o None si el registro no existe.
+
+    Devuelve (resultado, versión): si hubo que reconstruir contadores, la
+    reconstrucción incrementó la versión del registro y se devuelve la nueva
+    (leída antes de releer las hileras); si no, None.
+    """
+    # Obtener información del registro y cuartel
+    cursor.execute("""
+        SELECT rm.id, rm.id_cuartel, c.nombre as nombre_cuartel
+        FROM mapeo_fact_registromapeo rm
+        LEFT JOIN general_dim_cuartel c ON rm.id_cuartel = c.id
+        WHERE rm.id = %s
+    """, (registro_id,))
+
+    registro = cursor.fetchone()
+    if not registro:
+        return None, None
+
+    hileras, version = leer_hileras(cursor, registro_id, registro['id_cuartel'])
+    return _resumir(registro_id, registro['nombre_cuartel'], hileras), version
+
+
+def calcular_lote(cursor, ids=None, temporada=None, estado=None, detalle=False):
+    """
+    Progreso de varios registros de mapeo (por ids y/o temporada/estado) con
+    un número fijo de consultas. Sin `detalle` se omite el arreglo de hileras
+    y se agregan los totales de plantas del registro.
+    """
+    condiciones, params = [], []
+    if ids:
+        condiciones.append(f"rm.id IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(ids)
+    if temporada is not None:
+        condiciones.append("rm.id_temporada = %s")
+        params.append(temporada)
+    if estado is not None:
+        condiciones.append("rm.id_estado = %s")
+        params.append(estado)
+    filtro = ' AND '.join(condiciones) or '1 = 1'
+
+    cursor.execute(f"""
+        SELECT rm.id, rm.id_temporada, rm.id_estado, c.nombre as nombre_cuartel
+        FROM mapeo_fact_registromapeo rm
+        LEFT JOIN general_dim_cuartel c ON rm.id_cuartel = c.id
+        WHERE {filtro}
+        ORDER BY rm.fecha_inicio DESC
+    """, tuple(params))
+    registros = cursor.fetchall()
+    if not registros:
+        return []
+
+    hileras_por_registro = leer_hileras_lote(cursor, [r['id'] for r in registros])
+
+    resultados = []
+    for registro in registros:
+        hileras = hileras_por_registro.get(registro['id'], [])
+        resumen = _resumir(registro['id'], registro['nombre_cuartel'], hileras)
+        resumen['id_temporada'] = registro['id_temporada']
+        resumen['id_estado'] = registro['id_estado']
+        if not detalle:
+            resumen['total_plantas'] = sum(h['total_plantas'] for h in resumen['hileras'])
+            resumen['plantas_mapeadas'] = sum(h['plantas_mapeadas'] for h in resumen['hileras'])
+            del resumen['hileras']
+        resultados.append(resumen)
+    return resultados
+
+
+def _resumir(registro_id, nombre_cuartel, hileras):
+    """Arma la respuesta de progreso a partir de las filas de leer_hileras."""
+    total_hileras = len(hileras)
+    hileras_completadas = 0
+
+    # Calcular progreso por hilera
+    hileras_con_progreso = []
+    for hilera in hileras:
+        total_plantas = hilera['total_plantas']
+        plantas_mapeadas = hilera['plantas_mapeadas']
+
+        porcentaje = (plantas_mapeadas / total_plantas * 100) if total_plantas > 0 else 0
+
+        if hilera['id_estado_hilera'] is not None:
+            estado = hilera['estado']
+        else:
+            # Si no hay estado definido, calcularlo basado en plantas mapeadas
+            if plantas_mapeadas == 0:
+                estado = "pendiente"
+            elif plantas_mapeadas == total_plantas:
+                estado = "completado"
+            else:
+                estado = "en_progreso"
+
+        if estado == "completado":
+            hileras_completadas += 1
+
+        hileras_con_progreso.append({
+            "id_hilera": hilera['id'],
+            "nombre": hilera['nombre'],
+            "total_plantas": total_plantas,
+            "plantas_mapeadas": plantas_mapeadas,
+            "porcentaje": round(porcentaje, 2),
+            "estado": estado
+        })
+
+    # Calcular porcentaje general
+    porcentaje_general = (hileras_completadas / total_hileras * 100) if total_hileras > 0 else 0
+
+    return {
+        "id_registro": registro_id,
+        "cuartel": nombre_cuartel,
+        "total_hileras": total_hileras,
+        "hileras_completadas": hileras_completadas,
+        "porcentaje_general": round(porcentaje_general, 2),
+        "hileras": hileras_con_progreso
+    }
+
+
+def leer_hileras(cursor, registro_id, id_cuartel):
+    """
+    Hileras del cuartel con sus contadores y el estado definido en
+    mapeo_fact_estado_hilera, ordenadas por nombre, y la versión del
+    registro tras reconstruir los contadores (None si no hizo falta).
+    """
+    query = """
+        SELECT h.id, h.nombre,
+               ph.id_hilera as id_contador, ph.total_plantas, ph.plantas_mapeadas,
+               eh.id as id_estado_hilera, eh.estado
+        FROM general_dim_hilera h
+        LEFT JOIN mapeo_fact_progreso_hilera ph
+            ON ph.id_registro_mapeo = %s AND ph.id_hilera = h.id
+        LEFT JOIN mapeo_fact_estado_hilera eh
+            ON eh.id_registro_mapeo = %s AND eh.id_hilera = h.id
+        WHERE h.id_cuartel = %s
+        ORDER BY h.nombre ASC
+    """
+    params = (registro_id, registro_id, id_cuartel)
+    cursor.execute(query, params)
+    hileras = cursor.fetchall()
+
+    version = None
+    if any(hilera['id_contador'] is None for hilera in hileras):
+        logger.info(f"🔄 Contadores de progreso incompletos para {registro_id}, reconstruyendo...")
+        reconstruir_registro(cursor, registro_id)
+        # Antes de releer: una escritura posterior deja la versión atrás, nunca adelante
+        version = versiones.obtener(cursor, clave_version(registro_id))
+        cursor.execute(query, params)
+        hileras = cursor.fetchall()
+    return hileras, version
+
+
+def leer_hileras_lote(cursor, registro_ids):
+    """Como leer_hileras para varios registros a la vez: {id_registro: [hileras]}."""
+    query = f"""
+        SELECT rm.id as id_registro, h.id, h.nombre,
+               ph.id_hilera as id_contador, ph.total_plantas, ph.plantas_mapeadas,
+               eh.id as id_estado_hilera, eh.estado
+        FROM mapeo_fact_registromapeo rm
+        INNER JOIN general_dim_hilera h ON h.id_cuartel = rm.id_cuartel
+        LEFT JOIN mapeo_fact_progreso_hilera ph
+            ON ph.id_registro_mapeo = rm.id AND ph.id_hilera = h.id
+        LEFT JOIN mapeo_fact_estado_hilera eh
+            ON eh.id_registro_mapeo = rm.id AND eh.id_hilera = h.id
+        WHERE rm.id IN ({', '.join(['%s'] * len(registro_ids))})
+        ORDER BY h.nombre ASC
+    """
+    cursor.execute(query, tuple(registro_ids))
+    filas = cursor.fetchall()
+
+    incompletos = list(dict.fromkeys(f['id_registro'] for f in filas if f['id_contador'] is None))
+    if incompletos:
+        logger.info(f"🔄 Contadores de progreso incompletos para {len(incompletos)} registros, reconstruyendo...")
+        reconstruir_registros(cursor, incompletos)
+        cursor.execute(query, tuple(registro_ids))
+        filas = cursor.fetchall()
+
+    hileras = {}
+    for fila in filas:
+        hileras.setdefault(fila['id_registro'], []).append(fila)
+    return hileras
+
+
+def clave_version(registro_id):
+    return f'progreso:{registro_id}'
+
+
+def etag(registro_id, version, formato=serializacion.JSON):
+    return serializacion.etag(f'progreso-{registro_id}-{version}', formato)
+
+
+def invalidar_registro(cursor, registro_id):
+    """Nueva versión del progreso de un registro (p. ej. cambió el estado de una hilera)."""
+    versiones.incrementar(cursor, clave_version(registro_id))
+
+
+def invalidar_cuartel(cursor, cuartel_id):
+    """Nueva versión para todos los registros de mapeo de un cuartel (hileras, nombre)."""
+    _invalidar(cursor, "rm.id_cuartel = %s", (cuartel_id,))
+
+
+def _invalidar(cursor, filtro, params):
+    versiones.incrementar_consulta(cursor, f"""
+        SELECT CONCAT('progreso:', rm.id) as clave
+        FROM mapeo_fact_registromapeo rm
+        WHERE {filtro}
+    """, params)
+
+
+def reconstruir_registro(cursor, registro_id):
+    """Recalcula desde cero los contadores de un registro de mapeo."""
+    reconstruir_registros(cursor, [registro_id])
+
+
+def reconstruir_registros(cursor, registro_ids):
+    """
+    Recalcula desde cero los contadores de varios registros de mapeo con
+    las mismas tres sentencias sin importar cuántos sean.
+    """
+    params = tuple(registro_ids)
+    filtro = f"rm.id IN ({', '.join(['%s'] * len(params))})"
+    cursor.execute(_UPSERT.format(conteos=_CONTEOS_REALES, filtro=filtro), params)
+    # Hileras que ya no pertenecen al cuartel del registro
+    cursor.execute(f"""
+        DELETE ph FROM mapeo_fact_progreso_hilera ph
+        INNER JOIN mapeo_fact_registromapeo rm ON ph.id_registro_mapeo = rm.id
+        INNER JOIN general_dim_hilera h ON ph.id_hilera = h.id
+        WHERE {filtro} AND h.id_cuartel <> rm.id_cuartel
+    """, params)
+    _invalidar(cursor, filtro, params)
+
+
+def reconstruir_todo(cursor):
+    """Recalcula los contadores de todos los registros de mapeo."""
+    cursor.execute("DELETE FROM mapeo_fact_progreso_hilera")
+    cursor.execute(_UPSERT.format(conteos=_CONTEOS_REALES, filtro="1 = 1"))
+    filas = cursor.rowcount
+    _invalidar(cursor, "1 = 1", None)
+    return filas
+
+
+def refrescar_hileras(cursor, hilera_ids):
+    """
+    Recalcula los contadores de las hileras indicadas en todos los registros
+    de sus cuarteles (bajas o cambios de hilera de plantas).
+    """
+    hilera_ids = [h for h in dict.fromkeys(hilera_ids) if h is not None]
+    if not hilera_ids:
+        return
+    marcadores = ', '.join(['%s'] * len(hilera_ids))
+    cursor.execute(
+        _UPSERT.format(conteos=_CONTEOS_REALES, filtro=f"h.id IN ({marcadores})"),
+        tuple(hilera_ids)
+    )
+    _invalidar(
+        cursor,
+        f"rm.id_cuartel IN (SELECT id_cuartel FROM general_dim_hilera WHERE id IN ({marcadores}))",
+        tuple(hilera_ids)
+    )
+
+
+def ajustar_total_plantas(cursor, hilera_id, delta):
+    """Suma `delta` al total de plantas de la hilera en todos los registros."""
+    cursor.execute("""
+        UPDATE mapeo_fact_progreso_hilera
+        SET total_plantas = total_plantas + %s
+        WHERE id_hilera = %s
+    """, (delta, hilera_id))
+    _invalidar(cursor, "rm.id_cuartel = (SELECT id_cuartel FROM general_dim_hilera WHERE id = %s)", (hilera_id,))
+
+
+def ajustar_mapeadas(cursor, planta_id, evaluador_id, delta):
+    """
+    Suma `delta` a las plantas mapeadas de la hilera de la planta en los
+    registros de mapeo del evaluador.
+    """
+    cursor.execute("""
+        UPDATE mapeo_fact_progreso_hilera ph
+        INNER JOIN mapeo_fact_registromapeo rm ON ph.id_registro_mapeo = rm.id
+        INNER JOIN general_dim_planta p ON ph.id_hilera = p.id_hilera
+        SET ph.plantas_mapeadas = ph.plantas_mapeadas + %s
+        WHERE p.id = %s AND rm.id_evaluador = %s
+    """, (delta, planta_id, evaluador_id))
+    _invalidar(cursor, """
+        rm.id_evaluador = %s AND rm.id_cuartel = (
+            SELECT h.id_cuartel FROM general_dim_planta p
+            INNER JOIN general_dim_hilera h ON p.id_hilera = h.id
+            WHERE p.id = %s
+        )
+    """, (evaluador_id, planta_id))
+
+
+def verificar(cursor, registro_id=None):
+    """
+    Compara los contadores con los conteos reales. Devuelve las filas que
+    difieren (o que faltan) con ambos valores.
+    """
+    filtro = "WHERE rm.id = %s" if registro_id else ""
+    cursor.execute(f"""
+        SELECT * FROM (
+            SELECT rm.id as id_registro_mapeo, h.id as id_hilera,
+                   ph.total_plantas as total_plantas_contador,
+                   ph.plantas_mapeadas as plantas_mapeadas_contador,
+                   {_CONTEOS_REALES}
+            FROM mapeo_fact_registromapeo rm
+            INNER JOIN general_dim_hilera h ON h.id_cuartel = rm.id_cuartel
+            LEFT JOIN mapeo_fact_progreso_hilera ph
+                ON ph.id_registro_mapeo = rm.id AND ph.id_hilera = h.id
+            {filtro}
+        ) conteos
+        WHERE total_plantas_contador IS NULL
+            OR total_plantas_contador <> total_plantas
+            OR plantas_mapeadas_contador <> plantas_mapeadas
+        ORDER BY id_registro_mapeo, id_hilera
+    """, (registro_id,) if registro_id else None)
+    return cursor.fetchall()
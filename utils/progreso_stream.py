@@ -0,0 +1,232 @@
+"""
+Progreso de registros de mapeo en vivo por Server-Sent Events.
+
+Cada registro observado tiene un canal con un único hilo que recalcula el
+progreso (utils.progreso.calcular) y reparte a todos sus suscriptores solo
+las hileras que cambiaron, de modo que la carga en la base no crece con la
+cantidad de pantallas abiertas. El hilo despierta cuando las escrituras de
+este proceso llaman a notificar*() y, para los cambios hechos en otros
+workers, cada PROGRESO_STREAM_POLL_INTERVAL segundos.
+"""
+import logging
+import queue
+import threading
+import time
+from flask import Response, current_app, stream_with_context
+from config import Config
+from utils.db import get_db_connection
+from utils import deadlines, progreso, versiones
+
+logger = logging.getLogger(__name__)
+
+# Espera tras una notificación para agrupar ráfagas de escrituras en un solo recálculo
+_AGRUPAR_SEGUNDOS = 0.25
+
+_canales = {}
+_canales_lock = threading.Lock()
+
+
+class Suscripcion:
+    """Cola de eventos SSE de un cliente."""
+
+    def __init__(self, canal):
+        self.canal = canal
+        self.eventos = queue.Queue(maxsize=100)
+
+    def enviar(self, tipo, datos):
+        try:
+            self.eventos.put_nowait((tipo, datos))
+        except queue.Full:
+            # Cliente lento: se descartan los deltas pendientes y recibe el estado completo
+            while not self.eventos.empty():
+                try:
+                    self.eventos.get_nowait()
+                except queue.Empty:
+                    break
+            self.eventos.put_nowait(('progreso', self.canal.ultimo))
+
+    def siguiente(self, timeout):
+        try:
+            return self.eventos.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def cerrar(self):
+        self.canal.quitar(self)
+
+
+class _Canal:
+    def __init__(self, registro_id):
+        self.registro_id = registro_id
+        self.id_evaluador = None
+        self.suscriptores = set()
+        self.ultimo = None
+        self.version = None
+        self._cambio = threading.Event()
+
+    def iniciar(self):
+        threading.Thread(target=self._ejecutar, name=f'progreso-{self.registro_id}', daemon=True).start()
+
+    def agregar(self, suscripcion):
+        # Se llama con _canales_lock tomado
+        self.suscriptores.add(suscripcion)
+        if self.ultimo is not None:
+            suscripcion.enviar('progreso', self.ultimo)
+
+    def quitar(self, suscripcion):
+        with _canales_lock:
+            self.suscriptores.discard(suscripcion)
+            if not self.suscriptores:
+                self._cambio.set()  # el hilo ve que no quedan clientes y termina
+
+    def notificar(self):
+        self._cambio.set()
+
+    def _ejecutar(self):
+        while True:
+            with _canales_lock:
+                if not self.suscriptores:
+                    _canales.pop(self.registro_id, None)
+                    return
+            if not self._actualizar():
+                return
+            if self._cambio.wait(Config.PROGRESO_STREAM_POLL_INTERVAL):
+                time.sleep(_AGRUPAR_SEGUNDOS)
+            self._cambio.clear()
+
+    def _actualizar(self):
+        """Recalcula y difunde; devuelve False si el registro ya no existe."""
+        try:
+            conn = get_db_connection(readonly=False)
+            cursor = conn.cursor(dictionary=True)
+            try:
+                if self.id_evaluador is None:
+                    cursor.execute("""
+                        SELECT id_evaluador FROM mapeo_fact_registromapeo WHERE id = %s
+                    """, (self.registro_id,))
+                    fila = cursor.fetchone()
+                    self.id_evaluador = fila['id_evaluador'] if fila else None
+                # Sin cambio de versión no hay nada que recalcular
+                version = versiones.obtener(cursor, progreso.clave_version(self.registro_id))
+                if version == self.version and self.ultimo is not None:
+                    return True
+                actual, reconstruida = progreso.calcular(cursor, self.registro_id)
+                if reconstruida is not None:
+                    version = reconstruida
+            finally:
+                cursor.close()
+                conn.close()
+        except Exception as e:
+            logger.warning(f"⚠️  No se pudo recalcular el progreso de {self.registro_id}: {str(e)}")
+            return True
+
+        with _canales_lock:
+            if actual is None:
+                for suscripcion in self.suscriptores:
+                    suscripcion.enviar('fin', {"error": "Registro de mapeo no encontrado"})
+                self.suscriptores.clear()
+                _canales.pop(self.registro_id, None)
+                return False
+
+            anterior, self.ultimo, self.version = self.ultimo, actual, version
+            if anterior is None:
+                evento = ('progreso', actual)
+            else:
+                cambios = _delta(anterior, actual)
+                if cambios is None:
+                    return True
+                evento = ('delta', cambios)
+            for suscripcion in self.suscriptores:
+                suscripcion.enviar(*evento)
+        return True
+
+
+def _delta(anterior, actual):
+    """Resumen más las hileras nuevas o modificadas (None si no cambió nada)."""
+    previas = {h['id_hilera']: h for h in anterior['hileras']}
+    cambios = [h for h in actual['hileras'] if previas.get(h['id_hilera']) != h]
+    vigentes = {h['id_hilera'] for h in actual['hileras']}
+    eliminadas = [id_hilera for id_hilera in previas if id_hilera not in vigentes]
+    resumen = {
+        clave: actual[clave]
+        for clave in ('cuartel', 'total_hileras', 'hileras_completadas', 'porcentaje_general')
+    }
+    if not cambios and not eliminadas and all(anterior[c] == v for c, v in resumen.items()):
+        return None
+    return {
+        "id_registro": actual['id_registro'],
+        **resumen,
+        "hileras": cambios,
+        "hileras_eliminadas": eliminadas
+    }
+
+
+def suscribir(registro_id):
+    with _canales_lock:
+        canal = _canales.get(registro_id)
+        nuevo = canal is None
+        if nuevo:
+            canal = _canales[registro_id] = _Canal(registro_id)
+        suscripcion = Suscripcion(canal)
+        canal.agregar(suscripcion)
+    if nuevo:
+        canal.iniciar()
+    return suscripcion
+
+
+def notificar(registro_id):
+    """Cambió algo de un registro de mapeo (estado de hilera, cuartel, baja)."""
+    with _canales_lock:
+        canal = _canales.get(registro_id)
+    if canal:
+        canal.notificar()
+
+
+def notificar_evaluador(evaluador_id):
+    """Se creó, movió o eliminó un registro de planta de este evaluador."""
+    with _canales_lock:
+        canales = [c for c in _canales.values() if c.id_evaluador in (evaluador_id, None)]
+    for canal in canales:
+        canal.notificar()
+
+
+def notificar_todos():
+    """Cambios de plantas: afectan a cualquier registro del cuartel."""
+    with _canales_lock:
+        canales = list(_canales.values())
+    for canal in canales:
+        canal.notificar()
+
+
+def respuesta_sse(registro_id):
+    """
+    Respuesta text/event-stream: un evento `progreso` con el estado completo,
+    luego eventos `delta` y comentarios de keepalive. Se cierra a los
+    PROGRESO_STREAM_MAX_DURATION segundos; EventSource se reconecta solo.
+    """
+    dumps = current_app.json.dumps
+
+    def generate():
+        # El stream dura más que el presupuesto de la petición que lo abrió
+        deadlines.clear_deadline()
+        suscripcion = suscribir(registro_id)
+        fin = time.monotonic() + Config.PROGRESO_STREAM_MAX_DURATION
+        try:
+            yield "retry: 3000\n\n"
+            while time.monotonic() < fin:
+                evento = suscripcion.siguiente(Config.PROGRESO_STREAM_KEEPALIVE)
+                if evento is None:
+                    yield ": keepalive\n\n"
+                    continue
+                tipo, datos = evento
+                yield f"event: {tipo}\ndata: {dumps(datos, separators=(',', ':'))}\n\n"
+                if tipo == 'fin':
+                    return
+        finally:
+            suscripcion.cerrar()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
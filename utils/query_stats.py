@@ -0,0 +1,93 @@
+import re
+import time
+import logging
+from collections import Counter
+from flask import g, request, has_app_context, has_request_context
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_HINT_RE = re.compile(r'/\*\+.*?\*/', re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAM_RE = re.compile(r'%s|%\(\w+\)s')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """Forma de la consulta: sin literales, parámetros ni hints y con espacios colapsados."""
+    sql = _HINT_RE.sub('', sql)
+    sql = _STRING_RE.sub('?', sql)
+    sql = _PARAM_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(?+)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _request_stats():
+    if not has_app_context():
+        return None
+    stats = g.get('db_stats')
+    if stats is None:
+        stats = g.db_stats = {'consultas': 0, 'tiempo': 0.0, 'formas': Counter()}
+    return stats
+
+
+def record_query(sql, elapsed):
+    """Cuenta y cronometra una sentencia ejecutada en la petición actual."""
+    stats = _request_stats()
+    if stats is None:
+        return
+    stats['consultas'] += 1
+    stats['tiempo'] += elapsed
+    if not isinstance(sql, str):
+        return
+    shape = normalize(sql)
+    stats['formas'][shape] += 1
+    if stats['formas'][shape] == Config.DB_N_PLUS_ONE_THRESHOLD + 1:
+        endpoint = request.endpoint if has_request_context() else None
+        logger.warning(
+            f"🐌 Posible N+1 en {endpoint}: la consulta se ejecutó más de "
+            f"{Config.DB_N_PLUS_ONE_THRESHOLD} veces en la petición: {shape}"
+        )
+
+
+def record_time(elapsed):
+    """Suma tiempo de BD (p. ej. lectura de filas) sin contar una consulta nueva."""
+    stats = _request_stats()
+    if stats is not None:
+        stats['tiempo'] += elapsed
+
+
+class timed:
+    """Context manager que mide un tramo de trabajo con la BD."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def get_request_stats():
+    """Número de consultas y tiempo de BD (ms) de la petición actual."""
+    stats = g.get('db_stats') if has_app_context() else None
+    if not stats:
+        return {'consultas': 0, 'tiempo_ms': 0.0}
+    return {'consultas': stats['consultas'], 'tiempo_ms': round(stats['tiempo'] * 1000, 2)}
+
+
+def _server_timing(response):
+    stats = get_request_stats()
+    if stats['consultas']:
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats["tiempo_ms"]};desc="{stats["consultas"]} consultas"'
+        )
+    return response
+
+
+def init_app(app):
+    app.after_request(_server_timing)
@@ -0,0 +1,121 @@
+"""
+Negociación de formato binario: MessagePack y CBOR además de JSON.
+
+Las respuestas que pasan por jsonify se serializan según el Accept del
+cliente (`application/msgpack` o `application/cbor`) con las mismas
+estructuras que en JSON; las fechas viajan como timestamp nativo del
+formato (extensión -1 de MessagePack, tag 1 de CBOR) en lugar de texto.
+Decimal y UUID van como texto en MessagePack, igual que en JSON; CBOR los
+codifica con sus tags estándar. Sin Accept binario, o si falta la
+librería, se responde JSON como siempre.
+
+Los cuerpos de petición en esos formatos se leen con `request.json` /
+`request.get_json()` como si fueran JSON (clase Peticion).
+"""
+import uuid
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from flask import Request, has_request_context, request
+
+try:
+    import msgpack
+except ImportError:  # opcional
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # opcional
+    cbor2 = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+MSGPACK_X = 'application/x-msgpack'
+CBOR = 'application/cbor'
+
+
+def _disponibles():
+    formatos = []
+    if msgpack is not None:
+        formatos += [MSGPACK, MSGPACK_X]
+    if cbor2 is not None:
+        formatos.append(CBOR)
+    return formatos
+
+
+def formato_respuesta():
+    """Mimetype de respuesta según Accept; JSON si el cliente lo prefiere o no pidió nada."""
+    if not has_request_context():
+        return JSON
+    binarios = _disponibles()
+    if not binarios:
+        return JSON
+    # Ante igual preferencia gana JSON (primero en la lista), p. ej. con Accept: */*
+    return request.accept_mimetypes.best_match([JSON] + binarios, default=JSON)
+
+
+def etag(base, formato):
+    """ETag de la representación en `formato`: JSON conserva `base`, los binarios llevan sufijo."""
+    return base if formato == JSON else f"{base}-{formato.rsplit('/', 1)[1]}"
+
+
+def _msgpack_default(o):
+    if isinstance(o, datetime):
+        if o.tzinfo is None:
+            o = o.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(o)
+    if isinstance(o, date):
+        return msgpack.Timestamp.from_datetime(datetime.combine(o, time(), tzinfo=timezone.utc))
+    if isinstance(o, (Decimal, uuid.UUID)):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not MessagePack serializable")
+
+
+def empaquetar(obj, mimetype):
+    if mimetype == CBOR:
+        return cbor2.dumps(obj, datetime_as_timestamp=True, timezone=timezone.utc, date_as_datetime=True)
+    return msgpack.packb(obj, default=_msgpack_default)
+
+
+def desempaquetar(datos, mimetype):
+    if mimetype == CBOR:
+        return cbor2.loads(datos)
+    return msgpack.unpackb(datos, timestamp=3)  # timestamps como datetime UTC
+
+
+class RespuestaNegociada:
+    """Mixin para el proveedor JSON de Flask: jsonify responde en el formato negociado."""
+
+    def response(self, *args, **kwargs):
+        mimetype = formato_respuesta()
+        if mimetype == JSON:
+            response = super().response(*args, **kwargs)
+        else:
+            obj = self._prepare_response_obj(args, kwargs)
+            response = self._app.response_class(empaquetar(obj, mimetype), mimetype=mimetype)
+        if _disponibles():
+            response.vary.add('Accept')
+        return response
+
+
+class Peticion(Request):
+    """Request que además de JSON lee cuerpos MessagePack y CBOR en get_json()."""
+
+    def get_json(self, force=False, silent=False, cache=True):
+        if self.mimetype not in _disponibles():
+            return super().get_json(force=force, silent=silent, cache=cache)
+
+        if cache and getattr(self, '_cuerpo_binario', None) is not None:
+            return self._cuerpo_binario
+        try:
+            datos = desempaquetar(self.get_data(cache=cache), self.mimetype)
+        except Exception as e:
+            if silent:
+                return None
+            return self.on_json_loading_failed(e)
+        if cache:
+            self._cuerpo_binario = datos
+        return datos
+
+
+def init_app(app):
+    app.request_class = Peticion
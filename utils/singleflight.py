@@ -0,0 +1,98 @@
+"""
+Coalescencia de lecturas idénticas concurrentes (single-flight).
+
+Con @single_flight, si llega una petición igual a otra que todavía se está
+resolviendo (mismo endpoint, argumentos, query string, identidad JWT y
+cabeceras condicionales) no ejecuta el handler: espera a la primera y
+responde con una copia de su respuesta. Cada petición pasa igual por sus
+propios after_request. Las respuestas en streaming no se comparten.
+"""
+import logging
+import threading
+from collections import Counter
+from functools import wraps
+from flask import Response, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from utils import deadlines
+
+logger = logging.getLogger(__name__)
+
+_en_vuelo = {}
+_lock = threading.Lock()
+_ejecutadas = Counter()
+_coalescidas = Counter()
+
+
+class _Vuelo:
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None  # (cuerpo, status, headers)
+        self.esperando = 0
+
+
+def _clave():
+    try:
+        identidad = get_jwt_identity()
+    except Exception:
+        identidad = None
+    return (
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple(sorted(request.args.items(multi=True))),
+        identidad,
+        request.headers.get('If-None-Match'),
+        request.headers.get('Accept'),
+    )
+
+
+def single_flight(view):
+    """Decorador para handlers GET costosos; va debajo de @jwt_required()."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        clave = _clave()
+        with _lock:
+            vuelo = _en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = _en_vuelo[clave] = _Vuelo()
+            else:
+                vuelo.esperando += 1
+
+        if lider:
+            try:
+                response = make_response(view(*args, **kwargs))
+                if not response.is_streamed:
+                    vuelo.resultado = (response.get_data(), response.status_code, list(response.headers.items()))
+                return response
+            finally:
+                with _lock:
+                    _en_vuelo.pop(clave, None)
+                    _ejecutadas[request.endpoint] += 1
+                if vuelo.esperando:
+                    logger.info(f"🤝 {request.endpoint}: {vuelo.esperando} peticiones compartieron el resultado")
+                vuelo.listo.set()
+
+        # Espera al líder como máximo lo que le queda a esta petición
+        remaining = deadlines.remaining_ms()
+        if not vuelo.listo.wait(None if remaining is None else max(remaining, 0) / 1000.0):
+            deadlines.mark_exceeded()
+            return jsonify({"error": "Se agotó el tiempo límite de la petición"}), 504
+        if vuelo.resultado is None:
+            # El líder falló o respondió en streaming: esta petición se resuelve por su cuenta
+            return view(*args, **kwargs)
+
+        with _lock:
+            _coalescidas[request.endpoint] += 1
+        cuerpo, status, headers = vuelo.resultado
+        return Response(cuerpo, status=status, headers=headers)
+    return wrapper
+
+
+def get_single_flight_stats():
+    """Por endpoint: handlers ejecutados y peticiones que reutilizaron otro resultado."""
+    with _lock:
+        endpoints = set(_ejecutadas) | set(_coalescidas)
+        return {
+            endpoint: {"ejecutadas": _ejecutadas[endpoint], "coalescidas": _coalescidas[endpoint]}
+            for endpoint in sorted(endpoints)
+        }
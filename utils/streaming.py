@@ -0,0 +1,71 @@
+import logging
+from flask import Response, current_app, request, stream_with_context
+from config import Config
+from utils.db import get_db_connection
+from utils import deadlines
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def stream_format():
+    """
+    Formato de streaming pedido por el cliente, o None para la respuesta normal.
+    `?stream=1` / `?stream=ndjson` o `Accept: application/x-ndjson` -> 'ndjson';
+    `?stream=array` -> arreglo JSON enviado por partes.
+    """
+    value = request.args.get('stream', '').lower()
+    if value == 'array':
+        return 'array'
+    if value in ('1', 'true', 'ndjson'):
+        return 'ndjson'
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return 'ndjson'
+    return None
+
+
+def stream_query(query, params=None, fmt='ndjson'):
+    """
+    Ejecuta `query` con un cursor sin buffer y envía las filas a medida que
+    llegan, en bloques de STREAM_CHUNK_SIZE filas (`fetchmany`), de modo que
+    la memoria no crece con el tamaño de la tabla. La conexión se devuelve al
+    pool al terminar o si el cliente corta la descarga.
+    """
+    dumps = current_app.json.dumps
+    chunk_size = Config.STREAM_CHUNK_SIZE
+
+    def generate():
+        # La descarga completa puede durar más que el presupuesto de la
+        # petición: el límite solo aplica al handler que la inició
+        deadlines.clear_deadline()
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            if fmt == 'array':
+                yield '['
+            first = True
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                lines = [dumps(row, separators=(',', ':')) for row in rows]
+                if fmt == 'array':
+                    yield ('' if first else ',') + ','.join(lines)
+                else:
+                    yield '\n'.join(lines) + '\n'
+                first = False
+            if fmt == 'array':
+                yield ']'
+        except Exception as e:
+            logger.error(f"❌ Error transmitiendo resultados: {str(e)}")
+            if fmt == 'ndjson':
+                yield dumps({"error": str(e)}) + '\n'
+            # En modo arreglo se corta sin cerrar el JSON para que el cliente detecte el error
+        finally:
+            cursor.close()
+            conn.close()
+
+    mimetype = NDJSON_MIMETYPE if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
@@ -0,0 +1,38 @@
+"""
+Versiones de cambio por clave (tabla mapeo_fact_version, ver
+CREATE_TABLE_VERSION.sql).
+
+Las escrituras incrementan la versión de lo que modifican dentro de su
+misma transacción; las lecturas consultan la versión (una búsqueda por
+clave primaria) para responder 304 o reutilizar una respuesta en caché sin
+recalcular. Una clave sin fila tiene versión 0.
+"""
+
+
+def obtener(cursor, clave):
+    cursor.execute("""
+        SELECT version FROM mapeo_fact_version WHERE clave = %s
+    """, (clave,))
+    fila = cursor.fetchone()
+    if not fila:
+        return 0
+    return fila['version'] if isinstance(fila, dict) else fila[0]
+
+
+def incrementar(cursor, clave):
+    cursor.execute("""
+        INSERT INTO mapeo_fact_version (clave, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, (clave,))
+
+
+def incrementar_consulta(cursor, select_claves, params=None):
+    """
+    Incrementa las claves que devuelve `select_claves`, un SELECT de una sola
+    columna llamada clave (p. ej. "SELECT CONCAT('progreso:', id) as clave FROM ...").
+    """
+    cursor.execute(f"""
+        INSERT INTO mapeo_fact_version (clave, version)
+        SELECT claves.clave, 1 FROM ({select_claves}) claves
+        ON DUPLICATE KEY UPDATE version = mapeo_fact_version.version + 1
+    """, params)
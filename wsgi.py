@@ -4,9 +4,21 @@ WSGI entry point for Gunicorn
 """
 
 from app import create_app
+from utils import compresion, db, json_provider, serializacion
 
 # Crear la instancia de la aplicación Flask
 app = create_app()
 
+# Serialización JSON con orjson (Config.JSON_PROVIDER) y MessagePack/CBOR según Accept
+json_provider.init_app(app)
+serializacion.init_app(app)
+
+# Conexión por petición (se devuelve al pool al terminar cada request)
+# y precalentamiento del pool del worker
+db.init_app(app)
+
+# Compresión gzip/brotli/zstd según Accept-Encoding
+compresion.init_app(app)
+
 if __name__ == "__main__":
-    app.run() 
\ No newline at end of file
+    app.run() 